@@ -33,6 +33,11 @@ class Config:
     # 文件大小限制（字节）
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(50 * 1024 * 1024)))  # 50MB
     
+    # 批量上传限制
+    MAX_BATCH_FILES: int = int(os.getenv("MAX_BATCH_FILES", "500"))  # 单次批量上传最大文件数
+    MAX_BATCH_TOTAL_SIZE: int = int(os.getenv("MAX_BATCH_TOTAL_SIZE", str(2 * 1024 * 1024 * 1024)))  # 单批次解压后总大小上限 2GB
+    UPLOAD_STREAM_CHUNK_SIZE: int = int(os.getenv("UPLOAD_STREAM_CHUNK_SIZE", str(1024 * 1024)))  # 流式写盘块大小 1MB
+    
     # 文件类型MIME映射
     FILE_TYPE_MAPPING = {
         '.pdf': 'application/pdf',
@@ -55,12 +60,40 @@ class Config:
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
     OPENAI_EMBEDDING_MODEL: str = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
     
+    # 生成服务提供商及回退顺序（gemini/openai/mock，逗号分隔），为空时按已配置的API密钥决定
+    LLM_PROVIDERS: str = os.getenv("LLM_PROVIDERS", "")
+    
+    # 生成服务容错：对冲请求和熔断
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "True").lower() == "true"
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))  # 首选提供商耗时超过该分位数时向备用提供商发起对冲请求
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # 计算分位数所需的最少样本数
+    LLM_HEDGE_DEFAULT_DELAY: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8.0"))  # 样本不足时的对冲等待时间（秒）
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))  # 对冲等待时间下限（秒）
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))  # 连续失败多少次后熔断
+    LLM_CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("LLM_CIRCUIT_RESET_TIMEOUT", "30"))  # 熔断冷却时间（秒）
+    
+    # 本地模拟生成服务（离线压测用）
+    LLM_MOCK_FIRST_TOKEN_LATENCY_MS: int = int(os.getenv("LLM_MOCK_FIRST_TOKEN_LATENCY_MS", "500"))  # 首字延迟
+    LLM_MOCK_TOKENS_PER_SECOND: float = float(os.getenv("LLM_MOCK_TOKENS_PER_SECOND", "50"))  # 生成速率
+    LLM_MOCK_ANSWER_TOKENS: int = int(os.getenv("LLM_MOCK_ANSWER_TOKENS", "300"))  # 答案长度
+    
     # AI处理参数
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
     MAX_RETRIEVAL_DOCS: int = int(os.getenv("MAX_RETRIEVAL_DOCS", "5"))
     MAX_TOKENS_PER_REQUEST: int = int(os.getenv("MAX_TOKENS_PER_REQUEST", "4000"))
     AI_REQUEST_TIMEOUT: int = int(os.getenv("AI_REQUEST_TIMEOUT", "30"))
+    INGEST_MAX_CONCURRENCY: int = int(os.getenv("INGEST_MAX_CONCURRENCY", "4"))  # 同时处理的文献数上限
+    INGEST_RESERVED_INTERACTIVE_WORKERS: int = int(os.getenv("INGEST_RESERVED_INTERACTIVE_WORKERS", "1"))  # 为单篇上传预留的处理线程数
+    INGEST_EMBEDDING_BATCH_SIZE: int = int(os.getenv("INGEST_EMBEDDING_BATCH_SIZE", "10"))  # 每批生成向量的文本块数（断点粒度）
+    INGEST_EMBEDDING_BATCH_DELAY: float = float(os.getenv("INGEST_EMBEDDING_BATCH_DELAY", "1.0"))  # 批次间延迟（秒），避免API限流
+    INGEST_PROGRESS_POLL_INTERVAL: float = float(os.getenv("INGEST_PROGRESS_POLL_INTERVAL", "1.0"))  # SSE进度轮询间隔（秒）
+    
+    # 文本提取沙箱（子进程）配置
+    EXTRACTION_SANDBOX_ENABLED: bool = os.getenv("EXTRACTION_SANDBOX_ENABLED", "True").lower() == "true"
+    EXTRACTION_TIMEOUT: int = int(os.getenv("EXTRACTION_TIMEOUT", "120"))  # 单个文件提取超时（秒）
+    EXTRACTION_MEMORY_LIMIT_MB: int = int(os.getenv("EXTRACTION_MEMORY_LIMIT_MB", "1024"))  # 提取进程内存上限，0表示不限制
+    EXTRACTION_WORKER_MAX_DOCUMENTS: int = int(os.getenv("EXTRACTION_WORKER_MAX_DOCUMENTS", "50"))  # 提取进程处理多少文档后回收
     
     # 向量数据库配置
     VECTOR_DB_PATH: str = os.getenv("VECTOR_DB_PATH", "./vector_db")
@@ -72,10 +105,57 @@ class Config:
     RAG_MAX_CONTEXT_TOKENS: int = int(os.getenv("RAG_MAX_CONTEXT_TOKENS", "4000"))
     RAG_TOP_K_RETRIEVAL: int = int(os.getenv("RAG_TOP_K_RETRIEVAL", "5"))
     RAG_CONVERSATION_MAX_TURNS: int = int(os.getenv("RAG_CONVERSATION_MAX_TURNS", "10"))
+    RAG_HISTORY_CACHE_SESSIONS: int = int(os.getenv("RAG_HISTORY_CACHE_SESSIONS", "1000"))  # 内存中缓存对话历史的会话数上限
+    RAG_HISTORY_CACHE_TURNS: int = int(os.getenv("RAG_HISTORY_CACHE_TURNS", "20"))  # 每个会话缓存的最近轮次数
+    RAG_HISTORY_CANDIDATE_TURNS: int = int(os.getenv("RAG_HISTORY_CANDIDATE_TURNS", "10"))  # 参与相关性筛选的最近轮次数
+    RAG_HISTORY_RELEVANT_TURNS: int = int(os.getenv("RAG_HISTORY_RELEVANT_TURNS", "3"))  # 提示词中最多携带的历史轮次数
+    RAG_HISTORY_MIN_SIMILARITY: float = float(os.getenv("RAG_HISTORY_MIN_SIMILARITY", "0.5"))  # 历史问题与当前问题的最低相似度
+    CONVERSATION_WRITE_BEHIND_ENABLED: bool = os.getenv("CONVERSATION_WRITE_BEHIND_ENABLED", "True").lower() == "true"  # 对话轮次异步批量写入
+    CONVERSATION_WRITE_BATCH_SIZE: int = int(os.getenv("CONVERSATION_WRITE_BATCH_SIZE", "50"))  # 每个事务最多写入的记录数（同一请求的轮次不拆分）
+    CONVERSATION_WRITE_FLUSH_INTERVAL: float = float(os.getenv("CONVERSATION_WRITE_FLUSH_INTERVAL", "0.2"))  # 攒批等待时间（秒）
+    CONVERSATION_WRITE_SHUTDOWN_TIMEOUT: float = float(os.getenv("CONVERSATION_WRITE_SHUTDOWN_TIMEOUT", "30"))  # 关闭时等待写完的最长时间（秒）
     RAG_CACHE_TTL: int = int(os.getenv("RAG_CACHE_TTL", "3600"))  # 1小时
-    RAG_AI_TIMEOUT: int = int(os.getenv("RAG_AI_TIMEOUT", "30"))  # 30秒
+    RAG_AI_TIMEOUT: int = int(os.getenv("RAG_AI_TIMEOUT", "30"))  # 单次生成调用超时（秒）
+    RAG_REQUEST_DEADLINE: int = int(os.getenv("RAG_REQUEST_DEADLINE", "45"))  # 整个问答请求（embedding、检索、生成）的截止时间（秒）
     MAX_CHUNK_LENGTH_FOR_PROMPT = 800 # 每个块在提示词中的最大字符数
     
+    # 抽取式答案：生成服务熔断、失败或剩余时间不足时直接摘录原文句子作答
+    RAG_EXTRACTIVE_FALLBACK_ENABLED: bool = os.getenv("RAG_EXTRACTIVE_FALLBACK_ENABLED", "True").lower() == "true"
+    RAG_EXTRACTIVE_MIN_GENERATION_TIME: float = float(os.getenv("RAG_EXTRACTIVE_MIN_GENERATION_TIME", "3.0"))  # 剩余时间低于该值（秒）时不再调用生成服务
+    RAG_EXTRACTIVE_MAX_SENTENCES: int = int(os.getenv("RAG_EXTRACTIVE_MAX_SENTENCES", "5"))  # 最多摘录的句子数
+    
+    # 预设问题答案预生成：文献入库后在后台回答预设问题，首次点击直接返回
+    PRESET_PRECOMPUTE_ENABLED: bool = os.getenv("PRESET_PRECOMPUTE_ENABLED", "False").lower() == "true"
+    PRESET_PRECOMPUTE_QUESTIONS: int = int(os.getenv("PRESET_PRECOMPUTE_QUESTIONS", "5"))  # 每篇文献预生成的问题数
+    PRESET_PRECOMPUTE_INTERVAL: float = float(os.getenv("PRESET_PRECOMPUTE_INTERVAL", "2.0"))  # 两次生成之间的间隔（秒）
+    
+    # 批量问答
+    RAG_BATCH_MAX_QUESTIONS: int = int(os.getenv("RAG_BATCH_MAX_QUESTIONS", "20"))  # 单次请求最多的问题数
+    RAG_BATCH_MAX_CONCURRENCY: int = int(os.getenv("RAG_BATCH_MAX_CONCURRENCY", "3"))  # 同时生成答案的问题数
+    
+    # 自适应检索深度：先检索少量候选，结果不明确时再扩大检索范围
+    RAG_ADAPTIVE_RETRIEVAL_ENABLED: bool = os.getenv("RAG_ADAPTIVE_RETRIEVAL_ENABLED", "True").lower() == "true"
+    RAG_ADAPTIVE_INITIAL_K: int = int(os.getenv("RAG_ADAPTIVE_INITIAL_K", "8"))  # 首轮检索的候选数
+    RAG_ADAPTIVE_CONFIDENT_SIMILARITY: float = float(os.getenv("RAG_ADAPTIVE_CONFIDENT_SIMILARITY", "0.6"))  # 首条结果达到该相似度才可能提前结束
+    RAG_ADAPTIVE_MIN_SCORE_GAP: float = float(os.getenv("RAG_ADAPTIVE_MIN_SCORE_GAP", "0.15"))  # 首条与尾部结果的相似度差距
+    
+    # 问答流水线分阶段线程池
+    RAG_EXECUTOR_EMBEDDING_WORKERS: int = int(os.getenv("RAG_EXECUTOR_EMBEDDING_WORKERS", "8"))
+    RAG_EXECUTOR_VECTOR_WORKERS: int = int(os.getenv("RAG_EXECUTOR_VECTOR_WORKERS", "8"))
+    RAG_EXECUTOR_LLM_WORKERS: int = int(os.getenv("RAG_EXECUTOR_LLM_WORKERS", "16"))  # 大模型调用耗时长，单独放宽
+    RAG_EXECUTOR_CPU_WORKERS: int = int(os.getenv("RAG_EXECUTOR_CPU_WORKERS", "4"))  # 重排序、答案后处理
+    RAG_EXECUTOR_MAX_QUEUE: int = int(os.getenv("RAG_EXECUTOR_MAX_QUEUE", "200"))  # 每个阶段最大排队数，0表示不限制
+    
+    # 跨文献（研究组文献库）问答
+    RAG_LIBRARY_TOP_DOCUMENTS: int = int(os.getenv("RAG_LIBRARY_TOP_DOCUMENTS", "8"))  # 第一阶段筛选的文献数
+    RAG_LIBRARY_CHUNKS_PER_DOCUMENT: int = int(os.getenv("RAG_LIBRARY_CHUNKS_PER_DOCUMENT", "3"))  # 每篇文献保留的文本块数
+    RAG_LIBRARY_MAX_SOURCES: int = int(os.getenv("RAG_LIBRARY_MAX_SOURCES", "8"))  # 提示词中的来源总数
+    
+    # 分层向量（入库时生成文档、标题/摘要、章节级向量）
+    HIERARCHICAL_EMBEDDINGS_ENABLED: bool = os.getenv("HIERARCHICAL_EMBEDDINGS_ENABLED", "True").lower() == "true"
+    HIERARCHICAL_TITLE_CONTEXT_CHARS: int = int(os.getenv("HIERARCHICAL_TITLE_CONTEXT_CHARS", "1000"))  # 标题向量拼接的摘要字符数
+    RAG_LIBRARY_SECTION_CANDIDATES: int = int(os.getenv("RAG_LIBRARY_SECTION_CANDIDATES", "30"))  # 文献排序时检索的章节向量数
+    
     # 答案质量控制
     RAG_MIN_CONFIDENCE: float = float(os.getenv("RAG_MIN_CONFIDENCE", "0.3"))
     RAG_MAX_ANSWER_LENGTH: int = int(os.getenv("RAG_MAX_ANSWER_LENGTH", "2000"))
@@ -85,6 +165,22 @@ class Config:
     RAG_CACHE_EMBEDDING_MAX_SIZE: int = int(os.getenv("RAG_CACHE_EMBEDDING_MAX_SIZE", "1000"))
     RAG_CACHE_ANSWER_MAX_SIZE: int = int(os.getenv("RAG_CACHE_ANSWER_MAX_SIZE", "500"))
     RAG_CACHE_CHUNK_MAX_SIZE: int = int(os.getenv("RAG_CACHE_CHUNK_MAX_SIZE", "2000"))
+    RAG_CACHE_RETRIEVAL_MAX_SIZE: int = int(os.getenv("RAG_CACHE_RETRIEVAL_MAX_SIZE", "1000"))  # 检索结果缓存
+    
+    # 语义答案缓存（按问题向量相似度命中）
+    RAG_SEMANTIC_CACHE_ENABLED: bool = os.getenv("RAG_SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    RAG_SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.92"))  # 余弦相似度阈值
+    RAG_SEMANTIC_CACHE_MAX_PER_LITERATURE: int = int(os.getenv("RAG_SEMANTIC_CACHE_MAX_PER_LITERATURE", "200"))
+    RAG_SEMANTIC_CACHE_MAX_LITERATURES: int = int(os.getenv("RAG_SEMANTIC_CACHE_MAX_LITERATURES", "500"))
+    
+    # 定期维护：分批清理过期会话和任务记录
+    MAINTENANCE_ENABLED: bool = os.getenv("MAINTENANCE_ENABLED", "True").lower() == "true"
+    MAINTENANCE_INTERVAL: int = int(os.getenv("MAINTENANCE_INTERVAL", "3600"))  # 两次维护之间的间隔（秒）
+    MAINTENANCE_INITIAL_DELAY: int = int(os.getenv("MAINTENANCE_INITIAL_DELAY", "300"))  # 启动后首次维护的延迟（秒）
+    SESSION_RETENTION_DAYS: int = int(os.getenv("SESSION_RETENTION_DAYS", "30"))  # 超过该天数无活动的会话被清理
+    SESSION_CLEANUP_BATCH_SIZE: int = int(os.getenv("SESSION_CLEANUP_BATCH_SIZE", "200"))  # 每个事务删除的会话数
+    SESSION_CLEANUP_BATCH_PAUSE: float = float(os.getenv("SESSION_CLEANUP_BATCH_PAUSE", "0.05"))  # 批次之间让出写锁的时间（秒）
+    TASK_RETENTION_HOURS: int = int(os.getenv("TASK_RETENTION_HOURS", "24"))  # 任务记录保留时间（小时）
     
     # ===== 日志配置 =====
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
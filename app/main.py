@@ -2,7 +2,8 @@ import sys
 import logging
 import asyncio
 import os
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, status, Body
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, status, Body, Request
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
@@ -13,16 +14,24 @@ from app.models.research_group import ResearchGroup, UserResearchGroup
 from app.models.literature import Literature
 from app.auth import verify_password, get_current_user, create_access_token, authenticate_user_by_phone, create_refresh_token, get_password_hash
 from app.utils.auth_helper import require_group_membership, verify_group_membership, get_correct_file_path
-from app.utils.file_handler import validate_upload_file, generate_file_path, save_uploaded_file, get_file_info
+from app.utils.file_handler import (
+    validate_upload_file, generate_file_path, save_uploaded_file, get_file_info,
+    validate_file_type, save_file_stream, list_zip_members, cleanup_file
+)
 from app.utils.text_extractor import extract_metadata_from_file
 from app.utils.error_handler import (
     log_error, log_success, handle_file_upload_error, handle_permission_error,
     validate_file_upload, safe_file_operation, FileUploadError, PermissionError, ValidationError
 )
 from app.schemas import FileUploadResponse, LiteratureListResponse, LiteratureListItem, UserCreate, UserLogin, TokenWithRefresh, UserInfo, Token
+from app.schemas import BatchUploadResponse, BatchUploadItem
+from app.config import settings
+from starlette.concurrency import run_in_threadpool
+import zipfile
+import json
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from app.utils.auth_helper import verify_literature_access, get_literature_with_permission, verify_file_exists, get_content_type
 from app.routers import ai_chat
 
@@ -70,7 +79,23 @@ setup_logging()
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="文献管理系统", description="AI驱动的协作文献管理平台", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动后台任务和定期维护，关闭时等待未写入的对话落库"""
+    from app.utils.preset_answers import preset_precomputer
+    from app.utils.conversation_writer import conversation_writer
+    from app.utils.maintenance import maintenance_scheduler
+    preset_precomputer.start()
+    conversation_writer.start()
+    maintenance_scheduler.start()
+    try:
+        yield
+    finally:
+        # 后台线程使用同步数据库连接，在线程池中等待以免阻塞事件循环
+        await run_in_threadpool(maintenance_scheduler.stop)
+        await run_in_threadpool(conversation_writer.stop)
+
+app = FastAPI(title="文献管理系统", description="AI驱动的协作文献管理平台", version="1.0.0", lifespan=lifespan)
 
 # 添加CORS配置
 app.add_middleware(
@@ -355,7 +380,15 @@ async def upload_literature(
             "group_id": group_id
         })
         
-        # 10. 返回上传结果
+        # 10. 启动异步向量生成（单篇上传走交互式通道）
+        try:
+            from app.utils.async_processor import async_processor
+            task_id = async_processor.process_literature_async(literature.id, tenant=group_id)
+            logger.info(f"文献 {literature.id} 异步向量生成已启动，任务ID: {task_id}")
+        except Exception as e:
+            logger.warning(f"文献向量生成启动失败，但不影响上传: {e}")
+        
+        # 11. 返回上传结果
         return FileUploadResponse(
             message="文献上传成功",
             literature_id=literature.id,
@@ -462,7 +495,9 @@ async def upload_private_literature(
         # 8. 启动异步向量生成（私人文献）
         try:
             from app.utils.async_processor import async_processor
-            task_id = async_processor.process_literature_async(literature.id)
+            task_id = async_processor.process_literature_async(
+                literature.id, tenant=f"private_{current_user.id}"
+            )
             logger.info(f"私人文献 {literature.id} 异步向量生成已启动，任务ID: {task_id}")
         except Exception as e:
             logger.warning(f"私人文献向量生成启动失败，但不影响上传: {e}")
@@ -489,6 +524,357 @@ async def upload_private_literature(
         log_error("private_literature_upload", e, current_user.id, operation_info)
         raise handle_file_upload_error(e, file.filename, current_user.id)
 
+def _store_batch_files(files: List[UploadFile], archive: Optional[UploadFile], storage_dir: str):
+    """
+    将批量上传的文件和ZIP条目流式写入存储目录
+
+    Args:
+        files: 直接上传的文件列表
+        archive: ZIP压缩包（可选）
+        storage_dir: 存储目录名（研究组ID或 private_<用户ID>）
+
+    Returns:
+        Tuple: (已保存的文件信息列表, 被拒绝的 BatchUploadItem 列表)
+    """
+    stored = []
+    rejected = []
+    total_size = 0
+
+    def store(source, filename: str, size_hint: int = 0):
+        nonlocal total_size
+        if len(stored) >= settings.MAX_BATCH_FILES:
+            rejected.append(BatchUploadItem(filename=filename, status="rejected", message=f"超过单批次最大文件数 {settings.MAX_BATCH_FILES}"))
+            return
+        remaining = settings.MAX_BATCH_TOTAL_SIZE - total_size
+        if remaining <= 0 or size_hint > remaining:
+            rejected.append(BatchUploadItem(filename=filename, status="rejected", message="超过单批次总大小限制"))
+            return
+
+        # 声明的大小可能缺失或不准确，写入时按剩余额度截止，超出时删除已写入部分
+        full_path, relative_path = generate_file_path(storage_dir, filename)
+        written = save_file_stream(source, full_path, max_size=min(settings.MAX_FILE_SIZE, remaining))
+        if written is None:
+            rejected.append(BatchUploadItem(filename=filename, status="rejected", message="文件保存失败或超过大小限制"))
+            return
+        if written == 0:
+            cleanup_file(full_path)
+            rejected.append(BatchUploadItem(filename=filename, status="rejected", message="文件不能为空"))
+            return
+
+        total_size += written
+        stored.append({
+            "filename": filename,
+            "full_path": full_path,
+            "relative_path": relative_path,
+            "file_size": written,
+            "file_type": os.path.splitext(filename)[1].lower()
+        })
+
+    for file in files:
+        if not file.filename or not validate_file_type(file.filename):
+            rejected.append(BatchUploadItem(filename=file.filename or "", status="rejected", message="不支持的文件类型"))
+            continue
+        store(file.file, os.path.basename(file.filename), file.size or 0)
+
+    if archive is not None:
+        try:
+            with zipfile.ZipFile(archive.file) as zf:
+                members, skipped = list_zip_members(zf)
+                for filename, reason in skipped:
+                    rejected.append(BatchUploadItem(filename=filename, status="rejected", message=reason))
+                for info, filename in members:
+                    with zf.open(info) as source:
+                        store(source, filename, info.file_size)
+        except zipfile.BadZipFile:
+            rejected.append(BatchUploadItem(filename=archive.filename or "", status="rejected", message="无效的ZIP压缩包"))
+
+    return stored, rejected
+
+@app.post("/literature/upload/batch", response_model=BatchUploadResponse)
+async def upload_literature_batch(
+    files: List[UploadFile] = File(default=[]),
+    archive: Optional[UploadFile] = File(None),
+    group_id: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量上传文献（多文件或ZIP压缩包）
+
+    不传 group_id 时上传到个人库。所有文献在同一事务中入库，
+    随后统一提交后台处理，返回批次ID用于查询进度。
+    """
+    operation_info = {
+        "group_id": group_id,
+        "file_count": len(files),
+        "archive": archive.filename if archive else None
+    }
+
+    try:
+        if not files and archive is None:
+            raise HTTPException(status_code=400, detail="请至少上传一个文件或一个ZIP压缩包")
+
+        # 1. 成员校验只做一次
+        if group_id:
+            require_group_membership(current_user.id, group_id, db)
+        storage_dir = group_id if group_id else f"private_{current_user.id}"
+
+        # 2. 流式保存文件（在线程池中执行，避免阻塞事件循环）
+        stored, rejected = await run_in_threadpool(_store_batch_files, files, archive, storage_dir)
+
+        # 3. 在同一事务中创建所有数据库记录
+        literature_items = [
+            Literature(
+                title=os.path.splitext(item["filename"])[0] or item["filename"],
+                filename=item["filename"],
+                file_path=item["relative_path"],
+                file_size=item["file_size"],
+                file_type=item["file_type"],
+                uploaded_by=current_user.id,
+                research_group_id=group_id
+            )
+            for item in stored
+        ]
+
+        try:
+            if literature_items:
+                db.add_all(literature_items)
+                db.commit()
+        except Exception:
+            db.rollback()
+            # 数据库写入失败时清理本批次已保存的文件
+            for item in stored:
+                cleanup_file(item["full_path"])
+            raise
+
+        # 4. 统一提交后台处理
+        batch_id = None
+        if literature_items:
+            from app.utils.async_processor import async_processor
+            batch_id = async_processor.process_batch_async(
+                [literature.id for literature in literature_items],
+                {"uploaded_by": current_user.id, "group_id": group_id},
+                tenant=storage_dir
+            )
+
+        items = [
+            BatchUploadItem(
+                filename=literature.filename,
+                status="queued",
+                literature_id=literature.id,
+                file_size=literature.file_size
+            )
+            for literature in literature_items
+        ] + rejected
+
+        log_success("literature_batch_upload", current_user.id, {
+            **operation_info,
+            "batch_id": batch_id,
+            "accepted": len(literature_items),
+            "rejected": len(rejected)
+        })
+
+        return BatchUploadResponse(
+            message=f"成功上传 {len(literature_items)} 个文献，正在后台处理" if literature_items else "没有可导入的文献",
+            batch_id=batch_id,
+            total=len(items),
+            accepted=len(literature_items),
+            rejected=len(rejected),
+            items=items
+        )
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        log_error("literature_batch_upload", e, current_user.id, operation_info)
+        raise HTTPException(status_code=500, detail="批量上传失败")
+
+@app.get("/literature/upload/batch/{batch_id}")
+async def get_literature_batch_status(
+    batch_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    查询批量上传批次的处理状态
+    """
+    from app.utils.async_processor import async_processor
+    batch_status = async_processor.get_batch_status(batch_id)
+    if not batch_status or batch_status.get("uploaded_by") != current_user.id:
+        raise HTTPException(status_code=404, detail="批次不存在或已过期")
+    return batch_status
+
+@app.post("/literature/reindex/{group_id}")
+async def reindex_group_literature(
+    group_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    重建研究组全部文献的向量索引
+
+    任务进入 bulk 低优先级通道，不影响其他用户的单篇上传处理。
+    """
+    try:
+        require_group_membership(current_user.id, group_id, db)
+
+        literature_ids = [
+            row.id for row in db.query(Literature.id).filter(
+                Literature.research_group_id == group_id,
+                Literature.status == 'active'
+            ).all()
+        ]
+        if not literature_ids:
+            return {"message": "该研究组没有需要重建索引的文献", "batch_id": None, "total": 0}
+
+        from app.utils.async_processor import async_processor
+        from app.utils.ingestion_scheduler import PRIORITY_BULK
+        batch_id = async_processor.process_batch_async(
+            literature_ids,
+            {"uploaded_by": current_user.id, "group_id": group_id, "reindex": True},
+            priority=PRIORITY_BULK,
+            tenant=group_id
+        )
+
+        log_success("literature_reindex", current_user.id, {
+            "group_id": group_id,
+            "batch_id": batch_id,
+            "total": len(literature_ids)
+        })
+        return {"message": "已提交重建索引任务", "batch_id": batch_id, "total": len(literature_ids)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error("literature_reindex", e, current_user.id, {"group_id": group_id})
+        raise HTTPException(status_code=500, detail="提交重建索引任务失败")
+
+@app.post("/literature/{literature_id}/processing/cancel")
+async def cancel_literature_processing(
+    literature_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    取消文献的后台处理任务
+
+    已生成的向量会保留在断点中，重新处理时从断点继续。
+    """
+    get_literature_with_permission(literature_id, current_user.id, db)
+
+    from app.utils.async_processor import async_processor
+    if not async_processor.cancel_literature_processing(literature_id):
+        raise HTTPException(status_code=404, detail="该文献没有正在进行的处理任务")
+
+    log_success("literature_processing_cancel", current_user.id, {"literature_id": literature_id})
+    return {"message": "已请求取消处理任务", "literature_id": literature_id}
+
+@app.post("/literature/{literature_id}/processing/retry")
+async def retry_literature_processing(
+    literature_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    重新处理文献（失败或取消后），已保存的向量断点会被复用
+    """
+    literature = get_literature_with_permission(literature_id, current_user.id, db)
+
+    from app.utils.async_processor import async_processor
+    if async_processor.is_literature_processing(literature_id):
+        raise HTTPException(status_code=409, detail="该文献正在处理中")
+
+    tenant = literature.research_group_id or f"private_{literature.uploaded_by}"
+    task_id = async_processor.process_literature_async(literature_id, tenant=tenant)
+
+    log_success("literature_processing_retry", current_user.id, {
+        "literature_id": literature_id,
+        "task_id": task_id
+    })
+    return {"message": "已重新提交处理任务", "literature_id": literature_id, "task_id": task_id}
+
+@app.get("/literature/progress/stream")
+async def stream_literature_progress(
+    request: Request,
+    literature_id: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    以SSE推送文献处理进度（按文献ID或批次ID）
+
+    事件类型：progress（阶段变化）、end（全部处理结束）。
+    进度来自数据库中的共享进度存储，任意工作进程都能读取。
+    """
+    from app.utils.progress_store import progress_store, TERMINAL_STAGES
+
+    if bool(literature_id) == bool(batch_id):
+        raise HTTPException(status_code=400, detail="literature_id 和 batch_id 必须且只能提供一个")
+
+    if literature_id:
+        get_literature_with_permission(literature_id, current_user.id, db)
+        literature_ids = [literature_id]
+    else:
+        records = progress_store.get_batch(batch_id)
+        literature_ids = [record["literature_id"] for record in records]
+        if not literature_ids:
+            raise HTTPException(status_code=404, detail="批次不存在或已过期")
+        rows = db.query(Literature.uploaded_by, Literature.research_group_id).filter(
+            Literature.id.in_(literature_ids)
+        ).all()
+        group_ids = {row.research_group_id for row in rows if row.research_group_id}
+        allowed = all(
+            row.research_group_id or row.uploaded_by == current_user.id for row in rows
+        ) and all(
+            verify_group_membership(current_user.id, gid, db) for gid in group_ids
+        )
+        if not allowed:
+            raise HTTPException(status_code=403, detail="您无权查看此批次")
+
+    poll_interval = settings.INGEST_PROGRESS_POLL_INTERVAL
+    heartbeat_interval = 15.0
+
+    async def event_stream():
+        last_sent = {}
+        idle_time = 0.0
+        while True:
+            if await request.is_disconnected():
+                break
+
+            records = await run_in_threadpool(progress_store.get_many, literature_ids)
+            changed = False
+            for record in records:
+                key = (record["stage"], record["current"], record["updated_at"])
+                if last_sent.get(record["literature_id"]) != key:
+                    last_sent[record["literature_id"]] = key
+                    changed = True
+                    yield f"event: progress\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+
+            if records and len(records) == len(literature_ids) and all(
+                record["stage"] in TERMINAL_STAGES for record in records
+            ):
+                summary = {
+                    "total": len(records),
+                    "done": sum(1 for record in records if record["stage"] == "done"),
+                    "failed": sum(1 for record in records if record["stage"] == "failed")
+                }
+                yield f"event: end\ndata: {json.dumps(summary)}\n\n"
+                break
+
+            idle_time = 0.0 if changed else idle_time + poll_interval
+            if idle_time >= heartbeat_interval:
+                idle_time = 0.0
+                yield ": keep-alive\n\n"
+
+            await asyncio.sleep(poll_interval)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/literature/public/{group_id}", response_model=LiteratureListResponse)
 def get_group_literature(
     group_id: str,
@@ -3,8 +3,11 @@ from .base import BaseModel
 from .user import User
 from .research_group import ResearchGroup, UserResearchGroup
 from .literature import Literature
-from .conversation import QASession, ConversationTurn, ConversationSummary
+from .conversation import QASession, ConversationTurn, ConversationSummary, TurnEmbedding
+from .ingestion import IngestionProgress
+from .preset_answer import PresetAnswer
 
 # 导出所有模型
 __all__ = ['BaseModel', 'User', 'ResearchGroup', 'UserResearchGroup', 'Literature', 
-           'QASession', 'ConversationTurn', 'ConversationSummary']
\ No newline at end of file
+           'QASession', 'ConversationTurn', 'ConversationSummary', 'TurnEmbedding', 'IngestionProgress',
+           'PresetAnswer']
\ No newline at end of file
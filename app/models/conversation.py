@@ -3,7 +3,7 @@
 
 定义问答会话和对话轮次的数据结构
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Boolean, JSON, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -45,6 +45,12 @@ class QASession(BaseModel):
     literature = relationship("Literature", back_populates="qa_sessions")
     conversation_turns = relationship("ConversationTurn", back_populates="session", cascade="all, delete-orphan")
     
+    # 会话列表按用户（及文献）过滤、按最后活动时间排序
+    __table_args__ = (
+        Index("ix_qa_sessions_user_activity", "user_id", "last_activity"),
+        Index("ix_qa_sessions_user_literature_activity", "user_id", "literature_id", "last_activity"),
+    )
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if not self.session_id:
@@ -138,6 +144,11 @@ class ConversationTurn(BaseModel):
     # 关联关系
     session = relationship("QASession", back_populates="conversation_turns")
     
+    # 会话内按轮次序号读取
+    __table_args__ = (
+        Index("ix_conversation_turns_session_index", "session_id", "turn_index"),
+    )
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         if not self.turn_id:
@@ -250,6 +261,20 @@ class ConversationTurn(BaseModel):
         ]
 
 
+class TurnEmbedding(BaseModel):
+    """对话轮次问题向量模型，用于按语义相似度选择相关历史"""
+    __tablename__ = "conversation_turn_embeddings"
+    
+    # 主键（每个轮次一个向量）
+    turn_id = Column(String(36), ForeignKey("conversation_turns.turn_id", ondelete="CASCADE"), primary_key=True)
+    session_id = Column(String(36), nullable=False, index=True)
+    
+    # 问题向量（float32字节）
+    embedding = Column(LargeBinary, nullable=False)
+    dimension = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+
 class ConversationSummary(BaseModel):
     """对话摘要模型"""
     __tablename__ = "conversation_summaries"
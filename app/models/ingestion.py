@@ -0,0 +1,44 @@
+"""
+文献入库处理数据模型
+
+记录每篇文献在后台处理流水线中的阶段进度，
+存放在数据库中以便多个工作进程共享
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from datetime import datetime
+from app.models.base import BaseModel
+
+
+class IngestionProgress(BaseModel):
+    """文献处理进度模型"""
+    __tablename__ = "ingestion_progress"
+
+    # 每篇文献只保留最近一次处理的进度
+    literature_id = Column(String(36), primary_key=True)
+    batch_id = Column(String(36), index=True, nullable=True)  # 所属批次（批量上传时）
+    task_id = Column(String(100), nullable=True)
+
+    # 阶段：queued/extracting/chunking/embedding/storing/done/failed/cancelled
+    stage = Column(String(20), default="queued", nullable=False)
+    progress = Column(Integer, default=0, nullable=False)  # 百分比
+    current = Column(Integer, nullable=True)  # 阶段内已完成数量（如已生成向量的块数）
+    total = Column(Integer, nullable=True)  # 阶段内总数量
+    message = Column(Text)
+    error_type = Column(String(50), nullable=True)  # 失败原因分类（如 extraction_timeout）
+
+    updated_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            "literature_id": self.literature_id,
+            "batch_id": self.batch_id,
+            "task_id": self.task_id,
+            "stage": self.stage,
+            "progress": self.progress,
+            "current": self.current,
+            "total": self.total,
+            "message": self.message,
+            "error_type": self.error_type,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
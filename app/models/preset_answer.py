@@ -0,0 +1,31 @@
+"""
+预设问题答案数据模型
+
+文献入库后在后台预先生成的预设问题答案，
+持久化保存以便重启后和多个工作进程共享
+"""
+from sqlalchemy import Column, String, DateTime, JSON
+from datetime import datetime
+from app.models.base import BaseModel
+
+
+class PresetAnswer(BaseModel):
+    """预设问题答案模型"""
+    __tablename__ = "preset_answers"
+
+    # 每篇文献的每个预设问题只保留一个答案
+    literature_id = Column(String(36), primary_key=True)
+    question = Column(String(200), primary_key=True)
+
+    answer = Column(JSON, nullable=False)  # 与 rag_service.process_question 返回结构相同
+    model_name = Column(String(100))  # 生成答案的模型
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            "literature_id": self.literature_id,
+            "question": self.question,
+            "model_name": self.model_name,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
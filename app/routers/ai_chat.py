@@ -4,20 +4,30 @@ AI聊天路由
 提供RAG问答系统的API接口
 """
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional, Any
 from pydantic import BaseModel, Field, validator
+import json
 import logging
+import uuid
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.auth import get_current_user
 from app.models.user import User
 from app.models.literature import Literature
 from app.models.research_group import ResearchGroup
 from app.utils.rag_service import rag_service
 from app.utils.conversation_manager import conversation_manager
+from app.utils.conversation_writer import conversation_writer
+from app.utils.maintenance import maintenance_scheduler
+from app.utils.cache_manager import cache_manager
+from app.utils.vector_store import vector_store
+from app.utils.preset_answers import preset_answer_store
+from app.utils.auth_helper import require_group_membership
+from app.config import Config
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -40,6 +50,22 @@ class QARequest(BaseModel):
             raise ValueError('问题不能为空')
         return v.strip()
 
+class BatchQARequest(BaseModel):
+    """批量问答请求模型"""
+    questions: List[str] = Field(..., min_items=1, description="问题列表")
+    literature_id: str = Field(..., description="文献ID")
+    session_id: Optional[str] = Field(None, description="会话ID（可选）")
+    max_sources: int = Field(default=5, ge=1, le=10, description="最大引用来源数量")
+    
+    @validator('questions')
+    def validate_questions(cls, v):
+        if len(v) > Config.RAG_BATCH_MAX_QUESTIONS:
+            raise ValueError(f'单次最多提交 {Config.RAG_BATCH_MAX_QUESTIONS} 个问题')
+        questions = [question.strip() for question in v]
+        if any(not question or len(question) > 5000 for question in questions):
+            raise ValueError('问题不能为空且长度不能超过5000')
+        return questions
+
 class SourceInfo(BaseModel):
     """引用来源信息模型"""
     id: str = Field(..., description="来源ID")
@@ -59,6 +85,41 @@ class QAResponse(BaseModel):
     turn_id: str = Field(..., description="轮次ID")
     metadata: Dict[str, Any] = Field(..., description="元数据信息")
 
+class LibraryQARequest(BaseModel):
+    """跨文献问答请求模型"""
+    question: str = Field(..., min_length=1, max_length=5000, description="用户问题")
+    group_id: str = Field(..., description="研究组ID")
+    max_documents: int = Field(default=8, ge=1, le=30, description="参与检索的文献数量")
+    max_sources: int = Field(default=8, ge=1, le=20, description="最大引用来源数量")
+    
+    @validator('question')
+    def validate_question(cls, v):
+        if not v.strip():
+            raise ValueError('问题不能为空')
+        return v.strip()
+
+class LibrarySourceInfo(SourceInfo):
+    """跨文献问答引用来源（附带所属文献）"""
+    literature_id: str = Field(..., description="所属文献ID")
+    literature_title: str = Field(default="", description="所属文献标题")
+
+class LibraryDocumentInfo(BaseModel):
+    """第一阶段筛选出的文献"""
+    literature_id: str
+    literature_title: str
+    similarity: float
+    matched_section: Optional[str] = None  # 最佳匹配层级：document/abstract/method等
+
+class LibraryQAResponse(BaseModel):
+    """跨文献问答响应模型"""
+    answer: str = Field(..., description="主要回答内容")
+    key_findings: List[str] = Field(default=[], description="关键发现列表")
+    limitations: str = Field(default="", description="局限性说明")
+    sources: List[LibrarySourceInfo] = Field(..., description="引用来源列表")
+    documents: List[LibraryDocumentInfo] = Field(default=[], description="参与检索的文献")
+    confidence: float = Field(..., description="置信度分数")
+    metadata: Dict[str, Any] = Field(..., description="元数据信息")
+
 class ConversationTurnInfo(BaseModel):
     """对话轮次信息模型"""
     turn_id: str
@@ -119,8 +180,8 @@ async def ask_question(
                 detail="无权限访问该文献"
             )
         
-        # 获取或创建会话
-        session_id = conversation_manager.get_or_create_session(
+        # 获取或创建会话（新会话由后台写入器落库）
+        session_id = conversation_writer.get_or_create_session(
             user_id=current_user.id,
             group_id=literature.research_group_id,
             literature_id=request.literature_id,
@@ -128,13 +189,12 @@ async def ask_question(
             db=db
         )
         
-        # 获取对话历史（如果需要）
+        # 获取最近的对话历史（如果需要），由RAG服务按问题向量筛选相关轮次
         conversation_history = []
         if request.include_history:
-            conversation_history = conversation_manager.get_relevant_history(
+            conversation_history = conversation_manager.get_conversation_history(
                 session_id=session_id,
-                current_question=request.question,
-                max_turns=5,
+                max_turns=Config.RAG_HISTORY_CANDIDATE_TURNS,
                 db=db
             )
         
@@ -148,8 +208,8 @@ async def ask_question(
             top_k=request.max_sources
         )
         
-        # 记录对话轮次
-        turn_id = conversation_manager.add_qa_turn(
+        # 记录对话轮次（轮次ID立即分配，后台批量写入）
+        turn_id = conversation_writer.add_qa_turn(
             session_id=session_id,
             question=request.question,
             answer=rag_result["answer"],
@@ -159,56 +219,341 @@ async def ask_question(
             processing_time=rag_result["metadata"].get("processing_time", 0),
             prompt_tokens=rag_result["metadata"].get("prompt_tokens", 0),
             metadata=rag_result["metadata"],
+            question_embedding=rag_result.get("question_embedding"),
             db=db
         )
         
         # 构建响应
+        response = _build_qa_response(rag_result, session_id, turn_id)
+        
+        logger.info(f"问答完成，会话: {session_id}, 轮次: {turn_id}")
+        return response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"问答处理失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="问答处理失败，请重试"
+        )
+
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: QARequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    流式智能问答接口（Server-Sent Events）
+    
+    边生成边推送答案片段，事件类型：
+    - meta: 检索完成，包含会话ID和检索到的文档块数量
+    - section: 进入"关键发现"或"局限性说明"部分
+    - delta: 答案增量文本（附带所属部分）
+    - done: 完整的问答结果（与 /ai/ask 响应结构相同），此时对话已登记，由后台异步写入数据库
+    - error: 处理失败
+    """
+    logger.info(f"用户 {current_user.id} 流式提问: {request.question[:50]}...")
+    
+    # 验证文献权限
+    literature = db.query(Literature).filter(Literature.id == request.literature_id).first()
+    if not literature:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="文献不存在"
+        )
+    
+    if not _check_literature_access(current_user.id, literature, db):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问该文献"
+        )
+    
+    # 会话和历史在开始推送前准备好，权限或会话错误仍以普通HTTP错误返回
+    session_id = conversation_writer.get_or_create_session(
+        user_id=current_user.id,
+        group_id=literature.research_group_id,
+        literature_id=request.literature_id,
+        session_id=request.session_id,
+        db=db
+    )
+    
+    conversation_history = []
+    if request.include_history:
+        conversation_history = conversation_manager.get_conversation_history(
+            session_id=session_id,
+            max_turns=Config.RAG_HISTORY_CANDIDATE_TURNS,
+            db=db
+        )
+    
+    group_id = literature.research_group_id
+    
+    def _sse(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    
+    async def event_generator():
+        try:
+            async for event in rag_service.stream_question(
+                question=request.question,
+                literature_id=request.literature_id,
+                group_id=group_id,
+                session_id=session_id,
+                conversation_history=conversation_history,
+                top_k=request.max_sources
+            ):
+                event_type = event.get("type")
+                
+                if event_type == "meta":
+                    yield _sse("meta", {
+                        "session_id": session_id,
+                        "chunks_retrieved": event.get("chunks_retrieved", 0),
+                        "retrieval_depth": event.get("retrieval_depth")
+                    })
+                elif event_type == "section":
+                    yield _sse("section", {"section": event["section"]})
+                elif event_type == "delta":
+                    yield _sse("delta", {"section": event["section"], "text": event["text"]})
+                elif event_type == "result":
+                    rag_result = event["answer"]
+                    
+                    # 请求级数据库会话可能在响应开始后已关闭，回退为同步写入时单独创建
+                    turn_db = SessionLocal()
+                    try:
+                        turn_id = conversation_writer.add_qa_turn(
+                            session_id=session_id,
+                            question=request.question,
+                            answer=rag_result["answer"],
+                            confidence=rag_result["confidence"],
+                            quality_scores=rag_result["quality_score"],
+                            chunks_used=rag_result["metadata"].get("chunks_retrieved", 0),
+                            processing_time=rag_result["metadata"].get("processing_time", 0),
+                            prompt_tokens=rag_result["metadata"].get("prompt_tokens", 0),
+                            metadata=rag_result["metadata"],
+                            question_embedding=rag_result.get("question_embedding"),
+                            db=turn_db
+                        )
+                    finally:
+                        turn_db.close()
+                    
+                    response = _build_qa_response(rag_result, session_id, turn_id)
+                    yield _sse("done", response.dict())
+                    logger.info(f"流式问答完成，会话: {session_id}, 轮次: {turn_id}")
+        except Exception as e:
+            logger.error(f"流式问答处理失败: {str(e)}")
+            yield _sse("error", {"detail": "问答处理失败，请重试"})
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.post("/ask/batch")
+async def ask_question_batch(
+    request: BatchQARequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    批量问答接口（Server-Sent Events）
+    
+    对同一文献一次提交多个问题，权限检查和会话查找只做一次，
+    问题的embedding和向量检索各合并为一次调用，生成阶段有限并发。事件类型：
+    - meta: 会话ID和问题数量
+    - answer: 单个问题的结果（按完成顺序推送，index 为问题在请求中的序号）
+    - done: 全部问题处理完成，所有对话轮次已提交后台保存
+    - error: 处理失败
+    
+    客户端中途断开或处理出错时，已推送的答案同样会保存，其轮次ID可直接用于反馈和历史查询。
+    """
+    logger.info(f"用户 {current_user.id} 批量提问: {len(request.questions)} 个问题")
+    
+    literature = db.query(Literature).filter(Literature.id == request.literature_id).first()
+    if not literature:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="文献不存在"
+        )
+    
+    if not _check_literature_access(current_user.id, literature, db):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问该文献"
+        )
+    
+    session_id = conversation_writer.get_or_create_session(
+        user_id=current_user.id,
+        group_id=literature.research_group_id,
+        literature_id=request.literature_id,
+        session_id=request.session_id,
+        db=db
+    )
+    group_id = literature.research_group_id
+    
+    def _sse(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+    
+    # 轮次ID预先分配，推送答案时即可返回，已推送的答案在结束时一次性登记保存
+    turns = [None] * len(request.questions)
+    
+    def _save_turns() -> List[str]:
+        answered = [turn for turn in turns if turn is not None]
+        if not answered:
+            return []
+        # 请求级数据库会话可能在响应开始后已关闭，保存对话时单独创建
+        turn_db = SessionLocal()
+        try:
+            return conversation_writer.add_qa_turns(session_id, answered, turn_db)
+        finally:
+            turn_db.close()
+    
+    async def event_generator():
+        saved = False
+        try:
+            yield _sse("meta", {"session_id": session_id, "total": len(request.questions)})
+            
+            async for index, rag_result in rag_service.process_question_batch(
+                questions=request.questions,
+                literature_id=request.literature_id,
+                group_id=group_id,
+                session_id=session_id,
+                top_k=request.max_sources
+            ):
+                turn_id = str(uuid.uuid4())
+                turns[index] = {
+                    "turn_id": turn_id,
+                    "question": request.questions[index],
+                    "answer": rag_result["answer"],
+                    "confidence": rag_result["confidence"],
+                    "quality_scores": rag_result["quality_score"],
+                    "chunks_used": rag_result["metadata"].get("chunks_retrieved", 0),
+                    "processing_time": rag_result["metadata"].get("processing_time", 0),
+                    "prompt_tokens": rag_result["metadata"].get("prompt_tokens", 0),
+                    "metadata": rag_result["metadata"],
+                    "question_embedding": rag_result.get("question_embedding")
+                }
+                response = _build_qa_response(rag_result, session_id, turn_id)
+                yield _sse("answer", {"index": index, "question": request.questions[index], **response.dict()})
+            
+            saved = True
+            turn_ids = await run_in_threadpool(_save_turns)
+            
+            yield _sse("done", {"session_id": session_id, "turn_ids": turn_ids})
+            logger.info(f"批量问答完成，会话: {session_id}, 轮次: {len(turn_ids)}")
+        except Exception as e:
+            logger.error(f"批量问答处理失败: {str(e)}")
+            yield _sse("error", {"detail": "批量问答处理失败，请重试"})
+        finally:
+            # 客户端中途断开或处理出错时，已推送给客户端的轮次ID仍要保存；
+            # 生成器关闭时不能再等待，直接登记（写入器运行时只是入队）
+            if not saved:
+                try:
+                    turn_ids = _save_turns()
+                    if turn_ids:
+                        logger.info(f"批量问答中断，已保存 {len(turn_ids)} 个已回答的轮次，会话: {session_id}")
+                except Exception as e:
+                    logger.error(f"批量问答中断后保存对话失败: {str(e)}")
+    
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.post("/ask/library", response_model=LibraryQAResponse)
+async def ask_library_question(
+    request: LibraryQARequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    跨文献问答接口
+    
+    在研究组的全部文献中检索并回答问题，引用来源标注所属文献。
+    跨文献问答不绑定单篇文献，因此不写入会话历史。
+    """
+    require_group_membership(current_user.id, request.group_id, db)
+    
+    try:
+        logger.info(f"用户 {current_user.id} 跨文献提问: {request.question[:50]}... (研究组: {request.group_id})")
+        
+        rag_result = await rag_service.process_library_question(
+            question=request.question,
+            group_id=request.group_id,
+            top_documents=request.max_documents,
+            max_sources=request.max_sources
+        )
+        
         sources = []
         for source in rag_result.get("sources", []):
             try:
-                source_info = SourceInfo(
+                sources.append(LibrarySourceInfo(
                     id=source.get("source_id", ""),
                     text=source.get("text", ""),
                     similarity=float(source.get("similarity", 0.0)),
                     description=source.get("description", ""),
-                    chunk_index=int(source.get("chunk_index", 0))
-                )
-                sources.append(source_info)
+                    chunk_index=int(source.get("chunk_index", 0)),
+                    literature_id=source.get("literature_id") or "",
+                    literature_title=source.get("literature_title") or ""
+                ))
             except (ValueError, TypeError) as e:
                 logger.warning(f"构建source信息失败: {e}")
                 continue
         
-        # 确保所有数值字段都有有效值
-        confidence = float(rag_result.get("confidence", 0.0))
-        processing_time = float(rag_result.get("metadata", {}).get("processing_time", 0.0))
-        
-        response = QAResponse(
+        return LibraryQAResponse(
             answer=rag_result.get("answer", "抱歉，无法生成答案"),
             key_findings=rag_result.get("key_findings", []),
             limitations=rag_result.get("limitations", ""),
             sources=sources,
-            confidence=confidence,
-            session_id=session_id,
-            turn_id=turn_id,
-            metadata={
-                **rag_result.get("metadata", {}),
-                "processing_time": processing_time,
-                "confidence": confidence
-            }
+            documents=[LibraryDocumentInfo(**document) for document in rag_result.get("documents", [])],
+            confidence=float(rag_result.get("confidence", 0.0)),
+            metadata=rag_result.get("metadata", {})
         )
         
-        logger.info(f"问答完成，会话: {session_id}, 轮次: {turn_id}")
-        return response
-        
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"问答处理失败: {str(e)}")
+        logger.error(f"跨文献问答处理失败: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="问答处理失败，请重试"
         )
 
+@router.post("/library/{group_id}/summaries/rebuild")
+async def rebuild_library_summaries(
+    group_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    为研究组已入库的文献补建文档级向量
+    
+    新处理的文献会自动生成文档级向量，本接口用于此前入库的文献。
+    文档级向量直接由已存储的文本块向量计算；启用分层向量时，
+    每篇文献还会调用一次embedding接口生成标题/摘要向量（文献恢复时同样如此）。
+    """
+    require_group_membership(current_user.id, group_id, db)
+    
+    literatures = db.query(Literature.id, Literature.title).filter(
+        Literature.research_group_id == group_id,
+        Literature.status == 'active'
+    ).all()
+    
+    def _rebuild() -> int:
+        return sum(
+            1 for literature in literatures
+            if vector_store.rebuild_document_summary(literature.id, group_id, literature.title)
+        )
+    
+    rebuilt = await run_in_threadpool(_rebuild)
+    logger.info(f"研究组 {group_id} 文档级向量补建完成: {rebuilt}/{len(literatures)}")
+    return {"group_id": group_id, "total": len(literatures), "rebuilt": rebuilt}
+
 @router.get("/preset-questions/{literature_id}")
 async def get_preset_questions(
     literature_id: str,
@@ -239,10 +584,14 @@ async def get_preset_questions(
             literature_title=literature.title
         )
         
+        # 已在入库后预先生成答案的问题数量，这些问题点击后直接返回
+        precomputed = await run_in_threadpool(preset_answer_store.count, literature_id)
+        
         return {
             "literature_id": literature_id,
             "literature_title": literature.title,
-            "questions": preset_questions
+            "questions": preset_questions,
+            "precomputed_answers": precomputed
         }
         
     except HTTPException:
@@ -258,27 +607,32 @@ async def get_preset_questions(
 async def get_user_sessions(
     literature_id: Optional[str] = None,
     limit: int = 20,
-    offset: int = 0,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     获取用户的对话会话列表
+    
+    按最后活动时间倒序，使用游标分页：响应中的 next_cursor 作为下一页的 cursor 参数，
+    为空表示没有更多会话。总数需要全量计数，仅在 include_total=true 时返回。
     """
+    limit = max(1, min(limit, 100))
     try:
-        from app.models.conversation import QASession
-        from sqlalchemy import desc, and_
-        
-        # 构建查询条件
-        conditions = [QASession.user_id == current_user.id]
-        if literature_id:
-            conditions.append(QASession.literature_id == literature_id)
-        
-        # 查询会话
-        query = db.query(QASession).filter(and_(*conditions))
-        total = query.count()
-        
-        sessions = query.order_by(desc(QASession.last_activity)).offset(offset).limit(limit).all()
+        try:
+            sessions, next_cursor = conversation_manager.list_sessions(
+                user_id=current_user.id,
+                literature_id=literature_id,
+                limit=limit,
+                cursor=cursor,
+                db=db
+            )
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="无效的分页游标"
+            )
         
         # 转换为响应格式
         session_list = []
@@ -297,13 +651,22 @@ async def get_user_sessions(
             )
             session_list.append(session_info)
         
-        return {
+        response = {
             "sessions": session_list,
-            "total": total,
             "limit": limit,
-            "offset": offset
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
+        if include_total:
+            from app.models.conversation import QASession
+            conditions = [QASession.user_id == current_user.id]
+            if literature_id:
+                conditions.append(QASession.literature_id == literature_id)
+            response["total"] = db.query(QASession).filter(*conditions).count()
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取会话列表失败: {str(e)}")
         raise HTTPException(
@@ -316,15 +679,23 @@ async def get_conversation_history(
     session_id: str,
     include_full_content: bool = True,
     limit: int = 50,
+    after_turn_index: int = 0,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     获取指定会话的对话历史
+    
+    按轮次序号正序分页：响应中的 next_turn_index 作为下一页的 after_turn_index 参数，
+    为空表示已到最后一轮。
     """
     try:
-        from app.models.conversation import QASession, ConversationTurn
-        from sqlalchemy import and_, desc
+        from app.models.conversation import QASession
+        from sqlalchemy import and_
+        
+        # 新会话和新轮次由后台异步写入，尚未落库时先等待写入完成
+        if conversation_writer.is_pending_session(session_id):
+            await run_in_threadpool(conversation_writer.wait_for_session, session_id)
         
         # 验证会话所有权
         session = db.query(QASession).filter(
@@ -341,14 +712,12 @@ async def get_conversation_history(
             )
         
         # 获取对话轮次
-        turns_query = db.query(ConversationTurn).filter(
-            ConversationTurn.session_id == session_id
-        ).order_by(ConversationTurn.turn_index)
-        
-        if limit > 0:
-            turns_query = turns_query.limit(limit)
-        
-        turns = turns_query.all()
+        turns, next_turn_index = conversation_manager.list_turns(
+            session_id=session_id,
+            limit=limit,
+            after_turn_index=after_turn_index,
+            db=db
+        )
         
         # 转换为响应格式
         conversation_turns = []
@@ -382,7 +751,8 @@ async def get_conversation_history(
         return {
             "session": session_info,
             "turns": conversation_turns,
-            "total_turns": len(turns)
+            "total_turns": len(turns),
+            "next_turn_index": next_turn_index
         }
         
     except HTTPException:
@@ -440,6 +810,10 @@ async def submit_feedback(
         from app.models.conversation import ConversationTurn, QASession
         from sqlalchemy import and_
         
+        # 新轮次由后台异步写入，尚未落库时先等待写入完成
+        if conversation_writer.is_pending_turn(feedback.turn_id):
+            await run_in_threadpool(conversation_writer.wait_for_turn, feedback.turn_id)
+        
         # 验证轮次所有权
         turn = db.query(ConversationTurn).join(QASession).filter(
             and_(
@@ -458,6 +832,14 @@ async def submit_feedback(
         turn.set_user_feedback(feedback.rating, feedback.feedback)
         db.commit()
         
+        # 低分的语义缓存答案视为误命中，从缓存中移除
+        answer_metadata = turn.answer_metadata or {}
+        semantic_hit = answer_metadata.get("semantic_cache")
+        if feedback.rating <= 2 and semantic_hit and answer_metadata.get("literature_id"):
+            cache_manager.record_semantic_false_hit(
+                answer_metadata["literature_id"], semantic_hit.get("entry_id", "")
+            )
+        
         logger.info(f"用户 {current_user.id} 提交反馈，轮次: {feedback.turn_id}, 评分: {feedback.rating}")
         
         return {"message": "反馈提交成功"}
@@ -497,6 +879,8 @@ async def get_service_stats(
     """
     try:
         stats = rag_service.get_service_stats()
+        stats["conversation_writer"] = conversation_writer.get_stats()
+        stats["maintenance"] = maintenance_scheduler.get_stats()
         return stats
         
     except Exception as e:
@@ -507,6 +891,52 @@ async def get_service_stats(
         )
 
 # 辅助函数
+def _build_qa_response(rag_result: Dict[str, Any], session_id: str, turn_id: str) -> QAResponse:
+    """
+    将RAG处理结果转换为问答响应
+    
+    Args:
+        rag_result: RAG服务返回的结果
+        session_id: 会话ID
+        turn_id: 轮次ID
+        
+    Returns:
+        QAResponse: 问答响应
+    """
+    sources = []
+    for source in rag_result.get("sources", []):
+        try:
+            source_info = SourceInfo(
+                id=source.get("source_id", ""),
+                text=source.get("text", ""),
+                similarity=float(source.get("similarity", 0.0)),
+                description=source.get("description", ""),
+                chunk_index=int(source.get("chunk_index", 0))
+            )
+            sources.append(source_info)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"构建source信息失败: {e}")
+            continue
+    
+    # 确保所有数值字段都有有效值
+    confidence = float(rag_result.get("confidence", 0.0))
+    processing_time = float(rag_result.get("metadata", {}).get("processing_time", 0.0))
+    
+    return QAResponse(
+        answer=rag_result.get("answer", "抱歉，无法生成答案"),
+        key_findings=rag_result.get("key_findings", []),
+        limitations=rag_result.get("limitations", ""),
+        sources=sources,
+        confidence=confidence,
+        session_id=session_id,
+        turn_id=turn_id,
+        metadata={
+            **rag_result.get("metadata", {}),
+            "processing_time": processing_time,
+            "confidence": confidence
+        }
+    )
+
 def _check_literature_access(user_id: str, literature: Literature, db: Session) -> bool:
     """
     检查用户是否有权限访问指定文献
@@ -57,7 +57,7 @@ async def get_cache_health() -> Dict[str, Any]:
 async def clear_cache(
     cache_type: Optional[str] = Query(
         default="all", 
-        description="缓存类型: all, embedding, answer, chunk, 或指定literature_id"
+        description="缓存类型: all, embedding, answer, chunk, retrieval, semantic, 或指定literature_id"
     )
 ) -> Dict[str, Any]:
     """
@@ -82,6 +82,12 @@ async def clear_cache(
         elif cache_type == "chunk":
             success = cache_manager.chunk_cache.clear()
             message = "文档块缓存已清理"
+        elif cache_type == "retrieval":
+            success = cache_manager.retrieval_cache.clear()
+            message = "检索结果缓存已清理"
+        elif cache_type == "semantic":
+            success = cache_manager.semantic_cache.clear()
+            message = "语义答案缓存已清理"
         elif cache_type.startswith("literature_"):
             # 假设格式为 literature_<id>
             literature_id = cache_type.replace("literature_", "")
@@ -111,7 +117,7 @@ async def get_cache_info(cache_type: str) -> Dict[str, Any]:
     获取指定缓存类型的详细信息
     
     Args:
-        cache_type: 缓存类型 (embedding, answer, chunk)
+        cache_type: 缓存类型 (embedding, answer, chunk, retrieval, semantic)
         
     Returns:
         Dict: 缓存详细信息
@@ -123,6 +129,10 @@ async def get_cache_info(cache_type: str) -> Dict[str, Any]:
             info = cache_manager.answer_cache.info()
         elif cache_type == "chunk":
             info = cache_manager.chunk_cache.info()
+        elif cache_type == "retrieval":
+            info = cache_manager.retrieval_cache.info()
+        elif cache_type == "semantic":
+            info = cache_manager.semantic_cache.info()
         else:
             raise HTTPException(status_code=400, detail="无效的缓存类型")
         
@@ -147,7 +157,7 @@ async def get_cache_keys(
     获取指定缓存类型的键列表（用于调试）
     
     Args:
-        cache_type: 缓存类型 (embedding, answer, chunk)
+        cache_type: 缓存类型 (embedding, answer, chunk, retrieval)
         limit: 返回键的数量限制
         
     Returns:
@@ -160,6 +170,8 @@ async def get_cache_keys(
             keys = cache_manager.answer_cache.keys()
         elif cache_type == "chunk":
             keys = cache_manager.chunk_cache.keys()
+        elif cache_type == "retrieval":
+            keys = cache_manager.retrieval_cache.keys()
         else:
             raise HTTPException(status_code=400, detail="无效的缓存类型")
         
@@ -189,7 +201,7 @@ async def delete_cache_key(cache_type: str, key: str) -> Dict[str, Any]:
     删除指定缓存键
     
     Args:
-        cache_type: 缓存类型 (embedding, answer, chunk)
+        cache_type: 缓存类型 (embedding, answer, chunk, retrieval)
         key: 要删除的缓存键
         
     Returns:
@@ -202,6 +214,8 @@ async def delete_cache_key(cache_type: str, key: str) -> Dict[str, Any]:
             success = cache_manager.answer_cache.delete(key)
         elif cache_type == "chunk":
             success = cache_manager.chunk_cache.delete(key)
+        elif cache_type == "retrieval":
+            success = cache_manager.retrieval_cache.delete(key)
         else:
             raise HTTPException(status_code=400, detail="无效的缓存类型")
         
@@ -121,4 +121,21 @@ class FileUploadResponse(BaseModel):
     literature_id: str
     title: str
     filename: str
-    file_size: int
\ No newline at end of file
+    file_size: int
+
+# 批量上传单个文件结果
+class BatchUploadItem(BaseModel):
+    filename: str
+    status: str  # queued/rejected
+    literature_id: Optional[str] = None
+    file_size: Optional[int] = None
+    message: Optional[str] = None
+
+# 批量上传响应模型
+class BatchUploadResponse(BaseModel):
+    message: str
+    batch_id: Optional[str] = None
+    total: int
+    accepted: int
+    rejected: int
+    items: List[BatchUploadItem]
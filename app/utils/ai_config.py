@@ -5,11 +5,69 @@ AI服务配置和初始化
 
 import os
 import logging
+import threading
 from typing import Optional, Any
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# ===== 共享SDK客户端 =====
+# 每个提供商只创建一个客户端，复用其内部HTTP连接池；
+# Google GenAI 客户端同时提供同步接口和 .aio 异步接口
+
+_client_lock = threading.Lock()
+_genai_client = None
+_openai_client = None
+_async_openai_client = None
+
+def get_genai_client():
+    """
+    获取共享的Google GenAI客户端
+
+    Returns:
+        genai.Client: 客户端实例，未配置API密钥时返回None
+    """
+    global _genai_client
+    if _genai_client is None and settings.GOOGLE_API_KEY:
+        with _client_lock:
+            if _genai_client is None:
+                from google import genai
+                _genai_client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+                logger.info("共享Google GenAI客户端初始化成功")
+    return _genai_client
+
+def get_openai_client():
+    """
+    获取共享的OpenAI同步客户端
+
+    Returns:
+        openai.OpenAI: 客户端实例，未配置API密钥时返回None
+    """
+    global _openai_client
+    if _openai_client is None and settings.OPENAI_API_KEY:
+        with _client_lock:
+            if _openai_client is None:
+                import openai
+                _openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+                logger.info("共享OpenAI客户端初始化成功")
+    return _openai_client
+
+def get_async_openai_client():
+    """
+    获取共享的OpenAI异步客户端（同步和异步客户端的连接池不能混用，各保留一个）
+
+    Returns:
+        openai.AsyncOpenAI: 客户端实例，未配置API密钥时返回None
+    """
+    global _async_openai_client
+    if _async_openai_client is None and settings.OPENAI_API_KEY:
+        with _client_lock:
+            if _async_openai_client is None:
+                import openai
+                _async_openai_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+                logger.info("共享OpenAI异步客户端初始化成功")
+    return _async_openai_client
+
 class AIServiceManager:
     """AI服务管理器"""
     
@@ -17,6 +75,8 @@ class AIServiceManager:
         self.provider = settings.get_ai_provider()
         self.llm_client = None
         self.embedding_client = None
+        # 直接调用SDK时使用的共享客户端（与embedding_service、rag_service共用）
+        self.sdk_client = None
         self._initialize_clients()
     
     def _initialize_clients(self):
@@ -39,6 +99,7 @@ class AIServiceManager:
             
             # 配置Google AI
             genai.configure(api_key=settings.GOOGLE_API_KEY)
+            self.sdk_client = get_genai_client()
             
             # 初始化LLM客户端
             self.llm_client = ChatGoogleGenerativeAI(
@@ -68,6 +129,8 @@ class AIServiceManager:
         try:
             from langchain_openai import ChatOpenAI, OpenAIEmbeddings
             
+            self.sdk_client = get_openai_client()
+            
             # 初始化LLM客户端
             self.llm_client = ChatOpenAI(
                 model=settings.OPENAI_MODEL,
@@ -97,6 +160,12 @@ class AIServiceManager:
             raise RuntimeError("LLM客户端未初始化")
         return self.llm_client
     
+    def get_sdk_client(self):
+        """获取共享的SDK客户端"""
+        if not self.sdk_client:
+            raise RuntimeError("SDK客户端未初始化")
+        return self.sdk_client
+    
     def get_embedding_client(self):
         """获取Embedding客户端"""
         if not self.embedding_client:
@@ -257,7 +257,9 @@ class AnswerProcessor:
                         "similarity": chunk.get("similarity", 0),
                         "description": f"来源{ref_num}的相关内容",
                         "page_number": chunk.get("page_number"),
-                        "section": chunk.get("section")
+                        "section": chunk.get("section"),
+                        "literature_id": chunk.get("literature_id"),
+                        "literature_title": chunk.get("literature_title")
                     }
                     sources.append(source_info)
             except (ValueError, IndexError):
@@ -273,7 +275,9 @@ class AnswerProcessor:
                     "similarity": chunk.get("similarity", 0),
                     "description": f"相关度最高的文档块{i + 1}",
                     "page_number": chunk.get("page_number"),
-                    "section": chunk.get("section")
+                    "section": chunk.get("section"),
+                    "literature_id": chunk.get("literature_id"),
+                    "literature_title": chunk.get("literature_title")
                 }
                 sources.append(source_info)
         
@@ -604,4 +608,85 @@ class AnswerProcessor:
                     2
                 )
             }
-        } 
\ No newline at end of file
+        } 
+
+
+class StreamingAnswerParser:
+    """
+    流式答案增量解析器
+
+    在AI逐段返回文本时识别"关键发现："和"局限性说明："标题，
+    把增量文本归入对应部分。最终的结构化结果仍以 AnswerProcessor.process_answer 为准。
+    """
+
+    SECTION_MARKERS = [
+        ("key_findings", "关键发现："),
+        ("limitations", "局限性说明：")
+    ]
+    SECTION_ORDER = ["answer", "key_findings", "limitations"]
+
+    def __init__(self):
+        self.section = "answer"
+        self._pending = ""
+        self._max_marker_length = max(len(marker) for _, marker in self.SECTION_MARKERS)
+
+    def feed(self, delta: str) -> List[Dict[str, str]]:
+        """
+        输入一段新的增量文本
+
+        Args:
+            delta: AI新返回的文本
+
+        Returns:
+            List[Dict]: 事件列表，{"type": "delta", "section", "text"} 或 {"type": "section", "section"}
+        """
+        text = self._pending + (delta or "")
+        self._pending = ""
+        events = []
+
+        while True:
+            index, next_section, marker = self._find_next_marker(text)
+            if index == -1:
+                break
+            if text[:index]:
+                events.append({"type": "delta", "section": self.section, "text": text[:index]})
+            self.section = next_section
+            events.append({"type": "section", "section": next_section})
+            text = text[index + len(marker):]
+
+        # 末尾可能是被截断的标题（如"关键"），暂存到下一段再判断
+        hold = self._partial_marker_length(text)
+        if hold:
+            self._pending = text[-hold:]
+            text = text[:-hold]
+        if text:
+            events.append({"type": "delta", "section": self.section, "text": text})
+
+        return events
+
+    def finish(self) -> List[Dict[str, str]]:
+        """输出暂存的剩余文本"""
+        if not self._pending:
+            return []
+        text, self._pending = self._pending, ""
+        return [{"type": "delta", "section": self.section, "text": text}]
+
+    def _find_next_marker(self, text: str) -> Tuple[int, Optional[str], Optional[str]]:
+        """查找当前部分之后最早出现的标题"""
+        current_order = self.SECTION_ORDER.index(self.section)
+        best = (-1, None, None)
+        for section, marker in self.SECTION_MARKERS:
+            if self.SECTION_ORDER.index(section) <= current_order:
+                continue
+            index = text.find(marker)
+            if index != -1 and (best[0] == -1 or index < best[0]):
+                best = (index, section, marker)
+        return best
+
+    def _partial_marker_length(self, text: str) -> int:
+        """文本末尾与任一标题前缀重合的最大长度"""
+        for length in range(min(len(text), self._max_marker_length - 1), 0, -1):
+            tail = text[-length:]
+            if any(marker.startswith(tail) for _, marker in self.SECTION_MARKERS):
+                return length
+        return 0
@@ -5,31 +5,107 @@
 
 import threading
 import time
+import uuid
 import logging
-from typing import Optional, Dict, Callable
+from typing import Optional, Dict, List, Tuple, Callable
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.literature import Literature
-from app.utils.text_extractor import extract_text_from_file, extract_metadata_from_file
+from app.utils.text_extractor import extract_metadata_from_file
+from app.utils.extraction_sandbox import extract_text_sandboxed
 from app.utils.text_processor import split_text_into_chunks, prepare_chunks_for_embedding
-from app.utils.embedding_service import embedding_service
+from app.utils.embedding_service import embedding_service, average_embedding
 from app.utils.vector_store import vector_store
-from app.utils.error_handler import log_error, log_success
+from app.utils.hierarchical_embeddings import build_hierarchical_vectors
+from app.utils.cache_manager import cache_manager
+from app.utils.preset_answers import preset_answer_store, preset_precomputer
+from app.utils.error_handler import log_error, log_success, TaskCancelledError
+from app.utils.ingestion_checkpoint import embedding_checkpoint
+from app.utils.progress_store import (
+    progress_store, STAGE_QUEUED, STAGE_EXTRACTING, STAGE_CHUNKING,
+    STAGE_EMBEDDING, STAGE_STORING, STAGE_DONE, STAGE_FAILED, STAGE_CANCELLED
+)
+from app.utils.ingestion_scheduler import (
+    IngestionScheduler, PRIORITY_INTERACTIVE, PRIORITY_GROUP
+)
+from app.config import settings
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+class CancellationToken:
+    """协作式取消令牌，工作线程在阶段之间和向量批次之间检查"""
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        """请求取消"""
+        self._event.set()
+    
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def raise_if_cancelled(self):
+        """已请求取消时抛出 TaskCancelledError"""
+        if self._event.is_set():
+            raise TaskCancelledError("任务已取消")
+    
+    def wait(self, timeout: float) -> bool:
+        """可被取消打断的等待，返回是否已取消"""
+        return self._event.wait(timeout)
+
 class AsyncProcessor:
     """异步文献处理器"""
     
     def __init__(self):
         self.processing_tasks = {}  # 存储正在处理的任务
         self.task_results = {}     # 存储任务结果
+        self.literature_tasks = {}  # 文献ID -> 最近一次任务ID（任务结束后仍保留）
+        self.batches = {}          # 批次ID -> 批次信息
+        self.cancel_tokens = {}    # 任务ID -> 取消令牌
+        # 固定数量的工作线程从调度队列取任务，避免批量导入时上百个线程同时请求向量服务
+        self.scheduler = IngestionScheduler(
+            settings.INGEST_MAX_CONCURRENCY,
+            settings.INGEST_RESERVED_INTERACTIVE_WORKERS
+        )
+        self._workers = []
+        self._workers_lock = threading.Lock()
+    
+    def _ensure_workers(self):
+        """按需启动工作线程"""
+        with self._workers_lock:
+            if self._workers:
+                return
+            for index in range(self.scheduler.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"ingestion-worker-{index}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+            logger.info(f"启动 {len(self._workers)} 个文献处理工作线程")
+    
+    def _worker_loop(self):
+        """工作线程主循环：按调度顺序取出任务并执行"""
+        while True:
+            lane, job = self.scheduler.next_job()
+            try:
+                self._process_literature_worker(*job)
+            except Exception as e:
+                logger.error(f"文献处理工作线程异常: {e}")
+            finally:
+                self.scheduler.job_done(lane)
     
     def process_literature_async(
         self, 
         literature_id: str, 
-        callback: Optional[Callable] = None
+        callback: Optional[Callable] = None,
+        batch_id: Optional[str] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        tenant: Optional[str] = None
     ) -> str:
         """
         异步处理文献
@@ -37,6 +113,9 @@ class AsyncProcessor:
         Args:
             literature_id: 文献ID
             callback: 完成后的回调函数
+            batch_id: 所属批次ID（批量上传时）
+            priority: 优先级通道（interactive/group/bulk）
+            tenant: 公平调度使用的租户标识（研究组ID或 private_<用户ID>）
             
         Returns:
             str: 任务ID
@@ -48,26 +127,30 @@ class AsyncProcessor:
             logger.warning(f"文献 {literature_id} 已在处理中")
             return self.processing_tasks[literature_id]
         
-        # 创建处理线程
-        thread = threading.Thread(
-            target=self._process_literature_worker,
-            args=(task_id, literature_id, callback),
-            daemon=True
-        )
-        
         # 记录任务
         self.processing_tasks[literature_id] = task_id
+        self.literature_tasks[literature_id] = task_id
+        self.cancel_tokens[task_id] = CancellationToken()
         self.task_results[task_id] = {
             "status": "processing",
             "literature_id": literature_id,
+            "batch_id": batch_id,
+            "priority": priority,
+            "tenant": tenant,
             "start_time": time.time(),
+            "stage": STAGE_QUEUED,
             "progress": 0,
-            "message": "开始处理文献"
+            "message": "排队等待处理"
         }
+        progress_store.update(
+            literature_id, STAGE_QUEUED, 0, "排队等待处理",
+            task_id=task_id, batch_id=batch_id
+        )
         
-        # 启动线程
-        thread.start()
-        logger.info(f"启动异步处理任务: {task_id} for 文献 {literature_id}")
+        # 提交到调度队列
+        self._ensure_workers()
+        self.scheduler.submit((task_id, literature_id, callback), priority, tenant)
+        logger.info(f"提交异步处理任务: {task_id} for 文献 {literature_id} (通道: {priority}, 租户: {tenant})")
         
         return task_id
     
@@ -85,7 +168,11 @@ class AsyncProcessor:
             literature_id: 文献ID
             callback: 回调函数
         """
+        token = self.cancel_tokens.get(task_id) or CancellationToken()
         try:
+            # 排队期间可能已被取消
+            token.raise_if_cancelled()
+            
             # 更新进度
             self._update_task_progress(task_id, 10, "获取文献信息")
             
@@ -102,20 +189,22 @@ class AsyncProcessor:
                     raise Exception(f"文献 {literature_id} 状态异常: {literature.status}")
                 
                 # 更新进度
-                self._update_task_progress(task_id, 20, "提取文本内容")
+                self._update_task_progress(task_id, 20, "提取文本内容", STAGE_EXTRACTING)
                 
                 # 构建完整文件路径
                 from app.config import settings
                 import os
                 full_file_path = os.path.join(settings.UPLOAD_ROOT_DIR, literature.file_path)
                 
-                # 提取文本
-                extracted_text = extract_text_from_file(full_file_path)
+                # 提取文本（在子进程沙箱中执行，超时或超内存时抛出 ExtractionError）
+                extracted_text = extract_text_sandboxed(full_file_path)
                 if not extracted_text or not extracted_text.strip():
                     raise Exception("文本提取失败或文本为空")
                 
+                token.raise_if_cancelled()
+                
                 # 更新进度
-                self._update_task_progress(task_id, 40, "分割文本块")
+                self._update_task_progress(task_id, 40, "分割文本块", STAGE_CHUNKING)
                 
                 # 分割文本
                 chunks = split_text_into_chunks(extracted_text)
@@ -130,24 +219,23 @@ class AsyncProcessor:
                     literature.title
                 )
                 
-                # 更新进度
-                self._update_task_progress(task_id, 60, f"生成向量 ({len(chunks)} 个文本块)")
+                token.raise_if_cancelled()
                 
-                # 生成embeddings
-                embeddings, failed_texts = embedding_service.batch_generate_embeddings(
-                    [chunk["text"] for chunk in chunks_data]
+                # 生成embeddings（按批次断点续传）
+                chunks_data, embeddings, failed_texts = self._embed_chunks_with_checkpoint(
+                    task_id, literature_id, chunks_data, token
                 )
                 
                 if not embeddings:
                     raise Exception("向量生成失败")
                 
-                if len(embeddings) != len(chunks_data):
+                if failed_texts:
                     logger.warning(f"部分文本块向量生成失败: {len(failed_texts)} 个失败")
-                    # 只保留成功的chunks
-                    chunks_data = chunks_data[:len(embeddings)]
+                
+                token.raise_if_cancelled()
                 
                 # 更新进度
-                self._update_task_progress(task_id, 80, "存储向量数据")
+                self._update_task_progress(task_id, 80, "存储向量数据", STAGE_STORING)
                 
                 # 先删除旧的向量（如果存在）
                 vector_store.delete_document_chunks(literature_id, literature.research_group_id)
@@ -163,6 +251,42 @@ class AsyncProcessor:
                 if not success:
                     raise Exception("向量存储失败")
                 
+                # 存储文档级向量，供跨文献问答第一阶段筛选文献
+                summary_embedding = average_embedding(embeddings)
+                if summary_embedding:
+                    vector_store.store_document_summary(
+                        literature_id,
+                        literature.research_group_id,
+                        summary_embedding,
+                        literature.title,
+                        len(chunks_data)
+                    )
+                
+                # 存储分层向量（文档、标题/摘要、章节级），供文献排序和由粗到细的检索使用
+                if settings.HIERARCHICAL_EMBEDDINGS_ENABLED:
+                    hierarchical_entries = build_hierarchical_vectors(
+                        literature_id,
+                        literature.title,
+                        [chunk["text"] for chunk in chunks_data],
+                        embeddings
+                    )
+                    vector_store.store_hierarchical_vectors(
+                        literature_id,
+                        literature.research_group_id,
+                        hierarchical_entries,
+                        literature.title
+                    )
+                
+                # 向量已入库，断点不再需要
+                embedding_checkpoint.clear(literature_id)
+                
+                # 文献内容已变化，旧的问答缓存和预设答案全部失效
+                cache_manager.bump_literature_version(literature_id)
+                preset_answer_store.delete_literature(literature_id)
+                
+                # 后台预先回答预设问题（低优先级、限速，未启用时忽略）
+                preset_precomputer.submit(literature_id, literature.research_group_id, literature.title)
+                
                 # 更新文献状态（可选：添加处理状态字段）
                 # literature.processed_at = datetime.utcnow()
                 # db.commit()
@@ -196,13 +320,23 @@ class AsyncProcessor:
                 
             finally:
                 db.close()
+        
+        except TaskCancelledError:
+            # 已生成的向量保留在断点中，重试时可继续
+            logger.info(f"任务 {task_id} 已取消，文献 {literature_id} 停止处理")
+            self._finish_cancelled(task_id)
+            if callback:
+                try:
+                    callback(task_id, False, "任务已取消")
+                except Exception as cb_e:
+                    logger.error(f"回调函数执行失败: {cb_e}")
                 
         except Exception as e:
             error_msg = f"文献处理失败: {str(e)}"
             logger.error(error_msg)
             
-            # 记录错误
-            self._complete_task(task_id, False, error_msg)
+            # 记录错误，提取失败等已知错误带上分类，便于前端标记
+            self._complete_task(task_id, False, error_msg, error_type=getattr(e, "error_code", None))
             
             # 记录错误日志
             log_error("literature_processing", e, extra_info={
@@ -219,30 +353,211 @@ class AsyncProcessor:
         
         finally:
             # 清理任务记录
-            if literature_id in self.processing_tasks:
+            self.cancel_tokens.pop(task_id, None)
+            if self.processing_tasks.get(literature_id) == task_id:
                 del self.processing_tasks[literature_id]
     
-    def _update_task_progress(self, task_id: str, progress: int, message: str):
-        """更新任务进度"""
-        if task_id in self.task_results:
-            self.task_results[task_id].update({
-                "progress": progress,
-                "message": message,
-                "updated_at": time.time()
+    def _embed_chunks_with_checkpoint(
+        self,
+        task_id: str,
+        literature_id: str,
+        chunks_data: List[Dict],
+        token: CancellationToken
+    ) -> Tuple[List[Dict], List[List[float]], List[str]]:
+        """
+        分批生成文本块向量，每批完成后写入断点
+        
+        已在断点中且内容未变化的文本块直接复用，不再调用向量服务
+        
+        Args:
+            task_id: 任务ID
+            literature_id: 文献ID
+            chunks_data: 准备好的文本块数据
+            token: 取消令牌
+            
+        Returns:
+            Tuple: (成功的文本块, 与之一一对应的向量, 失败的文本)
+        """
+        model_name = embedding_service._get_model_name()
+        saved = embedding_checkpoint.load(literature_id, model_name)
+        
+        embeddings_by_id = {}
+        pending = []
+        for chunk in chunks_data:
+            record = saved.get(chunk["chunk_id"])
+            if record and record["text_hash"] == embedding_checkpoint.text_hash(chunk["text"]):
+                embeddings_by_id[chunk["chunk_id"]] = record["embedding"]
+            else:
+                pending.append(chunk)
+        
+        total = len(chunks_data)
+        done = len(embeddings_by_id)
+        failed_texts = []
+        batch_size = max(1, settings.INGEST_EMBEDDING_BATCH_SIZE)
+        
+        resume_note = f"，从断点恢复 {done} 个" if done else ""
+        self._update_task_progress(
+            task_id, 60, f"生成向量 ({total} 个文本块{resume_note})", STAGE_EMBEDDING, done, total
+        )
+        
+        for start in range(0, len(pending), batch_size):
+            token.raise_if_cancelled()
+            batch = pending[start:start + batch_size]
+            
+            batch_chunks = []
+            batch_embeddings = []
+            for chunk in batch:
+                embedding = embedding_service.generate_embedding(chunk["text"])
+                if embedding:
+                    batch_chunks.append(chunk)
+                    batch_embeddings.append(embedding)
+                    embeddings_by_id[chunk["chunk_id"]] = embedding
+                else:
+                    failed_texts.append(chunk["text"])
+                    logger.warning(f"文本embedding生成失败: {chunk['text'][:50]}...")
+            
+            embedding_checkpoint.append(literature_id, model_name, batch_chunks, batch_embeddings)
+            
+            done += len(batch)
+            # 向量生成占 60%-80% 的进度区间
+            self._update_task_progress(
+                task_id, 60 + int(20 * done / max(total, 1)),
+                f"生成向量 {done}/{total}", STAGE_EMBEDDING, done, total
+            )
+            
+            # 批次间延迟，避免API限制；取消时立即结束等待
+            if start + batch_size < len(pending) and token.wait(settings.INGEST_EMBEDDING_BATCH_DELAY):
+                token.raise_if_cancelled()
+        
+        # 保持原有顺序，只保留成功生成向量的文本块
+        kept_chunks = [chunk for chunk in chunks_data if chunk["chunk_id"] in embeddings_by_id]
+        kept_embeddings = [embeddings_by_id[chunk["chunk_id"]] for chunk in kept_chunks]
+        return kept_chunks, kept_embeddings, failed_texts
+    
+    def process_batch_async(
+        self,
+        literature_ids: List[str],
+        batch_info: Dict = None,
+        priority: str = PRIORITY_GROUP,
+        tenant: Optional[str] = None
+    ) -> str:
+        """
+        批量提交文献处理任务
+        
+        Args:
+            literature_ids: 文献ID列表
+            batch_info: 附加到批次上的信息（如上传者、研究组）
+            priority: 优先级通道，批量上传默认走 group 通道，重建索引使用 bulk
+            tenant: 公平调度使用的租户标识
+            
+        Returns:
+            str: 批次ID
+        """
+        batch_id = str(uuid.uuid4())
+        self.batches[batch_id] = {
+            "batch_id": batch_id,
+            "literature_ids": list(literature_ids),
+            "created_at": time.time(),
+            **(batch_info or {})
+        }
+        
+        for literature_id in literature_ids:
+            self.process_literature_async(literature_id, batch_id=batch_id, priority=priority, tenant=tenant)
+        
+        logger.info(f"批次 {batch_id} 已提交 {len(literature_ids)} 个文献处理任务")
+        return batch_id
+    
+    def get_batch_status(self, batch_id: str) -> Optional[Dict]:
+        """
+        获取批次内各文献的处理状态
+        
+        Args:
+            batch_id: 批次ID
+            
+        Returns:
+            Optional[Dict]: 批次状态汇总，批次不存在时返回None
+        """
+        batch = self.batches.get(batch_id)
+        if not batch:
+            return None
+        
+        items = []
+        counts = {"processing": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        for literature_id in batch["literature_ids"]:
+            task_id = self.literature_tasks.get(literature_id)
+            task = self.task_results.get(task_id) if task_id else None
+            status = task["status"] if task else "unknown"
+            counts[status] = counts.get(status, 0) + 1
+            items.append({
+                "literature_id": literature_id,
+                "task_id": task_id,
+                "status": status,
+                "progress": task.get("progress", 0) if task else 0,
+                "message": task.get("message", "") if task else "任务记录已过期"
             })
-            logger.info(f"任务 {task_id} 进度: {progress}% - {message}")
+        
+        return {
+            **batch,
+            "total": len(items),
+            "counts": counts,
+            "finished": counts["processing"] == 0,
+            "items": items
+        }
     
-    def _complete_task(self, task_id: str, success: bool, message: str, data: Dict = None):
+    def _update_task_progress(
+        self,
+        task_id: str,
+        progress: int,
+        message: str,
+        stage: Optional[str] = None,
+        current: Optional[int] = None,
+        total: Optional[int] = None
+    ):
+        """更新任务进度，传入stage时同步写入共享进度存储"""
+        task_info = self.task_results.get(task_id)
+        if task_info is None:
+            return
+        
+        task_info.update({
+            "progress": progress,
+            "message": message,
+            "updated_at": time.time()
+        })
+        if stage:
+            task_info["stage"] = stage
+            progress_store.update(
+                task_info["literature_id"], stage, progress, message, current, total
+            )
+        logger.info(f"任务 {task_id} 进度: {progress}% - {message}")
+    
+    def _complete_task(
+        self,
+        task_id: str,
+        success: bool,
+        message: str,
+        data: Dict = None,
+        error_type: Optional[str] = None
+    ):
         """完成任务"""
         if task_id in self.task_results:
-            self.task_results[task_id].update({
+            task_info = self.task_results[task_id]
+            task_info.update({
                 "status": "completed" if success else "failed",
+                "stage": STAGE_DONE if success else STAGE_FAILED,
                 "progress": 100 if success else -1,
                 "message": message,
                 "completed_at": time.time(),
                 "success": success,
+                "error_type": error_type,
                 "data": data or {}
             })
+            progress_store.update(
+                task_info["literature_id"],
+                STAGE_DONE if success else STAGE_FAILED,
+                100 if success else -1,
+                message,
+                error_type=error_type
+            )
     
     def get_task_status(self, task_id: str) -> Optional[Dict]:
         """
@@ -285,48 +600,92 @@ class AsyncProcessor:
     
     def cancel_task(self, task_id: str) -> bool:
         """
-        取消任务（注意：已启动的线程无法强制停止）
+        取消任务
+        
+        工作线程在处理阶段之间和向量批次之间检查取消令牌，
+        正在进行的单次API调用会执行完，之后任务停止，已生成的向量保留在断点中
         
         Args:
             task_id: 任务ID
             
         Returns:
-            bool: 是否成功标记为取消
+            bool: 是否成功发出取消请求
         """
-        if task_id in self.task_results:
-            task_info = self.task_results[task_id]
-            if task_info["status"] == "processing":
-                task_info.update({
-                    "status": "cancelled",
-                    "message": "任务已取消",
-                    "cancelled_at": time.time()
-                })
-                logger.info(f"任务 {task_id} 已标记为取消")
-                return True
+        task_info = self.task_results.get(task_id)
+        token = self.cancel_tokens.get(task_id)
+        if task_info and token and task_info["status"] == "processing":
+            token.cancel()
+            task_info["message"] = "正在取消"
+            logger.info(f"任务 {task_id} 已请求取消")
+            return True
         return False
     
-    def cleanup_old_tasks(self, max_age_hours: int = 24):
+    def cancel_literature_processing(self, literature_id: str) -> bool:
+        """
+        取消文献当前的处理任务
+        
+        Args:
+            literature_id: 文献ID
+            
+        Returns:
+            bool: 是否成功发出取消请求
+        """
+        task_id = self.processing_tasks.get(literature_id)
+        return self.cancel_task(task_id) if task_id else False
+    
+    def _finish_cancelled(self, task_id: str):
+        """记录任务取消完成"""
+        task_info = self.task_results.get(task_id)
+        if task_info is None:
+            return
+        task_info.update({
+            "status": "cancelled",
+            "stage": STAGE_CANCELLED,
+            "message": "任务已取消",
+            "cancelled_at": time.time()
+        })
+        progress_store.update(task_info["literature_id"], STAGE_CANCELLED, task_info.get("progress", 0), "任务已取消")
+    
+    def cleanup_old_tasks(self, max_age_hours: int = 24) -> int:
         """
         清理旧的任务记录
         
         Args:
             max_age_hours: 最大保留时间（小时）
+            
+        Returns:
+            int: 清理的任务记录数量
         """
         current_time = time.time()
         max_age_seconds = max_age_hours * 3600
         
+        # 维护线程与处理线程并发执行，遍历快照避免字典在迭代中被修改
         tasks_to_remove = []
-        for task_id, task_info in self.task_results.items():
+        for task_id, task_info in list(self.task_results.items()):
             task_age = current_time - task_info.get("start_time", current_time)
             if task_age > max_age_seconds and task_info["status"] != "processing":
                 tasks_to_remove.append(task_id)
         
         for task_id in tasks_to_remove:
-            del self.task_results[task_id]
+            self.task_results.pop(task_id, None)
             logger.info(f"清理旧任务记录: {task_id}")
+
+        self.literature_tasks = {
+            literature_id: task_id for literature_id, task_id in list(self.literature_tasks.items())
+            if task_id in self.task_results
+        }
+
+        # 清理过期批次
+        expired_batches = [
+            batch_id for batch_id, batch in list(self.batches.items())
+            if current_time - batch.get("created_at", current_time) > max_age_seconds
+        ]
+        for batch_id in expired_batches:
+            self.batches.pop(batch_id, None)
         
         if tasks_to_remove:
             logger.info(f"清理了 {len(tasks_to_remove)} 个旧任务记录")
+        return len(tasks_to_remove)
     
     def get_all_tasks_status(self) -> Dict:
         """
@@ -344,7 +703,8 @@ class AsyncProcessor:
             "processing": processing_count,
             "completed": completed_count,
             "failed": failed_count,
-            "active_literature": list(self.processing_tasks.keys())
+            "active_literature": list(self.processing_tasks.keys()),
+            "scheduler": self.scheduler.get_stats()
         }
 
 # 创建全局异步处理器实例
@@ -8,10 +8,14 @@ from datetime import datetime, timedelta
 import hashlib
 import json
 import logging
+import re
 import threading
+import uuid
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
 from cachetools import TTLCache, LRUCache
+import numpy as np
 
 from app.config import Config
 
@@ -225,6 +229,18 @@ class CacheKeyGenerator:
         question_hash = hashlib.md5(question.encode('utf-8')).hexdigest()[:8]
         return f"ans:{literature_id}:{question_hash}:{context_hash[:8]}"
     
+    @staticmethod
+    def normalize_question(question: str) -> str:
+        """标准化问题文本：忽略大小写、空白和标点差异"""
+        return re.sub(r"[\s\?\!\.,;:？！。，、；：\"'“”‘’]+", "", question.lower())
+    
+    @staticmethod
+    def retrieval_key(literature_id: str, question: str, top_k: int, version: int) -> str:
+        """生成检索结果缓存键"""
+        normalized = CacheKeyGenerator.normalize_question(question)
+        question_hash = hashlib.md5(normalized.encode('utf-8')).hexdigest()[:12]
+        return f"ret:{literature_id}:v{version}:{top_k}:{question_hash}"
+    
     @staticmethod
     def chunk_key(literature_id: str, chunk_index: int) -> str:
         """生成文档块缓存键"""
@@ -251,6 +267,209 @@ class CacheKeyGenerator:
             simple_context = str(len(chunks)) + str(chunks[0].get('text', '')[:50] if chunks else '')
             return hashlib.md5(simple_context.encode('utf-8')).hexdigest()[:16]
 
+class SemanticAnswerCache:
+    """
+    语义答案缓存
+
+    按文献保存问题向量的小型矩阵，新问题与已缓存问题的余弦相似度超过阈值时
+    直接复用答案。每篇文献记录缓存时的向量版本，文献重新入库后旧答案自动失效。
+    """
+    
+    def __init__(self, threshold: float, max_per_literature: int, max_literatures: int, ttl: int):
+        self.threshold = threshold
+        self.max_per_literature = max_per_literature
+        self.max_literatures = max_literatures
+        self.ttl = ttl
+        # literature_id -> {"version", "matrix", "entries"}，按最近使用顺序排列
+        self._indexes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger(__name__)
+        
+        self._metrics = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "false_hits": 0,
+            "invalidations": 0,
+            "sets": 0,
+            "hit_similarity_sum": 0.0
+        }
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        """归一化向量，便于用点积计算余弦相似度"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if vector.ndim != 1 or norm == 0:
+            return None
+        return vector / norm
+    
+    def _get_index(self, literature_id: str, version: int, dim: int) -> Optional[Dict[str, Any]]:
+        """获取文献的索引，版本或维度不一致时丢弃旧数据"""
+        index = self._indexes.get(literature_id)
+        if index is None:
+            return None
+        if index["version"] != version or index["matrix"].shape[1] != dim:
+            del self._indexes[literature_id]
+            self._metrics["invalidations"] += 1
+            return None
+        self._indexes.move_to_end(literature_id)
+        return index
+    
+    def _expire(self, index: Dict[str, Any]) -> None:
+        """移除过期条目"""
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        keep = [i for i, entry in enumerate(index["entries"]) if entry["created_at"] >= cutoff]
+        if len(keep) != len(index["entries"]):
+            index["entries"] = [index["entries"][i] for i in keep]
+            index["matrix"] = index["matrix"][keep]
+    
+    def lookup(self, literature_id: str, question_embedding: List[float], version: int) -> Optional[Tuple[Dict, Dict]]:
+        """
+        查找语义相近问题的缓存答案
+        
+        Args:
+            literature_id: 文献ID
+            question_embedding: 问题向量
+            version: 文献当前的向量版本
+            
+        Returns:
+            Optional[Tuple[Dict, Dict]]: (答案, 命中信息)，未命中返回None
+        """
+        vector = self._normalize(question_embedding)
+        with self.lock:
+            self._metrics["lookups"] += 1
+            index = self._get_index(literature_id, version, len(vector)) if vector is not None else None
+            if index is not None:
+                self._expire(index)
+            if index is None or not index["entries"]:
+                self._metrics["misses"] += 1
+                return None
+            
+            similarities = index["matrix"] @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self._metrics["misses"] += 1
+                return None
+            
+            entry = index["entries"][best]
+            self._metrics["hits"] += 1
+            self._metrics["hit_similarity_sum"] += similarity
+            
+            hit_info = {
+                "entry_id": entry["entry_id"],
+                "similarity": round(similarity, 4),
+                "matched_question": entry["question"]
+            }
+            return entry["answer"], hit_info
+    
+    def add(self, literature_id: str, question: str, question_embedding: List[float], version: int, answer: Dict) -> bool:
+        """
+        缓存问题向量和答案
+        
+        Args:
+            literature_id: 文献ID
+            question: 问题文本
+            question_embedding: 问题向量
+            version: 生成答案时文献的向量版本
+            answer: 答案数据
+            
+        Returns:
+            bool: 是否缓存成功
+        """
+        vector = self._normalize(question_embedding)
+        if vector is None:
+            return False
+        
+        with self.lock:
+            index = self._get_index(literature_id, version, len(vector))
+            if index is None:
+                index = {
+                    "version": version,
+                    "matrix": np.empty((0, len(vector)), dtype=np.float32),
+                    "entries": []
+                }
+                self._indexes[literature_id] = index
+                while len(self._indexes) > self.max_literatures:
+                    self._indexes.popitem(last=False)
+            
+            index["entries"].append({
+                "entry_id": uuid.uuid4().hex[:12],
+                "question": question,
+                "answer": answer,
+                "created_at": datetime.now()
+            })
+            index["matrix"] = np.vstack([index["matrix"], vector])
+            
+            # 超出容量时淘汰最早的条目
+            overflow = len(index["entries"]) - self.max_per_literature
+            if overflow > 0:
+                index["entries"] = index["entries"][overflow:]
+                index["matrix"] = index["matrix"][overflow:]
+            
+            self._metrics["sets"] += 1
+            return True
+    
+    def record_false_hit(self, literature_id: str, entry_id: str) -> bool:
+        """
+        记录一次误命中（用户否定了复用的答案），并移除该条目
+        
+        Args:
+            literature_id: 文献ID
+            entry_id: 命中的缓存条目ID
+            
+        Returns:
+            bool: 条目是否仍在缓存中并被移除
+        """
+        with self.lock:
+            self._metrics["false_hits"] += 1
+            index = self._indexes.get(literature_id)
+            if index is None:
+                return False
+            for i, entry in enumerate(index["entries"]):
+                if entry["entry_id"] == entry_id:
+                    del index["entries"][i]
+                    index["matrix"] = np.delete(index["matrix"], i, axis=0)
+                    return True
+            return False
+    
+    def invalidate(self, literature_id: str) -> int:
+        """删除文献的全部语义缓存，返回删除条目数"""
+        with self.lock:
+            index = self._indexes.pop(literature_id, None)
+            return len(index["entries"]) if index else 0
+    
+    def clear(self) -> bool:
+        """清空语义缓存"""
+        with self.lock:
+            self._indexes.clear()
+            return True
+    
+    def size(self) -> int:
+        """缓存条目总数"""
+        with self.lock:
+            return sum(len(index["entries"]) for index in self._indexes.values())
+    
+    def info(self) -> Dict[str, Any]:
+        """获取缓存信息和命中指标"""
+        with self.lock:
+            metrics = dict(self._metrics)
+            hits = metrics.pop("hit_similarity_sum")
+            lookups = metrics["lookups"]
+            return {
+                "type": "semantic_answer",
+                "threshold": self.threshold,
+                "literatures": len(self._indexes),
+                "current_size": sum(len(index["entries"]) for index in self._indexes.values()),
+                "max_per_literature": self.max_per_literature,
+                "ttl": self.ttl,
+                **metrics,
+                "hit_rate": metrics["hits"] / lookups if lookups > 0 else 0.0,
+                "false_hit_rate": metrics["false_hits"] / metrics["hits"] if metrics["hits"] > 0 else 0.0,
+                "avg_hit_similarity": hits / metrics["hits"] if metrics["hits"] > 0 else 0.0
+            }
+
 class CacheManager:
     """缓存管理器主类"""
     
@@ -263,6 +482,7 @@ class CacheManager:
         embedding_max_size = int(os.getenv("RAG_CACHE_EMBEDDING_MAX_SIZE", "1000"))
         answer_max_size = int(os.getenv("RAG_CACHE_ANSWER_MAX_SIZE", "500"))
         chunk_max_size = int(os.getenv("RAG_CACHE_CHUNK_MAX_SIZE", "2000"))
+        retrieval_max_size = int(os.getenv("RAG_CACHE_RETRIEVAL_MAX_SIZE", "1000"))
         cache_ttl = int(os.getenv("RAG_CACHE_TTL", "3600"))
         
         # 如果Config可用，优先使用Config的值
@@ -270,6 +490,7 @@ class CacheManager:
             embedding_max_size = Config.RAG_CACHE_EMBEDDING_MAX_SIZE
             answer_max_size = Config.RAG_CACHE_ANSWER_MAX_SIZE
             chunk_max_size = Config.RAG_CACHE_CHUNK_MAX_SIZE
+            retrieval_max_size = Config.RAG_CACHE_RETRIEVAL_MAX_SIZE
             cache_ttl = Config.RAG_CACHE_TTL
         except:
             pass  # 使用默认值
@@ -293,6 +514,23 @@ class CacheManager:
             cache_type="chunk"
         )
         
+        self.retrieval_cache = MemoryCacheBackend(
+            maxsize=retrieval_max_size,
+            ttl=cache_ttl,
+            cache_type="retrieval"
+        )
+        
+        self.semantic_cache = SemanticAnswerCache(
+            threshold=Config.RAG_SEMANTIC_CACHE_THRESHOLD,
+            max_per_literature=Config.RAG_SEMANTIC_CACHE_MAX_PER_LITERATURE,
+            max_literatures=Config.RAG_SEMANTIC_CACHE_MAX_LITERATURES,
+            ttl=cache_ttl // 2  # 与答案缓存保持一致
+        )
+        
+        # 文献向量版本，文献重新入库或删除向量时递增
+        self.literature_versions: Dict[str, int] = {}
+        self.version_lock = threading.Lock()
+        
         self.logger.info("缓存管理器初始化完成")
     
     # ====== Embedding 缓存方法 ======
@@ -371,6 +609,168 @@ class CacheManager:
             self.logger.error(f"设置答案缓存失败: {e}")
             return False
     
+    # ====== 检索结果缓存方法 ======
+    
+    # 与具体问题相关的检索得分字段，单独保存在检索缓存中
+    QUERY_SCORE_FIELDS = ("similarity", "raw_distance", "final_score")
+    
+    def get_retrieval(self, literature_id: str, question: str, top_k: int,
+                      version: int) -> Optional[Tuple[List[Dict], List[float]]]:
+        """
+        获取检索结果缓存
+        
+        Args:
+            literature_id: 文献ID
+            question: 预处理后的问题
+            top_k: 检索数量
+            version: 文献当前的向量版本
+            
+        Returns:
+            Optional[Tuple[List[Dict], List[float]]]: (文档块列表, 问题向量)，未命中返回None
+        """
+        try:
+            key = CacheKeyGenerator.retrieval_key(literature_id, question, top_k, version)
+            cached = self.retrieval_cache.get(key)
+            if cached is None:
+                self.stats.record_miss()
+                return None
+            
+            # 文档块内容从文档块缓存读取，任一块已被淘汰时视为未命中
+            chunk_indices = [score["chunk_index"] for score in cached["chunks"]]
+            chunk_bodies = self.get_chunks(literature_id, chunk_indices)
+            if chunk_bodies is None:
+                self.retrieval_cache.delete(key)
+                self.stats.record_miss()
+                return None
+            
+            chunks = [
+                {**body, **score}
+                for body, score in zip(chunk_bodies, cached["chunks"])
+            ]
+            self.stats.record_hit()
+            return chunks, cached["question_embedding"]
+        except Exception as e:
+            self.logger.error(f"获取检索缓存失败: {e}")
+            self.stats.record_miss()
+            return None
+    
+    def set_retrieval(self, literature_id: str, question: str, top_k: int, version: int,
+                      chunks: List[Dict], question_embedding: List[float]) -> bool:
+        """
+        设置检索结果缓存：只保存选中文档块的索引和得分，内容写入文档块缓存
+        
+        Args:
+            literature_id: 文献ID
+            question: 预处理后的问题
+            top_k: 检索数量
+            version: 检索时文献的向量版本
+            chunks: 重排序后的文档块
+            question_embedding: 问题向量
+            
+        Returns:
+            bool: 是否缓存成功
+        """
+        if not chunks:
+            return False
+        try:
+            scores = []
+            bodies = []
+            for chunk in chunks:
+                chunk_index = chunk.get("chunk_index")
+                if chunk_index is None:
+                    return False
+                score = {"chunk_index": chunk_index}
+                for field in self.QUERY_SCORE_FIELDS:
+                    if field in chunk:
+                        score[field] = chunk[field]
+                scores.append(score)
+                body = {k: v for k, v in chunk.items() if k not in self.QUERY_SCORE_FIELDS}
+                bodies.append((chunk_index, body))
+            
+            if not self.set_chunks(literature_id, bodies):
+                return False
+            
+            key = CacheKeyGenerator.retrieval_key(literature_id, question, top_k, version)
+            success = self.retrieval_cache.set(key, {
+                "chunks": scores,
+                "question_embedding": question_embedding
+            })
+            if success:
+                self.stats.record_set()
+            return success
+        except Exception as e:
+            self.logger.error(f"设置检索缓存失败: {e}")
+            return False
+    
+    # ====== 语义答案缓存方法 ======
+    
+    def get_literature_version(self, literature_id: str) -> int:
+        """获取文献当前的向量版本"""
+        with self.version_lock:
+            return self.literature_versions.get(literature_id, 0)
+    
+    def bump_literature_version(self, literature_id: str) -> int:
+        """文献向量发生变化后递增版本，并清除该文献的答案缓存"""
+        with self.version_lock:
+            version = self.literature_versions.get(literature_id, 0) + 1
+            self.literature_versions[literature_id] = version
+        self.clear_by_literature(literature_id)
+        return version
+    
+    def get_semantic_answer(self, literature_id: str, question_embedding: List[float],
+                            version: int) -> Optional[Dict]:
+        """按问题向量相似度获取答案缓存"""
+        if not Config.RAG_SEMANTIC_CACHE_ENABLED:
+            return None
+        try:
+            result = self.semantic_cache.lookup(literature_id, question_embedding, version)
+            if result is None:
+                self.stats.record_miss()
+                return None
+            
+            self.stats.record_hit()
+            cached, hit_info = result
+            # 返回副本，避免调用方修改缓存中的元数据
+            answer = dict(cached)
+            answer['metadata'] = {
+                **cached.get('metadata', {}),
+                'cache_hit': True,
+                'cache_type': 'semantic',
+                'semantic_cache': hit_info,
+                'retrieved_at': datetime.now().isoformat()
+            }
+            return answer
+        except Exception as e:
+            self.logger.error(f"获取语义答案缓存失败: {e}")
+            self.stats.record_miss()
+            return None
+    
+    def set_semantic_answer(self, literature_id: str, question: str, question_embedding: List[float],
+                            version: int, answer_data: Dict) -> bool:
+        """设置语义答案缓存"""
+        if not Config.RAG_SEMANTIC_CACHE_ENABLED:
+            return False
+        try:
+            cached_answer = answer_data.copy()
+            cached_answer['metadata'] = {
+                **answer_data.get('metadata', {}),
+                'cached_at': datetime.now().isoformat(),
+                'cache_hit': False
+            }
+            success = self.semantic_cache.add(literature_id, question, question_embedding, version, cached_answer)
+            if success:
+                self.stats.record_set()
+            return success
+        except Exception as e:
+            self.logger.error(f"设置语义答案缓存失败: {e}")
+            return False
+    
+    def record_semantic_false_hit(self, literature_id: str, entry_id: str) -> bool:
+        """记录语义缓存误命中并移除对应条目"""
+        removed = self.semantic_cache.record_false_hit(literature_id, entry_id)
+        self.logger.info(f"语义缓存误命中: 文献 {literature_id}, 条目 {entry_id}, 已移除: {removed}")
+        return removed
+    
     # ====== 文档块缓存方法 ======
     
     def get_chunks(self, literature_id: str, chunk_indices: List[int]) -> Optional[List[Dict]]:
@@ -425,9 +825,12 @@ class CacheManager:
             embedding_cleared = self.embedding_cache.clear()
             answer_cleared = self.answer_cache.clear()
             chunk_cleared = self.chunk_cache.clear()
+            retrieval_cleared = self.retrieval_cache.clear()
+            semantic_cleared = self.semantic_cache.clear()
             
             self.logger.info("所有缓存已清空")
-            return embedding_cleared and answer_cleared and chunk_cleared
+            return (embedding_cleared and answer_cleared and chunk_cleared
+                    and retrieval_cleared and semantic_cleared)
         except Exception as e:
             self.logger.error(f"清空所有缓存失败: {e}")
             return False
@@ -444,6 +847,15 @@ class CacheManager:
                     if self.answer_cache.delete(key):
                         cleared_count += 1
             
+            # 清理检索结果缓存
+            for key in self.retrieval_cache.keys():
+                if key.startswith(f"ret:{literature_id}:"):
+                    if self.retrieval_cache.delete(key):
+                        cleared_count += 1
+            
+            # 清理语义答案缓存
+            cleared_count += self.semantic_cache.invalidate(literature_id)
+            
             # 清理文档块缓存
             chunk_keys = self.chunk_cache.keys()
             for key in chunk_keys:
@@ -465,10 +877,14 @@ class CacheManager:
                 "embedding_cache": self.embedding_cache.info(),
                 "answer_cache": self.answer_cache.info(),
                 "chunk_cache": self.chunk_cache.info(),
+                "retrieval_cache": self.retrieval_cache.info(),
+                "semantic_cache": self.semantic_cache.info(),
                 "total_memory_items": (
                     self.embedding_cache.size() + 
                     self.answer_cache.size() + 
-                    self.chunk_cache.size()
+                    self.chunk_cache.size() +
+                    self.retrieval_cache.size() +
+                    self.semantic_cache.size()
                 )
             }
         except Exception as e:
@@ -493,7 +909,7 @@ class CacheManager:
             total_utilization = 0
             cache_count = 0
             
-            for cache_name in ["embedding_cache", "answer_cache", "chunk_cache"]:
+            for cache_name in ["embedding_cache", "answer_cache", "chunk_cache", "retrieval_cache"]:
                 cache_info = stats.get(cache_name, {})
                 utilization = cache_info.get("utilization", 0)
                 total_utilization += utilization
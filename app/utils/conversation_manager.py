@@ -3,14 +3,20 @@ RAG问答系统对话管理器
 
 负责管理对话历史、会话状态和上下文压缩
 """
+import base64
+import json
 import logging
+import threading
+import time
+from collections import OrderedDict, deque
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, or_
 
-from app.models.conversation import QASession, ConversationTurn, ConversationSummary
-from app.database import get_db
+from app.models.conversation import QASession, ConversationTurn, ConversationSummary, TurnEmbedding
+from app.database import get_db, engine
 from app.config import Config
 
 class ConversationManager:
@@ -22,8 +28,195 @@ class ConversationManager:
         self.max_tokens_per_turn = 500
         self.compression_threshold = 0.8
         
+        # 最近对话轮次的内存缓存（会话ID -> 按时间顺序的轮次对话格式），LRU淘汰
+        self.history_cache_sessions = Config.RAG_HISTORY_CACHE_SESSIONS
+        self.history_cache_turns = max(Config.RAG_HISTORY_CACHE_TURNS, self.max_history_turns)
+        self._history_cache: "OrderedDict[str, deque]" = OrderedDict()
+        self._history_lock = threading.Lock()
+        # 正在从数据库加载的会话：会话ID -> [进行中的加载数, 写入计数]
+        # 加载期间同一会话有写入或失效则放弃回填，避免覆盖为旧数据；其他会话的写入互不影响
+        self._history_loads: Dict[str, List[int]] = {}
+        
         # 配置日志
         self.logger = logging.getLogger(__name__)
+        
+        self._ensure_schema()
+    
+    def _ensure_schema(self):
+        """确保轮次向量表和会话/轮次复合索引存在（项目未使用迁移工具，已有数据库按需补建）"""
+        try:
+            TurnEmbedding.__table__.create(bind=engine, checkfirst=True)
+        except Exception as e:
+            self.logger.error(f"创建轮次向量表失败: {e}")
+        
+        for index in [*QASession.__table__.indexes, *ConversationTurn.__table__.indexes]:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                # 表尚未创建时跳过，建表时会一并创建索引
+                self.logger.debug(f"创建索引 {index.name} 跳过: {e}")
+    
+    @staticmethod
+    def turn_messages(turn: ConversationTurn, embedding: Optional[List[float]] = None) -> List[Dict]:
+        """
+        轮次的对话格式，问题向量附加在用户消息上（仅在内存中使用，不进入提示词）
+        
+        Args:
+            turn: 对话轮次
+            embedding: 问题向量（可选）
+            
+        Returns:
+            List[Dict]: 用户消息和AI回答
+        """
+        messages = turn.to_conversation_format()
+        vector = ConversationManager._as_vector(embedding)
+        if vector is not None:
+            messages[0]["embedding"] = vector
+        return messages
+    
+    @staticmethod
+    def create_embedding_record(turn: ConversationTurn, embedding: Optional[List[float]]) -> Optional[TurnEmbedding]:
+        """
+        创建轮次问题向量记录（不添加到数据库会话）
+        
+        Args:
+            turn: 对话轮次
+            embedding: 问题向量，为空时不创建
+            
+        Returns:
+            Optional[TurnEmbedding]: 向量记录
+        """
+        vector = ConversationManager._as_vector(embedding)
+        if vector is None:
+            return None
+        return TurnEmbedding(
+            turn_id=turn.turn_id,
+            session_id=turn.session_id,
+            embedding=vector.tobytes(),
+            dimension=int(vector.shape[0])
+        )
+    
+    @staticmethod
+    def _as_vector(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        """将问题向量转换为float32数组，为空时返回None"""
+        if embedding is None or len(embedding) == 0:
+            return None
+        return np.asarray(embedding, dtype=np.float32)
+    
+    def _cache_get_turns(self, session_id: str) -> Optional[List[List[Dict]]]:
+        """读取会话缓存的轮次（按时间顺序），未缓存时返回None"""
+        with self._history_lock:
+            turns = self._history_cache.get(session_id)
+            if turns is None:
+                return None
+            self._history_cache.move_to_end(session_id)
+            return list(turns)
+    
+    def _begin_history_load(self, session_id: str) -> int:
+        """登记一次从数据库加载会话历史，返回该会话当前的写入计数"""
+        with self._history_lock:
+            load = self._history_loads.setdefault(session_id, [0, 0])
+            load[0] += 1
+            return load[1]
+    
+    def _end_history_load(self, session_id: str):
+        """结束一次加载，会话没有进行中的加载时不再记录写入计数"""
+        with self._history_lock:
+            load = self._history_loads.get(session_id)
+            if load is None:
+                return
+            load[0] -= 1
+            if load[0] <= 0:
+                del self._history_loads[session_id]
+    
+    def _bump_history_generation(self, session_id: str = None):
+        """记录会话的一次写入或失效（调用方持有 _history_lock），为None时影响全部会话"""
+        loads = self._history_loads.values() if session_id is None else [self._history_loads.get(session_id)]
+        for load in loads:
+            if load is not None:
+                load[1] += 1
+    
+    def set_history_cache(self, session_id: str, turns: List[List[Dict]], generation: int = None):
+        """用数据库中的最近轮次填充会话缓存（generation 与该会话当前写入计数不一致时放弃）"""
+        with self._history_lock:
+            if generation is not None:
+                load = self._history_loads.get(session_id)
+                if load is None or load[1] != generation:
+                    return
+            self._history_cache[session_id] = deque(turns, maxlen=self.history_cache_turns)
+            self._history_cache.move_to_end(session_id)
+            while len(self._history_cache) > self.history_cache_sessions:
+                self._history_cache.popitem(last=False)
+    
+    def append_history_cache(self, session_id: str, turns: List[List[Dict]]):
+        """
+        写穿：新轮次提交后追加到会话缓存
+        
+        只追加到已缓存的会话；未缓存的会话下次读取时从数据库完整加载
+        """
+        with self._history_lock:
+            self._bump_history_generation(session_id)
+            cached = self._history_cache.get(session_id)
+            if cached is not None:
+                cached.extend(turns)
+                self._history_cache.move_to_end(session_id)
+    
+    def invalidate_history_cache(self, session_id: str = None):
+        """
+        使会话历史缓存失效
+        
+        Args:
+            session_id: 会话ID，为None时清空全部缓存
+        """
+        with self._history_lock:
+            self._bump_history_generation(session_id)
+            if session_id is None:
+                self._history_cache.clear()
+            else:
+                self._history_cache.pop(session_id, None)
+    
+    def _get_recent_turns(self, session_id: str, max_turns: int, db: Session) -> List[List[Dict]]:
+        """
+        获取会话最近的轮次（每轮为 to_conversation_format 的结果），优先读取内存缓存
+        
+        Args:
+            session_id: 会话ID
+            max_turns: 最大轮次数
+            db: 数据库会话
+            
+        Returns:
+            List[List[Dict]]: 按时间顺序排列的轮次
+        """
+        if max_turns <= self.history_cache_turns:
+            cached = self._cache_get_turns(session_id)
+            if cached is not None:
+                return cached[-max_turns:] if max_turns > 0 else []
+        
+        if db is None:
+            db = next(get_db())
+        
+        # 缓存未命中时按缓存容量加载一次，后续请求直接命中
+        generation = self._begin_history_load(session_id)
+        try:
+            limit = max(max_turns, self.history_cache_turns)
+            turns = db.query(ConversationTurn).filter(
+                ConversationTurn.session_id == session_id
+            ).order_by(desc(ConversationTurn.turn_index)).limit(limit).all()
+            
+            # 同一查询范围内的问题向量一次取回
+            embeddings = {}
+            if turns:
+                for record in db.query(TurnEmbedding).filter(
+                    TurnEmbedding.turn_id.in_([turn.turn_id for turn in turns])
+                ).all():
+                    embeddings[record.turn_id] = np.frombuffer(record.embedding, dtype=np.float32)
+            
+            # 反转以获得正确的时间顺序
+            recent_turns = [self.turn_messages(turn, embeddings.get(turn.turn_id)) for turn in reversed(turns)]
+            self.set_history_cache(session_id, recent_turns, generation)
+        finally:
+            self._end_history_load(session_id)
+        return recent_turns[-max_turns:] if max_turns > 0 else []
     
     def create_session(
         self,
@@ -62,6 +255,9 @@ class ConversationManager:
             db.commit()
             db.refresh(session)
             
+            # 新会话没有历史轮次，直接建立空缓存
+            self.set_history_cache(session.session_id, [])
+            
             self.logger.info(f"创建新会话: {session.session_id}")
             return session.session_id
             
@@ -124,6 +320,7 @@ class ConversationManager:
         processing_time: float = 0.0,
         prompt_tokens: int = 0,
         metadata: Dict = None,
+        question_embedding: List[float] = None,
         db: Session = None
     ) -> str:
         """
@@ -139,6 +336,7 @@ class ConversationManager:
             processing_time: 处理时间
             prompt_tokens: 提示词token数
             metadata: 额外元数据
+            question_embedding: 问题向量（可选，用于选择相关历史）
             db: 数据库会话
             
         Returns:
@@ -175,6 +373,9 @@ class ConversationManager:
             
             # 添加到数据库
             db.add(turn)
+            embedding_record = self.create_embedding_record(turn, question_embedding)
+            if embedding_record is not None:
+                db.add(embedding_record)
             
             # 更新会话统计
             session.increment_turn_count()
@@ -184,6 +385,7 @@ class ConversationManager:
             
             db.commit()
             db.refresh(turn)
+            self.append_history_cache(session_id, [self.turn_messages(turn, question_embedding)])
             
             self.logger.info(f"添加对话轮次: {turn.turn_id} (会话: {session_id})")
             return turn.turn_id
@@ -193,6 +395,90 @@ class ConversationManager:
             self.logger.error(f"添加对话轮次失败: {str(e)}")
             raise
 
+    def add_qa_turns(
+        self,
+        session_id: str,
+        turns: List[Dict[str, Any]],
+        db: Session = None
+    ) -> List[str]:
+        """
+        在一个事务中批量添加问答轮次
+
+        Args:
+            session_id: 会话ID
+            turns: 轮次列表，每项的键与 add_qa_turn 的参数相同，可额外指定 turn_id
+            db: 数据库会话
+
+        Returns:
+            List[str]: 与输入顺序一致的轮次ID
+        """
+        if db is None:
+            db = next(get_db())
+
+        try:
+            session = db.query(QASession).filter(QASession.session_id == session_id).first()
+            if not session:
+                raise ValueError(f"会话不存在: {session_id}")
+
+            turn_ids = []
+            new_turns = []
+            for item in turns:
+                turn = self.create_turn_record(session, item)
+                db.add(turn)
+                embedding_record = self.create_embedding_record(turn, item.get("question_embedding"))
+                if embedding_record is not None:
+                    db.add(embedding_record)
+                turn_ids.append(turn.turn_id)
+                new_turns.append((turn, item.get("question_embedding")))
+
+            # 先flush生成时间戳等默认值，提交后读取属性会逐个重新查询
+            db.flush()
+            conversation_turns = [self.turn_messages(turn, embedding) for turn, embedding in new_turns]
+            db.commit()
+            self.append_history_cache(session_id, conversation_turns)
+
+            self.logger.info(f"批量添加对话轮次: {len(turn_ids)} 个 (会话: {session_id})")
+            return turn_ids
+
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"批量添加对话轮次失败: {str(e)}")
+            raise
+
+    def create_turn_record(self, session: QASession, item: Dict[str, Any]) -> ConversationTurn:
+        """
+        创建对话轮次记录并更新会话统计（不添加到数据库会话，也不提交）
+
+        Args:
+            session: 所属会话
+            item: 轮次数据，键与 add_qa_turn 的参数相同，可额外指定 turn_id 和 timestamp（问题向量由 create_embedding_record 单独保存）
+
+        Returns:
+            ConversationTurn: 新建的轮次
+        """
+        turn = ConversationTurn(
+            turn_id=item.get("turn_id"),
+            session_id=session.session_id,
+            turn_index=session.turn_count + 1,
+            question=item["question"],
+            answer=item.get("answer"),
+            confidence=item.get("confidence", 0.0),
+            quality_scores=item.get("quality_scores") or {},
+            chunks_used=item.get("chunks_used", 0),
+            processing_time=item.get("processing_time", 0.0),
+            prompt_tokens=item.get("prompt_tokens", 0)
+        )
+        if item.get("timestamp"):
+            turn.timestamp = item["timestamp"]
+        if item.get("metadata"):
+            turn.answer_metadata.update(item["metadata"])
+
+        session.increment_turn_count()
+        session.add_question()
+        if item.get("answer"):
+            session.add_answer(item.get("confidence", 0.0))
+        return turn
+
     def update_turn_answer(
         self,
         turn_id: str,
@@ -234,7 +520,10 @@ class ConversationManager:
                 session.add_answer(confidence)
                 session.update_activity()
             
+            session_id = turn.session_id
             db.commit()
+            # 已缓存的轮次内容发生变化，下次读取时重新加载
+            self.invalidate_history_cache(session_id)
             return True
             
         except Exception as e:
@@ -261,25 +550,14 @@ class ConversationManager:
         Returns:
             List[Dict]: 对话历史列表
         """
-        if db is None:
-            db = next(get_db())
-        
         try:
             # 设置默认值
             if max_turns is None:
                 max_turns = self.max_history_turns
             
-            # 查询对话轮次
-            turns_query = db.query(ConversationTurn).filter(
-                ConversationTurn.session_id == session_id
-            ).order_by(desc(ConversationTurn.turn_index)).limit(max_turns)
-            
-            turns = turns_query.all()
-            
-            # 转换为对话格式
+            # 最近轮次优先从内存缓存读取，并展开为对话格式
             history = []
-            for turn in reversed(turns):  # 反转以获得正确的时间顺序
-                conversation_turns = turn.to_conversation_format()
+            for conversation_turns in self._get_recent_turns(session_id, max_turns, db):
                 history.extend(conversation_turns)
             
             return history
@@ -288,6 +566,120 @@ class ConversationManager:
             self.logger.error(f"获取对话历史失败: {str(e)}")
             return []
 
+    @staticmethod
+    def encode_session_cursor(session: QASession) -> str:
+        """将会话的排序键编码为分页游标"""
+        payload = json.dumps({
+            "last_activity": session.last_activity.isoformat(),
+            "session_id": session.session_id
+        })
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def decode_session_cursor(cursor: str) -> Tuple[datetime, str]:
+        """
+        解析分页游标
+        
+        Args:
+            cursor: encode_session_cursor 生成的游标
+            
+        Returns:
+            Tuple[datetime, str]: (最后活动时间, 会话ID)
+            
+        Raises:
+            ValueError: 游标格式无效
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            return datetime.fromisoformat(payload["last_activity"]), str(payload["session_id"])
+        except Exception as e:
+            raise ValueError(f"无效的分页游标: {cursor}") from e
+    
+    def list_sessions(
+        self,
+        user_id: int,
+        literature_id: str = None,
+        limit: int = 20,
+        cursor: str = None,
+        db: Session = None
+    ) -> Tuple[List[QASession], Optional[str]]:
+        """
+        按最后活动时间倒序分页列出用户的会话（基于游标的键集分页）
+        
+        排序键为 (last_activity, session_id)，每页只读取 limit + 1 条，
+        翻页代价与页码无关，可直接使用 (user_id[, literature_id], last_activity) 复合索引。
+        
+        Args:
+            user_id: 用户ID
+            literature_id: 文献ID（可选）
+            limit: 每页数量
+            cursor: 上一页返回的游标，为空时从第一页开始
+            db: 数据库会话
+            
+        Returns:
+            Tuple[List[QASession], Optional[str]]: (本页会话, 下一页游标，没有更多时为None)
+            
+        Raises:
+            ValueError: 游标格式无效
+        """
+        if db is None:
+            db = next(get_db())
+        
+        conditions = [QASession.user_id == user_id]
+        if literature_id:
+            conditions.append(QASession.literature_id == literature_id)
+        if cursor:
+            last_activity, session_id = self.decode_session_cursor(cursor)
+            conditions.append(or_(
+                QASession.last_activity < last_activity,
+                and_(QASession.last_activity == last_activity, QASession.session_id < session_id)
+            ))
+        
+        sessions = db.query(QASession).filter(and_(*conditions)).order_by(
+            desc(QASession.last_activity), desc(QASession.session_id)
+        ).limit(limit + 1).all()
+        
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            return sessions, self.encode_session_cursor(sessions[-1])
+        return sessions, None
+    
+    def list_turns(
+        self,
+        session_id: str,
+        limit: int = 50,
+        after_turn_index: int = 0,
+        db: Session = None
+    ) -> Tuple[List[ConversationTurn], Optional[int]]:
+        """
+        按轮次序号分页读取会话的对话轮次，使用 (session_id, turn_index) 复合索引
+        
+        Args:
+            session_id: 会话ID
+            limit: 每页数量，小于等于0时返回全部
+            after_turn_index: 只返回序号大于该值的轮次
+            db: 数据库会话
+            
+        Returns:
+            Tuple[List[ConversationTurn], Optional[int]]: (本页轮次, 下一页的 after_turn_index，没有更多时为None)
+        """
+        if db is None:
+            db = next(get_db())
+        
+        query = db.query(ConversationTurn).filter(
+            ConversationTurn.session_id == session_id,
+            ConversationTurn.turn_index > after_turn_index
+        ).order_by(ConversationTurn.turn_index)
+        
+        if limit <= 0:
+            return query.all(), None
+        
+        turns = query.limit(limit + 1).all()
+        if len(turns) > limit:
+            turns = turns[:limit]
+            return turns, turns[-1].turn_index
+        return turns, None
+
     def get_relevant_history(
         self,
         session_id: str,
@@ -307,11 +699,8 @@ class ConversationManager:
         Returns:
             List[Dict]: 相关的对话历史
         """
-        if db is None:
-            db = next(get_db())
-        
         try:
-            # 获取最近的对话历史
+            # 获取最近的对话历史（命中缓存时不访问数据库）
             recent_history = self.get_conversation_history(
                 session_id, max_turns * 2, db=db
             )
@@ -353,35 +742,30 @@ class ConversationManager:
         # 提取当前问题的关键词
         question_keywords = self._extract_keywords(current_question)
         
-        # 计算每个历史轮次的相关性
+        question_keywords = set(question_keywords)
+        
+        # 计算每个用户问题的相关性，记录其在历史中的位置
         scored_history = []
-        for turn in history:
+        for index, turn in enumerate(history):
             if turn.get("role") == "user":
                 content = turn.get("content", "")
                 content_keywords = self._extract_keywords(content)
                 
                 # 计算关键词重叠度
-                overlap = len(set(question_keywords) & set(content_keywords))
+                overlap = len(question_keywords & set(content_keywords))
                 relevance_score = overlap / max(len(question_keywords), 1)
                 
-                scored_history.append({
-                    "turn": turn,
-                    "relevance": relevance_score
-                })
+                scored_history.append((relevance_score, index))
         
-        # 按相关性排序并取最相关的
-        scored_history.sort(key=lambda x: x["relevance"], reverse=True)
+        # 按相关性排序并取最相关的（排序稳定，同分时保持时间顺序）
+        scored_history.sort(key=lambda x: x[0], reverse=True)
         
         # 构建相关历史（包含前后文）
         relevant_history = []
         added_indices = set()
         
-        for item in scored_history[:max_turns]:
-            turn_index = next(
-                (i for i, h in enumerate(history) if h == item["turn"]), -1
-            )
-            
-            if turn_index != -1 and turn_index not in added_indices:
+        for _, turn_index in scored_history[:max_turns]:
+            if turn_index not in added_indices:
                 # 添加用户问题
                 relevant_history.append(history[turn_index])
                 added_indices.add(turn_index)
@@ -395,6 +779,70 @@ class ConversationManager:
         
         return relevant_history
 
+    def select_relevant_history(
+        self,
+        history: List[Dict],
+        current_question: str,
+        question_embedding: Optional[List[float]],
+        max_turns: int = None
+    ) -> List[Dict]:
+        """
+        按问题向量相似度选择相关历史
+        
+        用户消息带有问题向量时计算与当前问题的余弦相似度，没有向量的旧轮次退回关键词重叠度；
+        最近一轮始终保留以承接追问，其余轮次低于相似度阈值的不进入提示词。
+        
+        Args:
+            history: 按时间顺序的对话历史（get_conversation_history 的结果）
+            current_question: 当前问题
+            question_embedding: 当前问题向量
+            max_turns: 最多保留的轮次数（默认使用配置）
+            
+        Returns:
+            List[Dict]: 按时间顺序排列的相关历史
+        """
+        max_turns = max_turns or Config.RAG_HISTORY_RELEVANT_TURNS
+        user_indices = [index for index, message in enumerate(history) if message.get("role") == "user"]
+        if not user_indices or max_turns <= 0:
+            return []
+        
+        query = self._as_vector(question_embedding)
+        scores = np.zeros(len(user_indices))
+        vector_positions = []
+        if query is not None and np.linalg.norm(query) > 0:
+            vector_positions = [
+                position for position, index in enumerate(user_indices)
+                if history[index].get("embedding") is not None
+                and len(history[index]["embedding"]) == len(query)
+            ]
+        
+        if vector_positions:
+            matrix = np.stack([history[user_indices[position]]["embedding"] for position in vector_positions])
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            norms[norms == 0] = 1.0
+            scores[vector_positions] = matrix @ query / norms
+        
+        keyword_positions = set(range(len(user_indices))) - set(vector_positions)
+        if keyword_positions:
+            question_keywords = set(self._extract_keywords(current_question))
+            for position in keyword_positions:
+                content_keywords = set(self._extract_keywords(history[user_indices[position]].get("content", "")))
+                scores[position] = len(question_keywords & content_keywords) / max(len(question_keywords), 1)
+        
+        selected = {len(user_indices) - 1}
+        for position in np.argsort(-scores, kind="stable"):
+            if len(selected) >= max_turns or scores[position] < Config.RAG_HISTORY_MIN_SIMILARITY:
+                break
+            selected.add(int(position))
+        
+        relevant_history = []
+        for position in sorted(selected):
+            index = user_indices[position]
+            relevant_history.append(history[index])
+            if index + 1 < len(history) and history[index + 1].get("role") == "assistant":
+                relevant_history.append(history[index + 1])
+        return relevant_history
+
     def _extract_keywords(self, text: str) -> List[str]:
         """
         提取文本关键词
@@ -410,17 +858,19 @@ class ConversationManager:
         # 简单的关键词提取
         stopwords = {'的', '是', '在', '有', '和', '与', '对', '为', '了', '也', '可以', '能够', '这个', '那个', '什么', '如何', '怎么', '请问'}
         
-        # 提取中文词汇和英文单词
-        chinese_words = re.findall(r'[\u4e00-\u9fff]+', text)
+        # 提取中文词汇和英文单词；中文没有分词，连续汉字按二字组切分，否则整句只算一个"关键词"
+        chinese_words = []
+        for run in re.findall(r'[\u4e00-\u9fff]+', text):
+            chinese_words.extend(run[i:i + 2] for i in range(max(len(run) - 1, 1)))
         english_words = re.findall(r'\b[a-zA-Z]+\b', text.lower())
         
         # 过滤停用词和短词
         keywords = []
         for word in chinese_words + english_words:
-            if len(word) >= 2 and word not in stopwords:
+            if len(word) >= 2 and word not in stopwords and not (set(word) & stopwords) and word not in keywords:
                 keywords.append(word)
         
-        return keywords[:10]  # 返回前10个关键词
+        return keywords[:20]  # 返回前20个关键词
 
     def compress_history(
         self,
@@ -629,9 +1079,13 @@ class ConversationManager:
             if not session:
                 return False
             
-            # 删除会话（级联删除相关记录）
+            # 删除会话（级联删除相关记录，问题向量没有ORM关联，单独删除）
+            db.query(TurnEmbedding).filter(
+                TurnEmbedding.session_id == session_id
+            ).delete(synchronize_session=False)
             db.delete(session)
             db.commit()
+            self.invalidate_history_cache(session_id)
             
             self.logger.info(f"删除会话: {session_id}")
             return True
@@ -644,44 +1098,71 @@ class ConversationManager:
     def cleanup_old_sessions(
         self,
         days_old: int = 30,
-        db: Session = None
+        db: Session = None,
+        batch_size: int = None,
+        stop_event: threading.Event = None
     ) -> int:
         """
         清理旧会话
         
+        按批次做集合删除，每批一个短事务：先取出一批过期会话ID，
+        再依次删除其问题向量、对话轮次、摘要和会话本身，批次之间短暂停顿让出SQLite写锁。
+        
         Args:
             days_old: 天数阈值
             db: 数据库会话
+            batch_size: 每批删除的会话数（默认使用配置）
+            stop_event: 停止信号（可选），置位后在当前批次结束时退出
             
         Returns:
             int: 清理的会话数量
+            
+        Raises:
+            Exception: 某一批删除失败（该批已回滚，之前的批次已提交）
         """
         if db is None:
             db = next(get_db())
+        batch_size = batch_size or Config.SESSION_CLEANUP_BATCH_SIZE
+        cutoff_date = datetime.now() - timedelta(days=days_old)
         
-        try:
-            cutoff_date = datetime.now() - timedelta(days=days_old)
-            
-            # 查找旧会话
-            old_sessions = db.query(QASession).filter(
-                QASession.last_activity < cutoff_date
-            ).all()
-            
-            count = len(old_sessions)
-            
-            # 删除旧会话
-            for session in old_sessions:
-                db.delete(session)
-            
-            db.commit()
+        count = 0
+        while True:
+            try:
+                # 本批的会话ID只查询一次，子表删除和缓存失效针对同一批会话
+                session_ids = [row[0] for row in db.query(QASession.session_id).filter(
+                    QASession.last_activity < cutoff_date
+                ).limit(batch_size).all()]
+                if not session_ids:
+                    break
+                
+                for model in (TurnEmbedding, ConversationTurn, ConversationSummary):
+                    db.query(model).filter(
+                        model.session_id.in_(session_ids)
+                    ).delete(synchronize_session=False)
+                deleted = db.query(QASession).filter(
+                    QASession.session_id.in_(session_ids)
+                ).delete(synchronize_session=False)
+                db.commit()
+                
+            except Exception as e:
+                db.rollback()
+                self.logger.error(f"清理旧会话失败（已清理 {count} 个）: {str(e)}")
+                raise
             
-            self.logger.info(f"清理了 {count} 个旧会话")
-            return count
+            for session_id in session_ids:
+                self.invalidate_history_cache(session_id)
+            count += deleted
             
-        except Exception as e:
-            db.rollback()
-            self.logger.error(f"清理旧会话失败: {str(e)}")
-            return 0
+            if deleted == 0 or len(session_ids) < batch_size:
+                break
+            if stop_event is None:
+                time.sleep(Config.SESSION_CLEANUP_BATCH_PAUSE)
+            elif stop_event.wait(Config.SESSION_CLEANUP_BATCH_PAUSE):
+                self.logger.info("收到停止信号，提前结束旧会话清理")
+                break
+        
+        self.logger.info(f"清理了 {count} 个旧会话")
+        return count
 
 
 # 创建全局对话管理器实例
@@ -0,0 +1,364 @@
+"""
+对话异步写入模块
+
+问答请求只在内存中登记新会话和新轮次（ID预先分配）并立即返回，
+后台线程按批把会话和轮次写入数据库，一个事务提交一批，减少SQLite写锁竞争对答案延迟的影响。
+同一次 add_qa_turns 登记的轮次作为一个写入单元，总在同一个事务中写入或重试。
+应用关闭时由 lifespan 钩子调用 stop()，等待队列中的记录全部写完。
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.database import SessionLocal
+from app.models.conversation import QASession
+from app.utils.conversation_manager import conversation_manager
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 停止信号
+_STOP = object()
+
+
+class ConversationWriter:
+    """对话会话和轮次的后台批量写入器"""
+
+    def __init__(self):
+        self.batch_size = Config.CONVERSATION_WRITE_BATCH_SIZE
+        self.flush_interval = Config.CONVERSATION_WRITE_FLUSH_INTERVAL
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+        # 已登记但尚未写入的会话：会话ID -> 用户ID
+        self._pending_sessions: Dict[str, Any] = {}
+        # 已登记但尚未写入的轮次：轮次ID -> 会话ID
+        self._pending_turns: Dict[str, str] = {}
+        # 每批写完后通知等待中的查询
+        self._written = threading.Condition(self._lock)
+        self.stats = {"sessions": 0, "turns": 0, "batches": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        """启动后台写入线程（应用启动时调用）"""
+        if not Config.CONVERSATION_WRITE_BEHIND_ENABLED:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+            self._thread.start()
+        logger.info("对话异步写入已启动")
+
+    def stop(self, timeout: float = None) -> bool:
+        """
+        停止后台线程，等待队列中已登记的记录全部写入
+
+        Args:
+            timeout: 最长等待时间（秒），默认使用配置
+
+        Returns:
+            bool: 是否在超时前写完
+        """
+        with self._lock:
+            if not self._running:
+                return True
+            # 先置为停止再放入停止信号，之后的登记都会回退为同步写入
+            self._running = False
+            self._queue.put(_STOP)
+        self._thread.join(timeout or Config.CONVERSATION_WRITE_SHUTDOWN_TIMEOUT)
+        finished = not self._thread.is_alive()
+        if finished:
+            logger.info(f"对话异步写入已停止: {self.get_stats()}")
+        else:
+            logger.error(f"对话异步写入未能在关闭前写完，剩余 {self._queue.qsize()} 条")
+        return finished
+
+    def _enqueue(self, item: Dict) -> bool:
+        """登记一条待写记录，写入器未运行时返回False"""
+        with self._lock:
+            if not self._running:
+                return False
+            self._queue.put(item)
+            if item["kind"] == "turns":
+                for turn in item["turns"]:
+                    self._pending_turns[turn["turn_id"]] = item["session_id"]
+            return True
+
+    def is_pending_turn(self, turn_id: str) -> bool:
+        """轮次是否已登记但尚未写入"""
+        with self._lock:
+            return turn_id in self._pending_turns
+
+    def is_pending_session(self, session_id: str) -> bool:
+        """会话或其轮次是否已登记但尚未写入"""
+        with self._lock:
+            return self._has_pending_session(session_id)
+
+    def _has_pending_session(self, session_id: str) -> bool:
+        return session_id in self._pending_sessions or session_id in self._pending_turns.values()
+
+    def wait_for_turn(self, turn_id: str, timeout: float = None) -> bool:
+        """
+        等待轮次写入完成（写入失败被丢弃也视为完成）
+
+        Args:
+            turn_id: 轮次ID
+            timeout: 最长等待时间（秒），默认使用配置
+
+        Returns:
+            bool: 是否在超时前完成
+        """
+        with self._written:
+            return self._written.wait_for(
+                lambda: turn_id not in self._pending_turns,
+                timeout or Config.CONVERSATION_WRITE_SHUTDOWN_TIMEOUT
+            )
+
+    def wait_for_session(self, session_id: str, timeout: float = None) -> bool:
+        """等待会话及其已登记的轮次写入完成，参数与 wait_for_turn 相同"""
+        with self._written:
+            return self._written.wait_for(
+                lambda: not self._has_pending_session(session_id),
+                timeout or Config.CONVERSATION_WRITE_SHUTDOWN_TIMEOUT
+            )
+
+    def get_or_create_session(
+        self,
+        user_id: int,
+        group_id: str,
+        literature_id: str,
+        session_id: str = None,
+        db: Session = None
+    ) -> str:
+        """
+        获取或创建对话会话，新会话只登记不提交，最后活动时间随轮次一起更新
+
+        Args:
+            user_id: 用户ID
+            group_id: 研究组ID
+            literature_id: 文献ID
+            session_id: 会话ID（可选）
+            db: 数据库会话
+
+        Returns:
+            str: 会话ID
+        """
+        if not self._running:
+            return conversation_manager.get_or_create_session(
+                user_id, group_id, literature_id, session_id=session_id, db=db
+            )
+
+        if session_id:
+            with self._lock:
+                if self._pending_sessions.get(session_id) == user_id:
+                    return session_id
+            existing_session = db.query(QASession.session_id).filter(
+                and_(
+                    QASession.session_id == session_id,
+                    QASession.user_id == user_id,
+                    QASession.is_active == True
+                )
+            ).first()
+            if existing_session:
+                return session_id
+
+        new_session_id = str(uuid.uuid4())
+        with self._lock:
+            self._pending_sessions[new_session_id] = user_id
+        item = {
+            "kind": "session",
+            "session_id": new_session_id,
+            "user_id": user_id,
+            "group_id": group_id,
+            "literature_id": literature_id,
+            "start_time": datetime.now()
+        }
+        if not self._enqueue(item):
+            with self._lock:
+                self._pending_sessions.pop(new_session_id, None)
+            return conversation_manager.create_session(user_id, group_id, literature_id, db=db)
+
+        # 新会话没有历史轮次，直接建立空缓存
+        conversation_manager.set_history_cache(new_session_id, [])
+        return new_session_id
+
+    def add_qa_turns(self, session_id: str, turns: List[Dict[str, Any]], db: Session = None) -> List[str]:
+        """
+        登记问答轮次，立即返回预先分配的轮次ID
+
+        Args:
+            session_id: 会话ID
+            turns: 轮次列表，每项的键与 add_qa_turn 的参数相同
+            db: 数据库会话（写入器未运行、回退为同步写入时使用）
+
+        Returns:
+            List[str]: 与输入顺序一致的轮次ID
+        """
+        items = [
+            {
+                **turn,
+                "turn_id": turn.get("turn_id") or str(uuid.uuid4()),
+                "timestamp": datetime.now()
+            }
+            for turn in turns
+        ]
+        # 同一请求的轮次作为一个单元入队，不会被拆到两个事务中，保证全部保存或全部不保存
+        if self._enqueue({"kind": "turns", "session_id": session_id, "turns": items}):
+            return [item["turn_id"] for item in items]
+
+        return conversation_manager.add_qa_turns(session_id, items, db=db)
+
+    def add_qa_turn(self, session_id: str, question: str, db: Session = None, **fields) -> str:
+        """登记单个问答轮次，参数与 ConversationManager.add_qa_turn 相同"""
+        return self.add_qa_turns(session_id, [{"question": question, **fields}], db=db)[0]
+
+    @staticmethod
+    def _record_count(unit: Dict) -> int:
+        """写入单元包含的记录数"""
+        return len(unit["turns"]) if unit["kind"] == "turns" else 1
+
+    def _run(self):
+        """后台线程主循环：攒批后一次提交，写入单元不拆分"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            size = self._record_count(item)
+            deadline = time.monotonic() + self.flush_interval
+            while size < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += self._record_count(item)
+            self._flush(batch)
+
+    def _flush(self, batch: List[Dict]):
+        """写入一批单元，整批失败时逐个单元重试，仅丢弃确实无法写入的单元"""
+        try:
+            written = self._write(batch)
+            self.stats["batches"] += 1
+        except Exception as e:
+            logger.warning(f"对话批量写入失败，逐个单元重试: {e}")
+            written = []
+            for item in batch:
+                try:
+                    written.extend(self._write([item]))
+                except Exception as item_error:
+                    self.stats["failed"] += self._record_count(item)
+                    logger.error(f"对话记录写入失败 {item['kind']} {item['session_id']}: {item_error}")
+
+        with self._written:
+            for item in batch:
+                if item["kind"] == "session":
+                    self._pending_sessions.pop(item["session_id"], None)
+                else:
+                    for turn in item["turns"]:
+                        self._pending_turns.pop(turn["turn_id"], None)
+            self._written.notify_all()
+
+        # 写入成功后追加到历史缓存
+        for session_id, conversation_turns in written:
+            conversation_manager.append_history_cache(session_id, [conversation_turns])
+
+    def _write(self, batch: List[Dict]) -> List[tuple]:
+        """
+        在一个事务中写入会话和轮次
+
+        Returns:
+            List[tuple]: 已写入轮次的 (会话ID, 对话格式)
+        """
+        db = SessionLocal()
+        try:
+            sessions: Dict[str, QASession] = {}
+            for item in batch:
+                if item["kind"] == "session":
+                    session = QASession(
+                        session_id=item["session_id"],
+                        user_id=item["user_id"],
+                        group_id=item["group_id"],
+                        literature_id=item["literature_id"],
+                        session_title=f"会话-{item['start_time'].strftime('%Y%m%d-%H%M%S')}",
+                        start_time=item["start_time"],
+                        last_activity=item["start_time"],
+                        # 列默认值在插入时才生效，同批轮次需要立即累加计数
+                        turn_count=0,
+                        total_questions=0,
+                        total_answers=0,
+                        avg_confidence=0.0
+                    )
+                    db.add(session)
+                    sessions[session.session_id] = session
+
+            # 已存在的会话一次查询取回
+            existing_ids = {
+                item["session_id"] for item in batch
+                if item["kind"] == "turns" and item["session_id"] not in sessions
+            }
+            if existing_ids:
+                for session in db.query(QASession).filter(QASession.session_id.in_(existing_ids)).all():
+                    sessions[session.session_id] = session
+
+            written = []
+            for item in batch:
+                if item["kind"] != "turns":
+                    continue
+                session = sessions.get(item["session_id"])
+                if session is None:
+                    raise ValueError(f"会话不存在: {item['session_id']}")
+                for turn_data in item["turns"]:
+                    turn = conversation_manager.create_turn_record(session, turn_data)
+                    db.add(turn)
+                    embedding_record = conversation_manager.create_embedding_record(turn, turn_data.get("question_embedding"))
+                    if embedding_record is not None:
+                        db.add(embedding_record)
+                    written.append((session.session_id, conversation_manager.turn_messages(turn, turn_data.get("question_embedding"))))
+
+            db.commit()
+            self.stats["sessions"] += sum(1 for item in batch if item["kind"] == "session")
+            self.stats["turns"] += len(written)
+            return written
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        """获取写入统计"""
+        return {
+            "enabled": Config.CONVERSATION_WRITE_BEHIND_ENABLED,
+            "running": self._running,
+            "queued": self._queue.qsize(),
+            "pending_sessions": len(self._pending_sessions),
+            "pending_turns": len(self._pending_turns),
+            **self.stats
+        }
+
+
+# 创建全局实例
+conversation_writer = ConversationWriter()
@@ -8,6 +8,7 @@ import logging
 from typing import List, Optional, Dict, Tuple
 from app.config import settings
 from app.utils.cache_manager import cache_manager
+from app.utils.ai_config import get_genai_client, get_openai_client, get_async_openai_client
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -18,6 +19,7 @@ class EmbeddingService:
     def __init__(self):
         self.provider = settings.get_ai_provider()
         self.client = None
+        self.async_client = None
         self._initialize_client()
     
     def _initialize_client(self):
@@ -37,12 +39,12 @@ class EmbeddingService:
     def _initialize_openai_client(self):
         """初始化OpenAI客户端"""
         try:
-            import openai
-            
             if not settings.OPENAI_API_KEY:
                 raise ValueError("OpenAI API密钥未配置")
             
-            self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+            # 使用共享客户端，异步接口单独使用共享的异步客户端
+            self.client = get_openai_client()
+            self.async_client = get_async_openai_client()
             logger.info("OpenAI客户端初始化成功")
             
         except ImportError:
@@ -55,13 +57,12 @@ class EmbeddingService:
     def _initialize_google_client(self):
         """初始化Google客户端"""
         try:
-            from google import genai
-            
             if not settings.GOOGLE_API_KEY:
                 raise ValueError("Google API密钥未配置")
             
-            # 使用新的SDK创建客户端
-            self.client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+            # 使用共享客户端，异步调用走 client.aio
+            self.client = get_genai_client()
+            self.async_client = self.client.aio
             logger.info("Google GenAI客户端初始化成功")
             
         except ImportError as e:
@@ -261,6 +262,162 @@ class EmbeddingService:
             # OpenAI和其他提供商使用相同的方法
             return self.generate_embedding(query)
     
+    async def agenerate_embedding(self, text: str) -> Optional[List[float]]:
+        """
+        异步生成单个文本的embedding（带缓存支持），不占用线程
+        
+        Args:
+            text: 要向量化的文本
+            
+        Returns:
+            Optional[List[float]]: 向量，失败时返回None
+        """
+        if not self.is_available() or self.async_client is None:
+            logger.error("Embedding服务不可用")
+            return None
+        
+        if not text or not text.strip():
+            logger.warning("输入文本为空")
+            return None
+        
+        cached_embedding = cache_manager.get_embedding(text, self.provider)
+        if cached_embedding is not None:
+            logger.debug(f"Embedding缓存命中: {text[:30]}...")
+            return cached_embedding
+        
+        try:
+            if self.provider == "openai":
+                response = await self.async_client.embeddings.create(
+                    model=settings.OPENAI_EMBEDDING_MODEL,
+                    input=text,
+                    encoding_format="float"
+                )
+                embedding = response.data[0].embedding
+            elif self.provider == "google":
+                embedding = await self._agenerate_google_embedding(text, "RETRIEVAL_DOCUMENT")
+            else:
+                logger.error(f"不支持的AI提供商: {self.provider}")
+                return None
+            
+            if embedding:
+                cache_manager.set_embedding(text, embedding, self.provider)
+            
+            return embedding
+            
+        except Exception as e:
+            logger.error(f"异步生成embedding失败: {e}")
+            return None
+    
+    async def agenerate_query_embedding(self, query: str) -> Optional[List[float]]:
+        """
+        异步生成查询文本的embedding
+        
+        Args:
+            query: 查询文本
+            
+        Returns:
+            Optional[List[float]]: 查询向量
+        """
+        if not query or not query.strip():
+            logger.warning("查询文本为空")
+            return None
+        
+        if self.provider == "google" and self.async_client is not None:
+            try:
+                embedding = await self._agenerate_google_embedding(query, "RETRIEVAL_QUERY")
+                if embedding:
+                    return embedding
+            except Exception as e:
+                logger.error(f"Google查询embedding生成失败: {e}")
+            # 使用通用方法作为备用
+            return await self.agenerate_embedding(query)
+        
+        # OpenAI和其他提供商使用相同的方法
+        return await self.agenerate_embedding(query)
+    
+    async def agenerate_query_embeddings(self, queries: List[str]) -> List[Optional[List[float]]]:
+        """
+        异步批量生成查询文本的embedding，未命中缓存的文本合并为一次接口调用
+
+        Args:
+            queries: 查询文本列表
+
+        Returns:
+            List[Optional[List[float]]]: 与输入一一对应的查询向量，失败的位置为None
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(queries)
+        if not self.is_available() or self.async_client is None:
+            logger.error("Embedding服务不可用")
+            return embeddings
+
+        # Google的查询向量与文档向量任务类型不同，不使用按文本缓存的文档向量
+        use_cache = self.provider == "openai"
+        pending = []
+        for index, query in enumerate(queries):
+            if not query or not query.strip():
+                continue
+            cached_embedding = cache_manager.get_embedding(query, self.provider) if use_cache else None
+            if cached_embedding is not None:
+                embeddings[index] = cached_embedding
+            else:
+                pending.append(index)
+
+        if not pending:
+            return embeddings
+
+        texts = [queries[index] for index in pending]
+        try:
+            if self.provider == "openai":
+                response = await self.async_client.embeddings.create(
+                    model=settings.OPENAI_EMBEDDING_MODEL,
+                    input=texts,
+                    encoding_format="float"
+                )
+                # 返回结果按 index 对应输入顺序
+                batch = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            elif self.provider == "google":
+                from google.genai import types
+
+                response = await self.async_client.models.embed_content(
+                    model="text-embedding-004",
+                    contents=texts,
+                    config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
+                )
+                batch = [embedding.values for embedding in (response.embeddings or [])]
+            else:
+                logger.error(f"不支持的AI提供商: {self.provider}")
+                return embeddings
+        except Exception as e:
+            logger.error(f"批量生成查询embedding失败: {e}")
+            return embeddings
+
+        if len(batch) != len(texts):
+            logger.error(f"批量embedding返回数量不符: {len(batch)}/{len(texts)}")
+            return embeddings
+
+        for index, embedding in zip(pending, batch):
+            embeddings[index] = embedding
+            if use_cache and embedding:
+                cache_manager.set_embedding(queries[index], embedding, self.provider)
+
+        logger.info(f"批量生成查询embedding: {len(texts)} 个（缓存命中 {len(queries) - len(texts)} 个）")
+        return embeddings
+
+    async def _agenerate_google_embedding(self, text: str, task_type: str) -> Optional[List[float]]:
+        """使用Google异步接口生成embedding"""
+        from google.genai import types
+        
+        response = await self.async_client.models.embed_content(
+            model="text-embedding-004",
+            contents=text,
+            config=types.EmbedContentConfig(task_type=task_type)
+        )
+        
+        if response.embeddings and len(response.embeddings) > 0:
+            return response.embeddings[0].values
+        logger.error("未获取到embedding响应")
+        return None
+    
     def test_connection(self) -> Dict:
         """
         测试连接和服务可用性
@@ -334,5 +491,32 @@ class EmbeddingService:
             )
         }
 
+def average_embedding(embeddings: List[List[float]]) -> Optional[List[float]]:
+    """
+    计算文档级向量：所有文本块向量的归一化平均值
+    
+    Args:
+        embeddings: 文本块向量列表
+        
+    Returns:
+        Optional[List[float]]: 文档向量，输入为空时返回None
+    """
+    vectors = [vector for vector in embeddings if vector]
+    if not vectors:
+        return None
+    
+    dim = len(vectors[0])
+    mean = [0.0] * dim
+    for vector in vectors:
+        if len(vector) != dim:
+            continue
+        for i, value in enumerate(vector):
+            mean[i] += value
+    
+    norm = sum(value * value for value in mean) ** 0.5
+    if norm == 0:
+        return None
+    return [value / norm for value in mean]
+
 # 创建全局embedding服务实例
 embedding_service = EmbeddingService()
\ No newline at end of file
@@ -41,6 +41,10 @@ class ValidationError(LiteratureSystemError):
     """验证相关错误"""
     pass
 
+class TaskCancelledError(LiteratureSystemError):
+    """后台任务被取消"""
+    pass
+
 def log_error(operation: str, error: Exception, user_id: str = None, extra_info: Dict[str, Any] = None):
     """
     记录错误日志
@@ -0,0 +1,212 @@
+"""
+文本提取沙箱模块
+在独立子进程中执行文本提取，限制单个文件的耗时和内存，
+避免异常PDF拖垮API服务进程
+"""
+
+import logging
+import multiprocessing
+import threading
+from typing import Optional
+
+from app.config import settings
+from app.utils.error_handler import LiteratureSystemError
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只保留超时保护
+    resource = None
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(LiteratureSystemError):
+    """沙箱内文本提取失败（超时、超内存或进程崩溃）"""
+    pass
+
+
+def _extraction_worker_main(conn, memory_limit_bytes: int):
+    """
+    子进程入口：设置资源限制后循环处理提取请求
+
+    Args:
+        conn: 与父进程通信的管道
+        memory_limit_bytes: 地址空间上限（字节），0表示不限制
+    """
+    if resource is not None and memory_limit_bytes > 0:
+        try:
+            # Linux 不强制 RLIMIT_RSS，用 RLIMIT_AS 作为实际可生效的内存上限
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+        except (ValueError, OSError) as e:
+            logger.warning(f"设置提取进程内存限制失败: {e}")
+
+    from app.utils.text_extractor import extract_text_from_file
+
+    while True:
+        try:
+            file_path = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if file_path is None:
+            break
+
+        try:
+            conn.send(("ok", extract_text_from_file(file_path)))
+        except MemoryError:
+            conn.send(("memory", "文本提取超出内存限制"))
+        except Exception as e:
+            conn.send(("error", f"文本提取异常: {e}"))
+
+
+class _ExtractionWorker:
+    """单个提取子进程"""
+
+    def __init__(self, ctx):
+        parent_conn, child_conn = ctx.Pipe()
+        self.conn = parent_conn
+        self.process = ctx.Process(
+            target=_extraction_worker_main,
+            args=(child_conn, settings.EXTRACTION_MEMORY_LIMIT_MB * 1024 * 1024),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.documents_processed = 0
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self, force: bool = False):
+        """停止子进程，force为True时直接终止"""
+        try:
+            if not force and self.process.is_alive():
+                self.conn.send(None)
+                self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(timeout=1)
+        except Exception as e:
+            logger.warning(f"停止提取进程失败: {e}")
+        finally:
+            self.conn.close()
+
+
+class ExtractionSandbox:
+    """提取子进程池，按需创建、超时终止、处理一定数量文档后回收"""
+
+    def __init__(self):
+        # 使用 spawn 避免在多线程的服务进程中 fork
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stats = {
+            "extracted": 0,
+            "timeouts": 0,
+            "memory_errors": 0,
+            "crashes": 0,
+            "recycled": 0
+        }
+
+    def _acquire_worker(self) -> _ExtractionWorker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.is_alive():
+                    return worker
+                worker.stop(force=True)
+        return _ExtractionWorker(self._ctx)
+
+    def _release_worker(self, worker: _ExtractionWorker):
+        # 处理一定数量文档后回收子进程，释放提取库累积的内存
+        if worker.documents_processed >= settings.EXTRACTION_WORKER_MAX_DOCUMENTS:
+            worker.stop()
+            self._record("recycled")
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _record(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def extract_text(self, file_path: str, timeout: Optional[float] = None) -> str:
+        """
+        在子进程中提取文件文本
+
+        Args:
+            file_path: 文件完整路径
+            timeout: 超时时间（秒），默认使用 EXTRACTION_TIMEOUT
+
+        Returns:
+            str: 提取的文本内容
+
+        Raises:
+            ExtractionError: 超时、超出内存限制或子进程崩溃
+        """
+        timeout = timeout or settings.EXTRACTION_TIMEOUT
+        worker = self._acquire_worker()
+
+        try:
+            worker.conn.send(file_path)
+            if not worker.conn.poll(timeout):
+                worker.stop(force=True)
+                self._record("timeouts")
+                raise ExtractionError(f"文本提取超时（{timeout}秒）", "extraction_timeout")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            # 子进程被系统杀死（如内存超限）或意外退出
+            worker.stop(force=True)
+            self._record("crashes")
+            raise ExtractionError("文本提取进程异常退出", "extraction_crashed")
+
+        worker.documents_processed += 1
+
+        if status == "memory":
+            # 内存耗尽后的子进程状态不可信，直接丢弃
+            worker.stop(force=True)
+            self._record("memory_errors")
+            raise ExtractionError(payload, "extraction_memory")
+
+        self._release_worker(worker)
+
+        if status != "ok":
+            raise ExtractionError(payload, "extraction_failed")
+
+        self._record("extracted")
+        return payload or ""
+
+    def shutdown(self):
+        """停止所有空闲子进程"""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.stop()
+
+    def get_stats(self) -> dict:
+        """获取沙箱统计信息"""
+        with self._lock:
+            return {**self._stats, "idle_workers": len(self._idle)}
+
+
+# 创建全局提取沙箱实例
+extraction_sandbox = ExtractionSandbox()
+
+
+def extract_text_sandboxed(file_path: str) -> str:
+    """
+    便捷函数：按配置在沙箱子进程或当前进程中提取文本
+
+    Args:
+        file_path: 文件完整路径
+
+    Returns:
+        str: 提取的文本内容
+    """
+    if not settings.EXTRACTION_SANDBOX_ENABLED:
+        from app.utils.text_extractor import extract_text_from_file
+        return extract_text_from_file(file_path)
+    return extraction_sandbox.extract_text(file_path)
@@ -0,0 +1,183 @@
+"""
+抽取式答案模块
+生成服务不可用或剩余时间不足时，直接从已检索的文档块中摘录与问题最相关的句子，
+按大模型答案的结构（主要回答、关键发现、局限性说明和【来源X】引用）组织成答案
+"""
+
+import math
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.config import Config
+
+# 句子切分：中文句末标点、英文句末标点后的空白以及换行
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[。！？；!?;])|(?<=[.])\s+|\n+')
+ENGLISH_WORD_PATTERN = re.compile(r'[a-zA-Z][a-zA-Z\-]{2,}')
+CHINESE_RUN_PATTERN = re.compile(r'[一-鿿]+')
+
+# 问题中不参与匹配的常见虚词
+QUESTION_STOPWORDS = {
+    "什么", "哪些", "如何", "怎么", "怎样", "为什么", "是否", "这篇", "文献", "论文", "文章",
+    "研究", "请问", "一下", "这个", "那个", "有哪", "是什",
+    "the", "and", "what", "which", "how", "why", "does", "this", "that", "paper", "study"
+}
+
+# 句子长度范围（字符），过短的多为标题或残句，过长的多为表格或未切分的段落
+MIN_SENTENCE_LENGTH = 8
+MAX_SENTENCE_LENGTH = 300
+
+# 打分权重：词项匹配、文档块向量相似度、句子在块内的位置
+LEXICAL_WEIGHT = 0.6
+SIMILARITY_WEIGHT = 0.3
+POSITION_WEIGHT = 0.1
+
+# 同一文档块最多摘录的句子数，避免答案集中在单个来源
+MAX_SENTENCES_PER_CHUNK = 2
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    将文本切分为句子，并过滤长度不合适的片段
+
+    Args:
+        text: 文档块文本
+
+    Returns:
+        List[str]: 句子列表
+    """
+    sentences = []
+    for sentence in SENTENCE_SPLIT_PATTERN.split(text or ""):
+        sentence = sentence.strip()
+        if MIN_SENTENCE_LENGTH <= len(sentence) <= MAX_SENTENCE_LENGTH:
+            sentences.append(sentence)
+    return sentences
+
+
+def extract_query_terms(question: str) -> List[str]:
+    """
+    提取问题中的匹配词项：中文按二字组切分，英文取单词
+
+    Args:
+        question: 用户问题
+
+    Returns:
+        List[str]: 去重后的词项列表（保持出现顺序）
+    """
+    terms = [word.lower() for word in ENGLISH_WORD_PATTERN.findall(question)]
+    for run in CHINESE_RUN_PATTERN.findall(question):
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return [term for term in dict.fromkeys(terms) if term not in QUESTION_STOPWORDS]
+
+
+def _score_sentences(
+    question: str,
+    sentences: List[Tuple[int, int, str]],
+    similarities: np.ndarray
+) -> np.ndarray:
+    """
+    向量化计算所有候选句子的得分
+
+    Args:
+        question: 用户问题
+        sentences: (文档块序号, 块内位置, 句子) 列表
+        similarities: 每个文档块与问题的向量相似度
+
+    Returns:
+        np.ndarray: 每个句子的得分
+    """
+    terms = extract_query_terms(question)
+    chunk_ids = np.array([chunk_id for chunk_id, _, _ in sentences])
+    positions = np.array([position for _, position, _ in sentences], dtype=np.float64)
+
+    lexical = np.zeros(len(sentences))
+    if terms:
+        lowered = [sentence.lower() for _, _, sentence in sentences]
+        # 词项出现矩阵：行是句子，列是问题词项
+        matches = np.array([[term in sentence for term in terms] for sentence in lowered], dtype=np.float64)
+        # 在候选句子中越少见的词项区分度越高
+        document_frequency = matches.sum(axis=0)
+        idf = np.log((len(sentences) + 1) / (document_frequency + 1)) + 1
+        lexical = matches @ idf / idf.sum()
+
+    # 文档块向量相似度归一化到0-1，作为块内所有句子的先验
+    chunk_similarity = similarities[chunk_ids]
+    spread = chunk_similarity.max() - chunk_similarity.min()
+    similarity = (chunk_similarity - chunk_similarity.min()) / spread if spread > 0 else np.ones(len(sentences))
+
+    # 块内靠前的句子通常是主题句
+    position = 1.0 / (1.0 + positions)
+
+    return LEXICAL_WEIGHT * lexical + SIMILARITY_WEIGHT * similarity + POSITION_WEIGHT * position
+
+
+def select_sentences(question: str, context_chunks: List[Dict], max_sentences: int) -> List[Tuple[int, str]]:
+    """
+    从文档块中选出与问题最相关的句子
+
+    Args:
+        question: 用户问题
+        context_chunks: 检索到的文档块（顺序即来源编号）
+        max_sentences: 最多选取的句子数
+
+    Returns:
+        List[Tuple[int, str]]: (文档块序号, 句子) 列表，按得分从高到低排列
+    """
+    sentences = [
+        (chunk_id, position, sentence)
+        for chunk_id, chunk in enumerate(context_chunks)
+        for position, sentence in enumerate(split_sentences(chunk.get("text", "")))
+    ]
+    if not sentences:
+        return []
+
+    similarities = np.array([float(chunk.get("similarity", 0.0)) for chunk in context_chunks])
+    scores = _score_sentences(question, sentences, similarities)
+
+    selected = []
+    per_chunk: Dict[int, int] = {}
+    seen = set()
+    for index in np.argsort(-scores, kind="stable"):
+        chunk_id, _, sentence = sentences[index]
+        if per_chunk.get(chunk_id, 0) >= MAX_SENTENCES_PER_CHUNK or sentence in seen:
+            continue
+        selected.append((chunk_id, sentence))
+        per_chunk[chunk_id] = per_chunk.get(chunk_id, 0) + 1
+        seen.add(sentence)
+        if len(selected) >= max_sentences:
+            break
+    return selected
+
+
+def build_extractive_answer(question: str, context_chunks: List[Dict], max_sentences: int = None) -> str:
+    """
+    生成抽取式答案文本，格式与大模型答案一致，可直接交给答案处理器解析
+
+    Args:
+        question: 用户问题
+        context_chunks: 检索到的文档块（顺序即来源编号）
+        max_sentences: 最多摘录的句子数（默认使用配置）
+
+    Returns:
+        str: 答案文本，没有可用句子时返回空字符串
+    """
+    max_sentences = max_sentences or Config.RAG_EXTRACTIVE_MAX_SENTENCES
+    selected = select_sentences(question, context_chunks, max_sentences)
+    if not selected:
+        return ""
+
+    cited = [f"{sentence}【来源{chunk_id + 1}】" for chunk_id, sentence in selected]
+    findings_count = max(1, math.ceil(len(selected) / 2))
+    findings = [
+        f"{number}. {sentence.rstrip('。.；;')}【来源{chunk_id + 1}】"
+        for number, (chunk_id, sentence) in enumerate(selected[:findings_count], 1)
+    ]
+
+    return (
+        "以下内容直接摘录自文献中与问题最相关的原文：\n\n"
+        + "\n".join(cited)
+        + "\n\n关键发现：\n"
+        + "\n".join(findings)
+        + "\n\n局限性说明：生成服务暂时不可用，本回答为原文摘录，未经归纳和推理，可能不完整。"
+    )
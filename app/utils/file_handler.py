@@ -5,8 +5,9 @@
 
 import os
 import uuid
+import zipfile
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import BinaryIO, List, Optional, Tuple
 from fastapi import UploadFile, HTTPException
 import logging
 
@@ -94,6 +95,98 @@ def save_uploaded_file(file: UploadFile, file_path: str) -> bool:
         logger.error(f"文件保存失败: {e}")
         return False
 
+def save_file_stream(source: BinaryIO, file_path: str, max_size: int = None) -> Optional[int]:
+    """
+    以固定大小的块将文件流写入磁盘，避免整个文件读入内存
+    
+    Args:
+        source: 可读的二进制文件流（UploadFile.file 或 ZIP 条目）
+        file_path: 目标文件路径
+        max_size: 允许写入的最大字节数，超出时放弃并删除已写入部分
+        
+    Returns:
+        Optional[int]: 写入的字节数，失败时返回None
+    """
+    max_size = max_size or config.MAX_FILE_SIZE
+    written = 0
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        
+        with open(file_path, "wb") as buffer:
+            while True:
+                block = source.read(config.UPLOAD_STREAM_CHUNK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_size:
+                    raise ValueError(f"文件超过大小限制 {max_size} 字节")
+                buffer.write(block)
+        
+        logger.info(f"文件流式保存成功: {file_path} ({written} 字节)")
+        return written
+        
+    except Exception as e:
+        logger.error(f"文件流式保存失败: {file_path} - {e}")
+        cleanup_file(file_path)
+        return None
+
+def decode_zip_member_name(info: zipfile.ZipInfo) -> str:
+    """
+    解析ZIP条目的文件名
+    
+    Windows中文系统打包的ZIP通常不设置UTF-8标志，文件名实际是GBK编码，
+    而zipfile会按cp437解码，这里尝试还原
+    
+    Args:
+        info: ZIP条目信息
+        
+    Returns:
+        str: 去掉目录部分的文件名
+    """
+    name = info.filename
+    if not info.flag_bits & 0x800:
+        try:
+            name = name.encode('cp437').decode('gbk')
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return os.path.basename(name.replace('\\', '/'))
+
+def list_zip_members(archive: zipfile.ZipFile) -> Tuple[List[Tuple[zipfile.ZipInfo, str]], List[Tuple[str, str]]]:
+    """
+    筛选ZIP中可导入的文献条目
+    
+    Args:
+        archive: 已打开的ZIP文件
+        
+    Returns:
+        Tuple: (可导入的 (条目, 文件名) 列表, 被拒绝的 (文件名, 原因) 列表)
+    """
+    accepted = []
+    rejected = []
+    
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        
+        filename = decode_zip_member_name(info)
+        
+        # 跳过macOS元数据和隐藏文件
+        if not filename or filename.startswith('.') or '__MACOSX' in info.filename:
+            continue
+        
+        if info.flag_bits & 0x1:
+            rejected.append((filename, "不支持加密的压缩条目"))
+        elif not validate_file_type(filename):
+            rejected.append((filename, "不支持的文件类型"))
+        elif info.file_size == 0:
+            rejected.append((filename, "文件不能为空"))
+        elif not validate_file_size(info.file_size):
+            rejected.append((filename, f"文件过大。最大允许大小: {config.MAX_FILE_SIZE // (1024 * 1024)}MB"))
+        else:
+            accepted.append((info, filename))
+    
+    return accepted, rejected
+
 def validate_upload_file(file: UploadFile) -> Tuple[bool, Optional[str]]:
     """
     综合验证上传文件
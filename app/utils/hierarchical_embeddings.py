@@ -0,0 +1,119 @@
+"""
+分层向量构建模块
+在文献入库时基于文本块向量生成文档级、标题/摘要级和章节级向量，
+使文献排序和由粗到细的检索可以直接查询少量向量，而不必扫描全部文本块
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.utils.document_processor import DocumentProcessor
+from app.utils.embedding_service import embedding_service, average_embedding
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 向量层级
+LEVEL_DOCUMENT = "document"
+LEVEL_TITLE = "title"
+LEVEL_SECTION = "section"
+
+# 章节识别只依赖正则和关键词，共享一个实例即可
+_document_processor = DocumentProcessor()
+
+
+def classify_chunk_sections(texts: List[str]) -> List[str]:
+    """
+    识别每个文本块所属的论文章节
+
+    Args:
+        texts: 文本块内容列表
+
+    Returns:
+        List[str]: 与输入一一对应的章节类型
+    """
+    return [_document_processor._identify_section_type(text) for text in texts]
+
+
+def _build_title_text(literature_title: str, texts: List[str], section_types: List[str]) -> str:
+    """拼接标题和摘要（没有识别到摘要时使用首个文本块）作为标题向量的输入"""
+    abstract_text = next(
+        (text for text, section_type in zip(texts, section_types) if section_type == "abstract"),
+        texts[0] if texts else ""
+    )
+    title_text = "\n\n".join(part for part in (literature_title, abstract_text) if part)
+    return title_text[:settings.HIERARCHICAL_TITLE_CONTEXT_CHARS]
+
+
+def build_hierarchical_vectors(
+    literature_id: str,
+    literature_title: str,
+    texts: List[str],
+    embeddings: List[List[float]],
+    title_embedding: Optional[List[float]] = None
+) -> List[Dict]:
+    """
+    根据文本块向量构建文献的分层向量
+
+    Args:
+        literature_id: 文献ID
+        literature_title: 文献标题
+        texts: 文本块内容（与 embeddings 一一对应）
+        embeddings: 文本块向量
+        title_embedding: 已有的标题/摘要向量（为空时调用embedding服务生成）
+
+    Returns:
+        List[Dict]: 向量条目列表，每项包含 vector_id、level、section_type、embedding、chunk_count
+    """
+    if not texts or len(texts) != len(embeddings):
+        return []
+
+    entries = []
+    document_vector = average_embedding(embeddings)
+    if document_vector:
+        entries.append({
+            "vector_id": f"{literature_id}_document",
+            "level": LEVEL_DOCUMENT,
+            "section_type": "",
+            "embedding": document_vector,
+            "chunk_count": len(embeddings)
+        })
+
+    section_types = classify_chunk_sections(texts)
+
+    # 标题/摘要向量：需要一次额外的embedding调用，失败时跳过
+    if title_embedding is None:
+        title_text = _build_title_text(literature_title, texts, section_types)
+        try:
+            title_embedding = embedding_service.generate_embedding(title_text) if title_text else None
+        except Exception as e:
+            logger.warning(f"生成标题向量失败 {literature_id}: {e}")
+            title_embedding = None
+    if title_embedding:
+        entries.append({
+            "vector_id": f"{literature_id}_title",
+            "level": LEVEL_TITLE,
+            "section_type": "abstract",
+            "embedding": title_embedding,
+            "chunk_count": 1
+        })
+
+    # 章节向量：同一章节的文本块向量取归一化平均值
+    sections: Dict[str, List[List[float]]] = {}
+    for section_type, embedding in zip(section_types, embeddings):
+        sections.setdefault(section_type, []).append(embedding)
+    for section_type, section_embeddings in sections.items():
+        section_vector = average_embedding(section_embeddings)
+        if not section_vector:
+            continue
+        entries.append({
+            "vector_id": f"{literature_id}_section_{section_type}",
+            "level": LEVEL_SECTION,
+            "section_type": section_type,
+            "embedding": section_vector,
+            "chunk_count": len(section_embeddings)
+        })
+
+    logger.info(f"文献 {literature_id} 生成 {len(entries)} 个分层向量（{len(sections)} 个章节）")
+    return entries
@@ -0,0 +1,113 @@
+"""
+文献处理断点模块
+按批次持久化已生成的文本块向量，任务失败或取消后重试时可从断点继续
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List
+
+from app.config import settings
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCheckpoint:
+    """文本块向量断点存储（每篇文献一个JSON Lines文件，按批次追加）"""
+
+    def __init__(self):
+        self.checkpoint_dir = os.path.join(settings.VECTOR_DB_PATH, "checkpoints")
+        self._lock = threading.Lock()
+
+    def _checkpoint_path(self, literature_id: str) -> str:
+        """获取文献的断点文件路径"""
+        return os.path.join(self.checkpoint_dir, f"{literature_id}.jsonl")
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """计算文本块内容哈希，分块结果变化时旧断点自动失效"""
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    def load(self, literature_id: str, model_name: str) -> Dict[str, Dict]:
+        """
+        读取文献已保存的向量
+
+        Args:
+            literature_id: 文献ID
+            model_name: 当前使用的embedding模型，模型不同的记录会被忽略
+
+        Returns:
+            Dict[str, Dict]: chunk_id -> {"text_hash", "embedding"}
+        """
+        path = self._checkpoint_path(literature_id)
+        if not os.path.exists(path):
+            return {}
+
+        records = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程在写入过程中退出时最后一行可能不完整
+                        continue
+                    if record.get("model") == model_name:
+                        records[record["chunk_id"]] = record
+        except Exception as e:
+            logger.warning(f"读取向量断点失败 {literature_id}: {e}")
+            return {}
+
+        if records:
+            logger.info(f"文献 {literature_id} 找到 {len(records)} 个已保存的向量断点")
+        return records
+
+    def append(self, literature_id: str, model_name: str, chunks: List[Dict], embeddings: List[List[float]]) -> None:
+        """
+        追加一个批次的向量
+
+        Args:
+            literature_id: 文献ID
+            model_name: embedding模型名称
+            chunks: 文本块数据（需包含 chunk_id 和 text）
+            embeddings: 与 chunks 一一对应的向量
+        """
+        if not chunks:
+            return
+
+        try:
+            with self._lock:
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+                with open(self._checkpoint_path(literature_id), 'a', encoding='utf-8') as f:
+                    for chunk, embedding in zip(chunks, embeddings):
+                        f.write(json.dumps({
+                            "chunk_id": chunk["chunk_id"],
+                            "text_hash": self.text_hash(chunk["text"]),
+                            "model": model_name,
+                            "embedding": embedding
+                        }) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception as e:
+            # 断点写入失败只影响重试成本，不影响本次处理
+            logger.warning(f"写入向量断点失败 {literature_id}: {e}")
+
+    def clear(self, literature_id: str) -> None:
+        """向量已写入向量库后删除断点"""
+        path = self._checkpoint_path(literature_id)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logger.warning(f"删除向量断点失败 {literature_id}: {e}")
+
+
+# 创建全局断点存储实例
+embedding_checkpoint = EmbeddingCheckpoint()
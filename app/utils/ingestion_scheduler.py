@@ -0,0 +1,121 @@
+"""
+文献处理调度模块
+按优先级通道和租户（研究组/个人库）公平调度后台处理任务
+"""
+
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional, Tuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 优先级通道（按优先级从高到低）
+PRIORITY_INTERACTIVE = "interactive"  # 单篇上传，用户通常马上要提问
+PRIORITY_GROUP = "group"              # 研究组批量上传
+PRIORITY_BULK = "bulk"                # 批量重建索引
+PRIORITY_LANES = (PRIORITY_INTERACTIVE, PRIORITY_GROUP, PRIORITY_BULK)
+
+
+class IngestionScheduler:
+    """
+    多通道公平调度队列
+
+    - 通道之间严格按优先级出队，交互式任务总是最先被处理
+    - 同一通道内按租户轮询，一个研究组的大批量导入不会饿死其他研究组
+    - 为交互式任务预留工作线程，非交互任务最多占用 max_workers - reserved_interactive 个
+    """
+
+    def __init__(self, max_workers: int, reserved_interactive: int = 1):
+        self.max_workers = max(1, max_workers)
+        # 至少留一个线程给非交互任务，否则批量任务永远无法执行
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_workers - 1)
+        self._cond = threading.Condition()
+        # 通道 -> OrderedDict(租户 -> deque[任务])，OrderedDict 的顺序即轮询顺序
+        self._lanes = {lane: OrderedDict() for lane in PRIORITY_LANES}
+        self._running = {lane: 0 for lane in PRIORITY_LANES}
+        self._submitted = {lane: 0 for lane in PRIORITY_LANES}
+
+    def submit(self, job: Any, priority: str = PRIORITY_INTERACTIVE, tenant: Optional[str] = None) -> None:
+        """
+        提交任务
+
+        Args:
+            job: 任务对象（由调用方解释）
+            priority: 优先级通道
+            tenant: 租户标识（研究组ID或 private_<用户ID>）
+        """
+        if priority not in self._lanes:
+            logger.warning(f"未知的优先级通道 {priority}，按交互式处理")
+            priority = PRIORITY_INTERACTIVE
+
+        with self._cond:
+            tenants = self._lanes[priority]
+            tenants.setdefault(tenant or "default", deque()).append(job)
+            self._submitted[priority] += 1
+            self._cond.notify()
+
+    def next_job(self) -> Tuple[str, Any]:
+        """
+        阻塞获取下一个可执行的任务
+
+        Returns:
+            Tuple[str, Any]: (所属通道, 任务对象)
+        """
+        with self._cond:
+            while True:
+                picked = self._pick_locked()
+                if picked:
+                    return picked
+                self._cond.wait()
+
+    def job_done(self, priority: str) -> None:
+        """任务执行结束，释放通道占用"""
+        with self._cond:
+            self._running[priority] = max(0, self._running[priority] - 1)
+            self._cond.notify_all()
+
+    def _pick_locked(self) -> Optional[Tuple[str, Any]]:
+        """在持有锁的情况下选出下一个任务"""
+        non_interactive_running = sum(
+            count for lane, count in self._running.items() if lane != PRIORITY_INTERACTIVE
+        )
+        non_interactive_limit = self.max_workers - self.reserved_interactive
+
+        for lane in PRIORITY_LANES:
+            tenants = self._lanes[lane]
+            if not tenants:
+                continue
+            if lane != PRIORITY_INTERACTIVE and non_interactive_running >= non_interactive_limit:
+                continue
+
+            # 取轮询队首租户的一个任务，然后把该租户移到队尾
+            tenant, jobs = next(iter(tenants.items()))
+            job = jobs.popleft()
+            if jobs:
+                tenants.move_to_end(tenant)
+            else:
+                del tenants[tenant]
+
+            self._running[lane] += 1
+            return lane, job
+
+        return None
+
+    def get_stats(self) -> Dict:
+        """获取调度队列状态"""
+        with self._cond:
+            return {
+                "max_workers": self.max_workers,
+                "reserved_interactive": self.reserved_interactive,
+                "lanes": {
+                    lane: {
+                        "queued": sum(len(jobs) for jobs in self._lanes[lane].values()),
+                        "tenants": len(self._lanes[lane]),
+                        "running": self._running[lane],
+                        "submitted": self._submitted[lane]
+                    }
+                    for lane in PRIORITY_LANES
+                }
+            }
@@ -63,6 +63,10 @@ class LiteratureManager:
             
             db.commit()
             
+            # 移出跨文献问答的候选范围（文本块向量保留，以便恢复）
+            from app.utils.vector_store import vector_store
+            vector_store.delete_document_summary(literature_id, literature.research_group_id)
+            
             logger.info(f"文献软删除成功: {literature_id} by {user_id}")
             return True
             
@@ -115,6 +119,10 @@ class LiteratureManager:
             
             db.commit()
             
+            # 重新加入跨文献问答的候选范围
+            from app.utils.vector_store import vector_store
+            vector_store.rebuild_document_summary(literature_id, literature.research_group_id, literature.title)
+            
             logger.info(f"文献恢复成功: {literature_id} by {user_id}")
             return True
             
@@ -0,0 +1,559 @@
+"""
+大模型生成服务提供商模块
+统一Gemini、OpenAI和本地模拟模型的同步、异步和流式生成接口，
+按配置的顺序选择提供商并在失败时回退
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+from app.utils.ai_config import get_genai_client, get_openai_client, get_async_openai_client
+from app.utils.resilience import CircuitBreaker, DeadlineExceededError, LatencyTracker
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 问答生成参数（较低的温度保证准确性）
+DEFAULT_TEMPERATURE = 0.3
+DEFAULT_TOP_P = 0.8
+DEFAULT_MAX_OUTPUT_TOKENS = 2000
+
+
+class LLMProvider(ABC):
+    """生成服务提供商抽象基类"""
+
+    name = "base"
+
+    def __init__(self):
+        self.model_name = ""
+
+    def is_available(self) -> bool:
+        """检查提供商是否可用"""
+        return False
+
+    @abstractmethod
+    def generate(self, prompt: str) -> Optional[str]:
+        """
+        同步生成完整答案
+
+        Args:
+            prompt: 完整的提示词
+
+        Returns:
+            Optional[str]: 生成的文本，失败或为空时返回None
+        """
+
+    @abstractmethod
+    async def agenerate(self, prompt: str) -> Optional[str]:
+        """异步生成完整答案"""
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """异步流式生成，逐段返回文本（默认一次性返回完整答案）"""
+        text = await self.agenerate(prompt)
+        if text:
+            yield text
+
+    def get_info(self) -> Dict:
+        """获取提供商信息"""
+        return {"provider": self.name, "model": self.model_name, "available": self.is_available()}
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini 生成服务"""
+
+    name = "gemini"
+
+    def __init__(self):
+        super().__init__()
+        self.model_name = settings.GEMINI_MODEL
+        self.client = None
+        try:
+            self.client = get_genai_client()
+        except Exception as e:
+            logger.error(f"Gemini客户端初始化失败: {e}")
+
+    def is_available(self) -> bool:
+        return self.client is not None
+
+    def _build_config(self):
+        from google.genai import types
+        return types.GenerateContentConfig(
+            temperature=DEFAULT_TEMPERATURE,
+            top_p=DEFAULT_TOP_P,
+            max_output_tokens=DEFAULT_MAX_OUTPUT_TOKENS,
+            candidate_count=1
+        )
+
+    def generate(self, prompt: str) -> Optional[str]:
+        response = self.client.models.generate_content(
+            model=self.model_name,
+            contents=[prompt],
+            config=self._build_config()
+        )
+        return getattr(response, 'text', None) or None
+
+    async def agenerate(self, prompt: str) -> Optional[str]:
+        # 使用SDK异步接口调用，等待期间不占用线程
+        response = await self.client.aio.models.generate_content(
+            model=self.model_name,
+            contents=[prompt],
+            config=self._build_config()
+        )
+        return getattr(response, 'text', None) or None
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=[prompt],
+            config=self._build_config()
+        )
+        async for chunk in stream:
+            text = getattr(chunk, 'text', None)
+            if text:
+                yield text
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI 生成服务"""
+
+    name = "openai"
+
+    def __init__(self):
+        super().__init__()
+        self.model_name = settings.OPENAI_MODEL
+        self.client = None
+        self.async_client = None
+        try:
+            self.client = get_openai_client()
+            self.async_client = get_async_openai_client()
+        except Exception as e:
+            logger.error(f"OpenAI客户端初始化失败: {e}")
+
+    def is_available(self) -> bool:
+        return self.client is not None and self.async_client is not None
+
+    def _request_kwargs(self, prompt: str) -> Dict:
+        return {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": DEFAULT_TEMPERATURE,
+            "top_p": DEFAULT_TOP_P,
+            "max_tokens": DEFAULT_MAX_OUTPUT_TOKENS
+        }
+
+    def generate(self, prompt: str) -> Optional[str]:
+        response = self.client.chat.completions.create(**self._request_kwargs(prompt))
+        return response.choices[0].message.content or None
+
+    async def agenerate(self, prompt: str) -> Optional[str]:
+        response = await self.async_client.chat.completions.create(**self._request_kwargs(prompt))
+        return response.choices[0].message.content or None
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.async_client.chat.completions.create(stream=True, **self._request_kwargs(prompt))
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class MockLLMProvider(LLMProvider):
+    """
+    本地模拟生成服务（用于离线压测）
+
+    按配置的首字延迟和生成速率模拟耗时，答案内容由提示词确定性生成，
+    并沿用真实答案的结构（主要回答、关键发现、局限性说明和【来源X】引用）。
+    """
+
+    name = "mock"
+
+    def __init__(
+        self,
+        first_token_latency: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        answer_tokens: Optional[int] = None
+    ):
+        super().__init__()
+        self.model_name = "mock-llm"
+        self.first_token_latency = (
+            first_token_latency if first_token_latency is not None
+            else settings.LLM_MOCK_FIRST_TOKEN_LATENCY_MS / 1000
+        )
+        self.tokens_per_second = tokens_per_second or settings.LLM_MOCK_TOKENS_PER_SECOND
+        self.answer_tokens = answer_tokens or settings.LLM_MOCK_ANSWER_TOKENS
+
+    def is_available(self) -> bool:
+        return True
+
+    def _build_answer_tokens(self, prompt: str) -> List[str]:
+        """根据提示词确定性地生成答案，并切分为模拟token"""
+        digest = hashlib.md5(prompt.encode('utf-8')).hexdigest()[:8]
+        sources = sorted({int(number) for number in re.findall(r'### 【来源(\d+)】', prompt)})[:3] or [1]
+        citations = "".join(f"【来源{number}】" for number in sources)
+
+        # 主要回答的长度按目标token数补足
+        filler = f"根据提供的文献内容，该问题的相关论述如下（模拟答案 {digest}）{citations}。"
+        main_tokens = max(self.answer_tokens - 40, 1)
+        main_answer = (filler * (main_tokens // len(filler) + 1))[:main_tokens]
+
+        answer = (
+            f"{main_answer}\n\n"
+            "关键发现：\n"
+            "1. 模拟要点一\n"
+            "2. 模拟要点二\n\n"
+            "局限性说明：这是本地模拟模型生成的答案。"
+        )
+        # 以单个字符作为一个模拟token，中文文本下与真实token数量级接近
+        return list(answer)
+
+    def generate(self, prompt: str) -> Optional[str]:
+        tokens = self._build_answer_tokens(prompt)
+        time.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        return "".join(tokens)
+
+    async def agenerate(self, prompt: str) -> Optional[str]:
+        tokens = self._build_answer_tokens(prompt)
+        await asyncio.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        return "".join(tokens)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        tokens = self._build_answer_tokens(prompt)
+        await asyncio.sleep(self.first_token_latency)
+        # 每次输出一小段，避免为每个字符单独调度
+        step = max(1, int(self.tokens_per_second // 10))
+        for start in range(0, len(tokens), step):
+            piece = tokens[start:start + step]
+            await asyncio.sleep(len(piece) / self.tokens_per_second)
+            yield "".join(piece)
+
+    def get_info(self) -> Dict:
+        return {
+            **super().get_info(),
+            "first_token_latency": self.first_token_latency,
+            "tokens_per_second": self.tokens_per_second,
+            "answer_tokens": self.answer_tokens
+        }
+
+
+# 提供商名称与实现类的对应关系
+PROVIDER_CLASSES = {
+    GeminiProvider.name: GeminiProvider,
+    OpenAIProvider.name: OpenAIProvider,
+    MockLLMProvider.name: MockLLMProvider
+}
+
+
+def get_configured_provider_names() -> List[str]:
+    """
+    获取配置的提供商回退顺序
+
+    LLM_PROVIDERS 为空时按已配置的API密钥决定：Gemini优先，OpenAI作为回退
+
+    Returns:
+        List[str]: 提供商名称列表
+    """
+    if settings.LLM_PROVIDERS.strip():
+        return [name.strip().lower() for name in settings.LLM_PROVIDERS.split(",") if name.strip()]
+
+    names = []
+    if settings.GOOGLE_API_KEY:
+        names.append(GeminiProvider.name)
+    if settings.OPENAI_API_KEY:
+        names.append(OpenAIProvider.name)
+    return names
+
+
+class LLMRouter:
+    """
+    按配置顺序调用生成服务提供商，失败时回退到下一个
+
+    每个提供商配有熔断器，连续失败后在冷却期内直接跳过；
+    异步生成时若首选提供商超过其历史耗时分位数仍未返回，
+    会向下一个提供商发起对冲请求，先返回有效答案的一方胜出。
+    """
+
+    def __init__(self, providers: Optional[List[LLMProvider]] = None):
+        if providers is None:
+            providers = []
+            for name in get_configured_provider_names():
+                provider_class = PROVIDER_CLASSES.get(name)
+                if provider_class is None:
+                    logger.warning(f"未知的生成服务提供商: {name}")
+                    continue
+                providers.append(provider_class())
+        self.providers = providers
+        self._stats = {provider.name: {"calls": 0, "failures": 0} for provider in providers}
+        self._breakers = {
+            provider.name: CircuitBreaker(
+                provider.name,
+                settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                settings.LLM_CIRCUIT_RESET_TIMEOUT
+            )
+            for provider in providers
+        }
+        self._latency = {provider.name: LatencyTracker() for provider in providers}
+        self._hedged_requests = 0
+
+        available = [provider.name for provider in self.available_providers()]
+        if available:
+            logger.info(f"生成服务提供商顺序: {', '.join(available)}")
+        else:
+            logger.error("没有可用的生成服务提供商")
+
+    def available_providers(self) -> List[LLMProvider]:
+        """获取可用的提供商（保持配置顺序）"""
+        return [provider for provider in self.providers if provider.is_available()]
+
+    def is_available(self) -> bool:
+        """是否至少有一个可用的提供商"""
+        return bool(self.available_providers())
+
+    def can_generate(self) -> bool:
+        """是否至少有一个可用且未熔断的提供商"""
+        return any(not self._breakers[provider.name].is_open() for provider in self.available_providers())
+
+    @property
+    def model_name(self) -> str:
+        """首选提供商的模型名称"""
+        providers = self.available_providers()
+        return providers[0].model_name if providers else ""
+
+    def _record(self, provider: LLMProvider, succeeded: bool):
+        stats = self._stats.setdefault(provider.name, {"calls": 0, "failures": 0})
+        stats["calls"] += 1
+        if not succeeded:
+            stats["failures"] += 1
+
+    def _allow(self, provider: LLMProvider) -> bool:
+        """检查熔断器是否放行该提供商"""
+        if self._breakers[provider.name].allow_request():
+            return True
+        logger.warning(f"{provider.name} 处于熔断状态，跳过")
+        return False
+
+    def _hedge_delay(self, provider: LLMProvider) -> float:
+        """计算发起对冲请求前的等待时间：样本充足时取耗时分位数，否则取默认值"""
+        tracker = self._latency[provider.name]
+        delay = settings.LLM_HEDGE_DEFAULT_DELAY
+        if tracker.count() >= settings.LLM_HEDGE_MIN_SAMPLES:
+            delay = tracker.percentile(settings.LLM_HEDGE_PERCENTILE)
+        return max(settings.LLM_HEDGE_MIN_DELAY, delay)
+
+    async def _timed_generate(self, provider: LLMProvider, prompt: str) -> Optional[str]:
+        """调用单个提供商，并记录耗时和熔断器状态"""
+        breaker = self._breakers[provider.name]
+        start = time.perf_counter()
+        try:
+            text = await provider.agenerate(prompt)
+        except asyncio.CancelledError:
+            # 对冲落败或超时被取消，由调用方决定是否计为失败
+            breaker.record_cancelled()
+            raise
+        except Exception:
+            breaker.record_failure()
+            self._record(provider, False)
+            raise
+        breaker.record_success()
+        self._latency[provider.name].record(time.perf_counter() - start)
+        self._record(provider, bool(text))
+        return text
+
+    def generate(self, prompt: str) -> Optional[str]:
+        """同步生成，依次尝试各提供商"""
+        for provider in self.available_providers():
+            if not self._allow(provider):
+                continue
+            breaker = self._breakers[provider.name]
+            try:
+                text = provider.generate(prompt)
+            except Exception as e:
+                logger.error(f"{provider.name} 生成失败，尝试下一个提供商: {e}")
+                breaker.record_failure()
+                self._record(provider, False)
+                continue
+            breaker.record_success()
+            self._record(provider, bool(text))
+            if text:
+                return text
+            logger.warning(f"{provider.name} 返回空响应，尝试下一个提供商")
+        return None
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        异步生成，依次尝试各提供商，必要时发起对冲请求
+
+        Args:
+            prompt: 完整的提示词
+            timeout: 生成阶段的总超时（秒），为空时不限制
+
+        Returns:
+            Optional[str]: 生成的文本，所有提供商失败或返回空时为None
+
+        Raises:
+            DeadlineExceededError: 超时前没有提供商返回有效答案
+        """
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        queue = self.available_providers()
+        pending: Dict[asyncio.Future, LLMProvider] = {}
+        hedged = False
+
+        def launch_next() -> bool:
+            while queue:
+                provider = queue.pop(0)
+                if self._allow(provider):
+                    task = asyncio.ensure_future(self._timed_generate(provider, prompt))
+                    pending[task] = provider
+                    return True
+            return False
+
+        launch_next()
+        try:
+            while pending:
+                remaining = None if expires_at is None else expires_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+
+                # 只对冲一次：首选提供商超过耗时分位数仍未返回时启动下一个提供商，
+                # 等待时间不超过剩余时间的一半，保证备用提供商有足够的时间返回
+                hedge_delay = None
+                if settings.LLM_HEDGE_ENABLED and not hedged and queue:
+                    hedge_delay = self._hedge_delay(next(iter(pending.values())))
+                    if remaining is not None:
+                        hedge_delay = min(hedge_delay, remaining / 2)
+                wait_timeout = hedge_delay if hedge_delay is not None else remaining
+
+                done, _ = await asyncio.wait(
+                    list(pending), timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if hedge_delay is None:
+                        break
+                    hedged = True
+                    if launch_next():
+                        self._hedged_requests += 1
+                        logger.info(f"首选提供商 {hedge_delay:.1f}秒 内未返回，发起对冲请求")
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        logger.error(f"{provider.name} 生成失败，尝试下一个提供商: {e}")
+                        continue
+                    if text:
+                        return text
+                    logger.warning(f"{provider.name} 返回空响应，尝试下一个提供商")
+
+                if not pending:
+                    launch_next()
+
+            if not pending:
+                return None
+
+            # 超时：未返回的提供商计为失败，累计到阈值后熔断
+            timed_out = list(pending.values())
+            await self._cancel(pending)
+            for provider in timed_out:
+                self._breakers[provider.name].record_failure()
+                self._record(provider, False)
+            raise DeadlineExceededError(
+                f"生成阶段超时（{timeout}秒），未返回: {', '.join(p.name for p in timed_out)}",
+                "deadline_exceeded"
+            )
+        finally:
+            await self._cancel(pending)
+
+    async def _cancel(self, pending: Dict[asyncio.Future, LLMProvider]):
+        """取消并回收仍在进行的请求"""
+        if not pending:
+            return
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        # 尚未开始执行就被取消的任务不会进入 _timed_generate 的异常处理，
+        # 在这里统一释放半开状态的试探机会（重复释放无副作用）
+        for task, provider in pending.items():
+            if task.cancelled():
+                self._breakers[provider.name].record_cancelled()
+        pending.clear()
+
+    async def astream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        流式生成：只有在尚未输出任何内容时失败才回退到下一个提供商，
+        已输出部分内容后失败则抛出原异常，避免拼接两个模型的答案，
+        也避免调用方把截断的答案当作完整答案
+
+        流式输出不做对冲（无法合并两路已输出的内容），
+        超时按剩余时间限制每个片段的等待。
+
+        Raises:
+            DeadlineExceededError: 超过生成阶段的总超时
+            Exception: 已输出部分内容后提供商出错（原异常）
+        """
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        for provider in self.available_providers():
+            if not self._allow(provider):
+                continue
+            breaker = self._breakers[provider.name]
+            emitted = False
+            recorded = False
+            start = time.perf_counter()
+            stream = provider.astream(prompt).__aiter__()
+            try:
+                while True:
+                    remaining = None if expires_at is None else max(0.0, expires_at - time.monotonic())
+                    try:
+                        text = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    emitted = True
+                    yield text
+                recorded = True
+                breaker.record_success()
+                self._latency[provider.name].record(time.perf_counter() - start)
+                self._record(provider, emitted)
+            except asyncio.TimeoutError:
+                recorded = True
+                breaker.record_failure()
+                self._record(provider, False)
+                raise DeadlineExceededError(f"{provider.name} 流式生成超时（{timeout}秒）", "deadline_exceeded")
+            except Exception as e:
+                recorded = True
+                logger.error(f"{provider.name} 流式生成失败: {e}")
+                breaker.record_failure()
+                self._record(provider, False)
+                if emitted:
+                    raise
+                continue
+            finally:
+                # 任务被取消或调用方提前关闭流（如SSE客户端断开时的 GeneratorExit），
+                # 不计入成功或失败，但要释放半开状态的试探机会
+                if not recorded:
+                    breaker.record_cancelled()
+                try:
+                    await stream.aclose()
+                except Exception:
+                    pass
+            if emitted:
+                return
+            logger.warning(f"{provider.name} 流式返回空响应，尝试下一个提供商")
+
+    def get_stats(self) -> Dict:
+        """获取各提供商的调用统计、熔断状态和耗时分位数"""
+        return {
+            "providers": [provider.get_info() for provider in self.providers],
+            "calls": {name: dict(stats) for name, stats in self._stats.items()},
+            "circuit_breakers": {name: breaker.get_state() for name, breaker in self._breakers.items()},
+            "latency_p95": {name: tracker.percentile(95) for name, tracker in self._latency.items()},
+            "hedged_requests": self._hedged_requests
+        }
+
+
+# 创建全局生成服务路由实例
+llm_router = LLMRouter()
@@ -0,0 +1,144 @@
+"""
+定期维护模块
+
+后台线程按固定间隔执行维护任务：分批清理过期的问答会话（含轮次、摘要和问题向量）
+以及异步处理器中的旧任务记录，并记录每个任务的运行统计。
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.database import SessionLocal
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def cleanup_conversation_sessions(stop_event: threading.Event) -> int:
+    """清理超过保留期的问答会话，返回清理数量"""
+    from app.utils.conversation_manager import conversation_manager
+
+    db = SessionLocal()
+    try:
+        return conversation_manager.cleanup_old_sessions(
+            days_old=Config.SESSION_RETENTION_DAYS, db=db, stop_event=stop_event
+        )
+    finally:
+        db.close()
+
+
+def cleanup_processing_tasks(stop_event: threading.Event) -> int:
+    """清理异步处理器中的旧任务记录，返回清理数量（一次完成，不需要响应停止信号）"""
+    # 延迟导入，避免启动时加载文献处理的全部依赖
+    from app.utils.async_processor import async_processor
+
+    return async_processor.cleanup_old_tasks(max_age_hours=Config.TASK_RETENTION_HOURS)
+
+
+class MaintenanceScheduler:
+    """周期性维护任务调度器"""
+
+    def __init__(self):
+        self.interval = Config.MAINTENANCE_INTERVAL
+        self.initial_delay = Config.MAINTENANCE_INITIAL_DELAY
+        self._tasks: List[Tuple[str, Callable[[threading.Event], int]]] = []
+        self._metrics: Dict[str, Dict] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, func: Callable[[threading.Event], int]):
+        """
+        注册维护任务
+
+        Args:
+            name: 任务名称
+            func: 任务函数，参数为停止信号（分批执行的任务应在批次之间检查），返回本次清理的记录数
+        """
+        self._tasks.append((name, func))
+        self._metrics[name] = {
+            "runs": 0,
+            "failures": 0,
+            "total_removed": 0,
+            "last_run_at": None,
+            "last_duration": None,
+            "last_removed": None,
+            "last_error": None
+        }
+
+    def start(self):
+        """启动维护线程（应用启动时调用）"""
+        if not Config.MAINTENANCE_ENABLED or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="maintenance-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"定期维护已启动，间隔 {self.interval} 秒")
+
+    def stop(self, timeout: float = 10.0):
+        """停止维护线程，正在执行的任务会在当前批次结束后退出"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        """维护线程主循环"""
+        if self._stop_event.wait(self.initial_delay):
+            return
+        while True:
+            self.run_once()
+            if self._stop_event.wait(self.interval):
+                return
+
+    def run_once(self) -> Dict[str, Dict]:
+        """
+        依次执行全部维护任务，单个任务失败不影响其他任务
+
+        Returns:
+            Dict[str, Dict]: 每个任务的运行统计
+        """
+        for name, func in self._tasks:
+            if self._stop_event.is_set():
+                break
+            started = time.monotonic()
+            removed, error = None, None
+            try:
+                removed = func(self._stop_event) or 0
+            except Exception as e:
+                error = str(e)
+                logger.error(f"维护任务 {name} 执行失败: {e}")
+
+            with self._lock:
+                metrics = self._metrics[name]
+                metrics["runs"] += 1
+                metrics["last_run_at"] = datetime.now().isoformat()
+                metrics["last_duration"] = round(time.monotonic() - started, 3)
+                metrics["last_removed"] = removed
+                metrics["last_error"] = error
+                if error is None:
+                    metrics["total_removed"] += removed
+                else:
+                    metrics["failures"] += 1
+        return self.get_stats()["tasks"]
+
+    def get_stats(self) -> Dict:
+        """获取维护任务运行统计"""
+        with self._lock:
+            return {
+                "enabled": Config.MAINTENANCE_ENABLED,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "interval": self.interval,
+                "tasks": {name: dict(metrics) for name, metrics in self._metrics.items()}
+            }
+
+
+# 创建全局实例
+maintenance_scheduler = MaintenanceScheduler()
+maintenance_scheduler.register("conversation_sessions", cleanup_conversation_sessions)
+maintenance_scheduler.register("processing_tasks", cleanup_processing_tasks)
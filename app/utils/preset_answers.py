@@ -0,0 +1,221 @@
+"""
+预设问题答案预生成模块
+文献入库完成后，在后台以低优先级、限速的方式回答预设问题并持久化，
+用户首次点击预设问题时直接返回已生成的答案
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.config import settings
+from app.database import SessionLocal, engine
+from app.models.preset_answer import PresetAnswer
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def _to_json_compatible(answer: Dict) -> Dict:
+    """将答案中的numpy数值等转换为JSON可存储的类型"""
+    return json.loads(json.dumps(
+        answer,
+        ensure_ascii=False,
+        default=lambda value: value.item() if hasattr(value, "item") else str(value)
+    ))
+
+
+class PresetAnswerStore:
+    """基于数据库的预设问题答案存储"""
+
+    def __init__(self):
+        self._ensure_table()
+
+    def _ensure_table(self):
+        """确保答案表存在（项目未使用迁移工具，按需建表）"""
+        try:
+            PresetAnswer.__table__.create(bind=engine, checkfirst=True)
+        except Exception as e:
+            logger.error(f"创建预设答案表失败: {e}")
+
+    def get(self, literature_id: str, question: str) -> Optional[Dict]:
+        """
+        获取预设问题的答案
+
+        Args:
+            literature_id: 文献ID
+            question: 预设问题
+
+        Returns:
+            Optional[Dict]: 答案（与 process_question 返回结构相同），不存在时返回None
+        """
+        db = SessionLocal()
+        try:
+            record = db.query(PresetAnswer).filter(
+                PresetAnswer.literature_id == literature_id,
+                PresetAnswer.question == question
+            ).first()
+            return dict(record.answer) if record else None
+        except Exception as e:
+            logger.warning(f"读取预设答案失败 {literature_id}: {e}")
+            return None
+        finally:
+            db.close()
+
+    def save(self, literature_id: str, question: str, answer: Dict, model_name: str = "") -> bool:
+        """保存（覆盖）预设问题的答案"""
+        db = SessionLocal()
+        try:
+            db.merge(PresetAnswer(
+                literature_id=literature_id,
+                question=question,
+                answer=_to_json_compatible(answer),
+                model_name=model_name,
+                created_at=datetime.now()
+            ))
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"保存预设答案失败 {literature_id}: {e}")
+            return False
+        finally:
+            db.close()
+
+    def delete_literature(self, literature_id: str) -> int:
+        """删除文献的全部预设答案（文献重新处理时调用），返回删除数量"""
+        db = SessionLocal()
+        try:
+            deleted = db.query(PresetAnswer).filter(
+                PresetAnswer.literature_id == literature_id
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"删除预设答案失败 {literature_id}: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def count(self, literature_id: str) -> int:
+        """文献已生成的预设答案数量"""
+        db = SessionLocal()
+        try:
+            return db.query(PresetAnswer).filter(PresetAnswer.literature_id == literature_id).count()
+        finally:
+            db.close()
+
+
+class PresetAnswerPrecomputer:
+    """
+    预设答案后台生成器
+
+    在应用的事件循环中以单个后台任务依次处理（生成服务的异步客户端绑定在该事件循环上），
+    每次生成之间按配置间隔限速，生成服务熔断时放弃本篇文献，不与在线问答争抢配额。
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "answered": 0, "failed": 0, "skipped": 0}
+
+    def start(self):
+        """在当前事件循环中启动后台任务（应用启动时调用）"""
+        if not settings.PRESET_PRECOMPUTE_ENABLED or self._worker is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._worker = self._loop.create_task(self._run())
+        logger.info("预设答案后台生成已启动")
+
+    def submit(self, literature_id: str, group_id: str, literature_title: str = "") -> bool:
+        """
+        提交文献的预设答案生成任务（可在入库工作线程中调用）
+
+        Args:
+            literature_id: 文献ID
+            group_id: 研究组ID
+            literature_title: 文献标题
+
+        Returns:
+            bool: 是否已加入队列（未启动或同一文献已在队列中时返回False）
+        """
+        if self._loop is None:
+            return False
+        with self._lock:
+            if literature_id in self._pending:
+                return False
+            self._pending.add(literature_id)
+        self.stats["submitted"] += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (literature_id, group_id, literature_title))
+        return True
+
+    async def _run(self):
+        """后台任务主循环"""
+        while True:
+            literature_id, group_id, literature_title = await self._queue.get()
+            try:
+                await self._precompute(literature_id, group_id, literature_title)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"预设答案生成失败 {literature_id}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(literature_id)
+
+    async def _precompute(self, literature_id: str, group_id: str, literature_title: str):
+        """依次回答文献的预设问题并保存"""
+        # 延迟导入，避免与 rag_service 循环导入
+        from app.utils.rag_service import rag_service
+
+        questions = rag_service.get_preset_questions(literature_id, literature_title)
+        answered = 0
+        for question in questions[:settings.PRESET_PRECOMPUTE_QUESTIONS]:
+            if await asyncio.to_thread(preset_answer_store.get, literature_id, question) is not None:
+                continue
+
+            # 限速：为在线问答让出生成服务的配额
+            await asyncio.sleep(settings.PRESET_PRECOMPUTE_INTERVAL)
+            if not rag_service.llm.can_generate():
+                logger.warning(f"生成服务不可用，跳过文献 {literature_id} 的预设答案生成")
+                self.stats["skipped"] += 1
+                return
+
+            answer = await rag_service.process_question(question, literature_id, group_id)
+            # 问题向量只用于对话历史，不随预设答案保存
+            answer.pop("question_embedding", None)
+            metadata = answer.get("metadata", {})
+            # 只保存生成服务给出的正常答案，抽取式和错误答案留给在线请求重新生成
+            if metadata.get("is_fallback") or metadata.get("answer_mode", "generative") != "generative":
+                self.stats["failed"] += 1
+                continue
+
+            if await asyncio.to_thread(
+                preset_answer_store.save, literature_id, question, answer, rag_service.model_name
+            ):
+                answered += 1
+                self.stats["answered"] += 1
+
+        logger.info(f"文献 {literature_id} 预设答案生成完成: {answered} 个")
+
+    def get_stats(self) -> Dict:
+        """获取后台生成统计"""
+        return {
+            "enabled": settings.PRESET_PRECOMPUTE_ENABLED,
+            "running": self._worker is not None and not self._worker.done(),
+            "queued": len(self._pending),
+            **self.stats
+        }
+
+
+# 创建全局实例
+preset_answer_store = PresetAnswerStore()
+preset_precomputer = PresetAnswerPrecomputer()
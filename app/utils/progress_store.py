@@ -0,0 +1,145 @@
+"""
+文献处理进度存储模块
+将处理阶段写入数据库，供SSE推送和其他工作进程读取
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import inspect, text
+
+from app.database import SessionLocal, engine
+from app.models.ingestion import IngestionProgress
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 处理阶段
+STAGE_QUEUED = "queued"
+STAGE_EXTRACTING = "extracting"
+STAGE_CHUNKING = "chunking"
+STAGE_EMBEDDING = "embedding"
+STAGE_STORING = "storing"
+STAGE_DONE = "done"
+STAGE_FAILED = "failed"
+STAGE_CANCELLED = "cancelled"
+
+TERMINAL_STAGES = {STAGE_DONE, STAGE_FAILED, STAGE_CANCELLED}
+
+
+class ProgressStore:
+    """基于数据库的处理进度存储"""
+
+    def __init__(self):
+        self._ensure_table()
+
+    def _ensure_table(self):
+        """确保进度表存在（项目未使用迁移工具，按需建表并补齐新增列）"""
+        try:
+            table = IngestionProgress.__table__
+            table.create(bind=engine, checkfirst=True)
+
+            existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+            with engine.begin() as conn:
+                for column in table.columns:
+                    if column.name not in existing:
+                        column_type = column.type.compile(dialect=engine.dialect)
+                        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                        logger.info(f"处理进度表新增列: {column.name}")
+        except Exception as e:
+            logger.error(f"创建处理进度表失败: {e}")
+
+    def update(
+        self,
+        literature_id: str,
+        stage: str,
+        progress: int,
+        message: str = "",
+        current: Optional[int] = None,
+        total: Optional[int] = None,
+        task_id: Optional[str] = None,
+        batch_id: Optional[str] = None,
+        error_type: Optional[str] = None
+    ) -> None:
+        """
+        写入文献的最新处理阶段
+
+        Args:
+            literature_id: 文献ID
+            stage: 处理阶段
+            progress: 进度百分比
+            message: 进度说明
+            current: 阶段内已完成数量
+            total: 阶段内总数量
+            task_id: 任务ID（为空时保留原值）
+            batch_id: 批次ID（为空时保留原值）
+            error_type: 失败原因分类
+        """
+        db = SessionLocal()
+        try:
+            record = db.query(IngestionProgress).filter(
+                IngestionProgress.literature_id == literature_id
+            ).first()
+            if not record:
+                record = IngestionProgress(literature_id=literature_id)
+                db.add(record)
+
+            record.stage = stage
+            record.progress = progress
+            record.message = message
+            record.current = current
+            record.total = total
+            record.error_type = error_type
+            record.updated_at = datetime.now()
+            if task_id:
+                record.task_id = task_id
+            if batch_id:
+                record.batch_id = batch_id
+
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # 进度写入失败不应影响文献处理本身
+            logger.warning(f"写入处理进度失败 {literature_id}: {e}")
+        finally:
+            db.close()
+
+    def get(self, literature_id: str) -> Optional[Dict]:
+        """获取单篇文献的处理进度"""
+        db = SessionLocal()
+        try:
+            record = db.query(IngestionProgress).filter(
+                IngestionProgress.literature_id == literature_id
+            ).first()
+            return record.to_dict() if record else None
+        finally:
+            db.close()
+
+    def get_many(self, literature_ids: List[str]) -> List[Dict]:
+        """批量获取多篇文献的处理进度"""
+        if not literature_ids:
+            return []
+        db = SessionLocal()
+        try:
+            records = db.query(IngestionProgress).filter(
+                IngestionProgress.literature_id.in_(literature_ids)
+            ).all()
+            return [record.to_dict() for record in records]
+        finally:
+            db.close()
+
+    def get_batch(self, batch_id: str) -> List[Dict]:
+        """获取批次内所有文献的处理进度"""
+        db = SessionLocal()
+        try:
+            records = db.query(IngestionProgress).filter(
+                IngestionProgress.batch_id == batch_id
+            ).all()
+            return [record.to_dict() for record in records]
+        finally:
+            db.close()
+
+
+# 创建全局进度存储实例
+progress_store = ProgressStore()
@@ -4,7 +4,7 @@ RAG问答系统提示词构建器
 负责构建高质量的提示词模板，确保AI返回准确、有引用的答案
 基于最新学术助手prompt工程最佳实践设计
 """
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import json
 import re
 from app.config import Config
@@ -13,12 +13,24 @@ import logging
 # 获取一个logger实例
 logger = logging.getLogger(__name__)
 
+# token估算使用的正则
+_CHINESE_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+_ENGLISH_WORD_PATTERN = re.compile(r'\b[a-zA-Z0-9]+\b')
+_SPECIAL_CHAR_PATTERN = re.compile(r'[^\w\s\u4e00-\u9fff]')
+
 # 假设您有一个全局的日志配置，如果没有，您可能需要在这里配置
 # logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 class PromptBuilder:
     """提示词构建器类 - 基于学术助手最佳实践"""
     
+    # 上下文和对话历史的固定框架文本
+    CONTEXT_HEADER = "## 📚 相关文献内容"
+    CONTEXT_INTRO = "\n以下是与您的问题相关的文献片段，请基于这些内容进行回答：\n"
+    CONTEXT_SEPARATOR = "---"
+    HISTORY_HEADER = "## 💬 对话历史"
+    HISTORY_INTRO = "\n以下是您与我之前的对话，供参考：\n"
+    
     def __init__(self):
         """初始化提示词构建器"""
         self.max_context_tokens = Config.RAG_MAX_CONTEXT_TOKENS
@@ -114,31 +126,58 @@ class PromptBuilder:
 - 适当时指出研究的方法论或样本限制
 """
 
+        # 静态模板的token开销只需计算一次，构建提示词时直接从预算中扣除
+        self._template_tokens = self._token_weight(self.system_role) + self._token_weight(self.output_format)
+
     def build_qa_prompt(
         self, 
         question: str, 
         context_chunks: List[Dict], 
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        show_literature_title: bool = False
     ) -> str:
         """
         构建基于最佳实践的问答提示词
         
+        先按token预算挑选文档块和对话历史，再一次性拼接，不再事后压缩。
+        
         Args:
             question: 用户问题
-            context_chunks: 相关文档块列表
+            context_chunks: 相关文档块列表（按相关度排序）
             conversation_history: 对话历史（可选）
+            show_literature_title: 是否在来源中标注文献标题（跨文献问答时使用）
             
         Returns:
             str: 完整的提示词
         """
         logger.debug(f"Building QA prompt for question: {question}")
-        logger.debug(f"Received context_chunks: {context_chunks}")
-        logger.debug(f"Received conversation_history: {conversation_history}")
-
-        # 构建各个部分
-        context_section = self._build_enhanced_context_section(context_chunks)
-        history_section = self._format_conversation_history(conversation_history) if conversation_history else ""
+        
         question_section = self._format_question_section(question)
+        context_blocks = self._render_context_blocks(context_chunks, show_literature_title)
+        history_turns = self._render_history_turns(conversation_history) if conversation_history else []
+        
+        # 扣除静态模板、问题和上下文框架后的剩余预算
+        usage_note = self._context_usage_note(show_literature_title)
+        budget = (
+            self.max_context_tokens
+            - self._template_tokens
+            - self._token_weight(question_section)
+            - self._token_weight(self.CONTEXT_HEADER)
+            - self._token_weight(self.CONTEXT_INTRO)
+            - self._token_weight(usage_note)
+        )
+        selected_blocks, selected_turns = self._pack_by_budget(context_blocks, history_turns, budget)
+        
+        if len(selected_blocks) < len(context_blocks) or len(selected_turns) < len(history_turns):
+            logger.info(
+                f"按token预算选取上下文: 文档块 {len(selected_blocks)}/{len(context_blocks)}, "
+                f"对话 {len(selected_turns)}/{len(history_turns)}"
+            )
+        
+        context_section = self._assemble_context_section(selected_blocks, usage_note, bool(context_blocks))
+        history_section = ""
+        if selected_turns:
+            history_section = "\n".join([self.HISTORY_HEADER, self.HISTORY_INTRO] + selected_turns)
         
         # 组装完整提示词
         prompt_parts = [
@@ -156,66 +195,154 @@ class PromptBuilder:
         # 过滤空部分并连接
         prompt = "\n".join(part for part in prompt_parts if part.strip())
         
-        logger.debug(f"Initial assembled prompt (before optimization):\n{prompt}")
-        
-        # 优化长度
-        prompt = self._optimize_prompt_length(prompt)
-        
-        logger.info(f"Final QA prompt:\n{prompt}")
+        logger.debug(f"Final QA prompt:\n{prompt}")
         return prompt
 
-    def _build_enhanced_context_section(self, context_chunks: List[Dict]) -> str:
+    def _render_context_blocks(self, context_chunks: List[Dict], show_literature_title: bool = False) -> List[Tuple[str, float]]:
         """
-        构建增强的上下文部分 - 基于学术助手最佳实践
+        将文档块渲染为提示词中的来源片段，并计算每个片段的token开销
+        
+        来源编号与文档块在 context_chunks 中的位置一致，
+        预算不足时跳过的片段不会打乱其余来源的编号。
         
         Args:
             context_chunks: 文档块列表
+            show_literature_title: 是否标注来源所属文献
             
         Returns:
-            str: 格式化的上下文部分
+            List[Tuple[str, float]]: (来源片段, token开销)，顺序与输入一致
         """
-        if not context_chunks:
-            logger.warning("No context chunks provided for prompt building.")
-            return "## 📚 相关文献内容\n⚠️ 暂无相关文献内容可供参考"
+        blocks = []
+        for i, chunk in enumerate(context_chunks or [], 1):
+            text = chunk.get('text', '').strip()
+            if not text:
+                logger.warning(f"Empty text in chunk (source {i}, index {chunk.get('chunk_index', 'N/A')}). Skipping.")
+                continue
+            
+            # 增强的格式化文档块
+            chunk_header = f"### 【来源{i}】"
+            metadata = (
+                f"**相关度**：{chunk.get('similarity', 0):.3f} | "
+                f"**页码**：{chunk.get('page_number', '未知')} | **章节**：{chunk.get('section', '未指定')}"
+            )
+            if show_literature_title:
+                metadata = f"**文献**：《{chunk.get('literature_title') or '未命名文献'}》 | {metadata}"
+            
+            # 清理文本并按 MAX_CHUNK_LENGTH_FOR_PROMPT 截断
+            chunk_content = self._clean_and_enhance_text(text)
+            quality_indicator = f"**内容质量**：{self._assess_content_quality(chunk_content)}"
+            
+            block = f"{chunk_header}\n{metadata} | {quality_indicator}\n\n{chunk_content}\n"
+            blocks.append((block, self._token_weight(block)))
+        return blocks
+
+    def _render_history_turns(self, history: List[Dict]) -> List[str]:
+        """
+        将最近几轮对话渲染为提示词中的对话条目
+        
+        Args:
+            history: 对话历史列表
+            
+        Returns:
+            List[str]: 对话条目（按时间顺序，每条末尾带空行分隔）
+        """
+        # 只保留最近几轮对话，避免过长
+        recent_history = history[-Config.RAG_CONVERSATION_MAX_TURNS:]
         
-        context_parts = ["## 📚 相关文献内容"]
-        context_parts.append("\n以下是与您的问题相关的文献片段，请基于这些内容进行回答：\n")
+        turns = []
+        for i, turn in enumerate(recent_history, 1):
+            role = turn.get('role', 'unknown')
+            content = turn.get('content', '').strip()
+            if not content:
+                continue
+            if role == 'user':
+                turns.append(f"**👤 您的问题 {i}**：{content}\n")
+            elif role == 'assistant':
+                # 简化AI回答，只保留核心内容
+                turns.append(f"**🤖 我的回答 {i}**：{self._simplify_ai_response(content)}\n")
+        return turns
+
+    def _pack_by_budget(
+        self,
+        context_blocks: List[Tuple[str, float]],
+        history_turns: List[str],
+        budget: float
+    ) -> Tuple[List[str], List[str]]:
+        """
+        在token预算内贪心选取来源片段和对话条目
         
-        logger.debug(f"Building context section with {len(context_chunks)} chunks.")
+        优先级：最相关的来源片段 > 最近的对话 > 其余来源片段（按相关度，放不下的跳过）。
         
-        for i, chunk in enumerate(context_chunks, 1):
-            text = chunk.get('text', '').strip()
-            similarity = chunk.get('similarity', 0)
-            chunk_index = chunk.get('chunk_index', 'N/A')
-            page_number = chunk.get('page_number', '未知')
-            section = chunk.get('section', '未指定')
+        Args:
+            context_blocks: (来源片段, token开销)，按相关度排序
+            history_turns: 对话条目，按时间顺序
+            budget: 可用token数
             
-            if text:
-                # 增强的格式化文档块
-                chunk_header = f"### 【来源{i}】"
-                metadata = f"**相关度**：{similarity:.3f} | **页码**：{page_number} | **章节**：{section}"
-                
-                logger.debug(f"Original chunk text (source {i}, index {chunk_index}):\n{text}")
-                chunk_content = self._clean_and_enhance_text(text)
-                logger.debug(f"Enhanced chunk text (source {i}, index {chunk_index}):\n{chunk_content}")
-                
-                # 增加内容质量指示
-                content_quality = self._assess_content_quality(chunk_content)
-                quality_indicator = f"**内容质量**：{content_quality}"
-                
-                context_parts.append(f"{chunk_header}\n{metadata} | {quality_indicator}\n\n{chunk_content}\n")
-                context_parts.append("---")  # 分隔线
-            else:
-                logger.warning(f"Empty text in chunk (source {i}, index {chunk_index}). Skipping.")
+        Returns:
+            Tuple[List[str], List[str]]: (选中的来源片段, 选中的对话条目)，均保持原有顺序
+        """
+        separator_cost = self._token_weight(self.CONTEXT_SEPARATOR)
+        remaining = budget
+        chosen_blocks = set()
+        
+        def take_block(index: int) -> None:
+            nonlocal remaining
+            cost = context_blocks[index][1] + (separator_cost if chosen_blocks else 0)
+            if cost <= remaining:
+                chosen_blocks.add(index)
+                remaining -= cost
+        
+        if context_blocks:
+            take_block(0)
+        
+        # 对话历史从最近一轮开始选取，标题只在至少选中一条时计入
+        chosen_turns = []
+        history_header_cost = self._token_weight(self.HISTORY_HEADER) + self._token_weight(self.HISTORY_INTRO)
+        for turn in reversed(history_turns):
+            cost = self._token_weight(turn) + (0 if chosen_turns else history_header_cost)
+            if cost > remaining:
+                break
+            chosen_turns.append(turn)
+            remaining -= cost
+        chosen_turns.reverse()
         
-        # 移除最后一个分隔线
-        if context_parts and context_parts[-1] == "---":
-            context_parts.pop()
+        for index in range(1, len(context_blocks)):
+            take_block(index)
         
-        # 添加使用说明
+        return [context_blocks[i][0] for i in sorted(chosen_blocks)], chosen_turns
+
+    def _context_usage_note(self, show_literature_title: bool) -> str:
+        """构建上下文末尾的使用说明"""
         usage_note = "\n💡 **使用说明**：回答问题时，请引用对应的【来源X】编号来标注信息来源。"
-        context_parts.append(usage_note)
+        if show_literature_title:
+            usage_note += "以上片段来自多篇文献，请在回答中指明信息出自哪篇文献。"
+        return usage_note
+
+    def _assemble_context_section(self, blocks: List[str], usage_note: str, had_context: bool) -> str:
+        """
+        拼接上下文部分
+        
+        Args:
+            blocks: 选中的来源片段
+            usage_note: 使用说明
+            had_context: 检索阶段是否有可用的文档块
+            
+        Returns:
+            str: 格式化的上下文部分
+        """
+        if not had_context:
+            logger.warning("No context chunks provided for prompt building.")
+            return f"{self.CONTEXT_HEADER}\n⚠️ 暂无相关文献内容可供参考"
+        if not blocks:
+            logger.error("Not enough tokens for context after reserving for other parts")
+            return f"{self.CONTEXT_HEADER}\n⚠️ 上下文内容因长度限制已被移除"
         
+        context_parts = [self.CONTEXT_HEADER, self.CONTEXT_INTRO]
+        for block in blocks:
+            context_parts.append(block)
+            context_parts.append(self.CONTEXT_SEPARATOR)  # 分隔线
+        context_parts.pop()  # 移除最后一个分隔线
+        context_parts.append(usage_note)
         return "\n".join(context_parts)
 
     def _format_question_section(self, question: str) -> str:
@@ -349,42 +476,6 @@ class PromptBuilder:
         
         return cleaned_text
 
-    def _format_conversation_history(self, history: List[Dict]) -> str:
-        """
-        格式化对话历史 - 增强版
-        
-        Args:
-            history: 对话历史列表
-            
-        Returns:
-            str: 格式化的对话历史
-        """
-        if not history:
-            return ""
-        
-        history_parts = ["## 💬 对话历史"]
-        history_parts.append("\n以下是您与我之前的对话，供参考：\n")
-        
-        # 只保留最近几轮对话，避免过长
-        recent_history = history[-Config.RAG_CONVERSATION_MAX_TURNS:]
-        logger.debug(f"Formatting {len(recent_history)} turns of conversation history.")
-        
-        for i, turn in enumerate(recent_history, 1):
-            role = turn.get('role', 'unknown')
-            content = turn.get('content', '').strip()
-            
-            if content:
-                if role == 'user':
-                    history_parts.append(f"**👤 您的问题 {i}**：{content}")
-                elif role == 'assistant':
-                    # 简化AI回答，只保留核心内容
-                    simplified_content = self._simplify_ai_response(content)
-                    history_parts.append(f"**🤖 我的回答 {i}**：{simplified_content}")
-                    
-                history_parts.append("")  # 空行分隔
-        
-        return "\n".join(history_parts)
-
     def _simplify_ai_response(self, response: str) -> str:
         """
         简化AI回答，提取关键信息 - 增强版
@@ -429,123 +520,42 @@ class PromptBuilder:
         
         return simplified
 
-    def _optimize_prompt_length(self, prompt: str) -> str:
-        """
-        优化提示词长度，确保不超过token限制
-        
-        Args:
-            prompt: 原始提示词
-            
-        Returns:
-            str: 优化后的提示词
-        """
-        estimated_tokens = self._estimate_tokens(prompt)
-        logger.debug(f"Estimated tokens for prompt: {estimated_tokens}. Max allowed context tokens: {self.max_context_tokens}")
-
-        if estimated_tokens <= self.max_context_tokens:
-            return prompt
-        
-        logger.warning(f"Prompt is too long ({estimated_tokens} tokens). Attempting to compress.")
-        # 如果超长，需要压缩上下文部分
-        compressed_prompt = self._compress_prompt(prompt, estimated_tokens)
-        final_estimated_tokens = self._estimate_tokens(compressed_prompt)
-        logger.info(f"Compressed prompt. Original tokens: {estimated_tokens}, New tokens: {final_estimated_tokens}")
-        return compressed_prompt
-
-    def _estimate_tokens(self, text: str) -> int:
+    def _token_weight(self, text: str) -> float:
         """
-        估算文本的token数量 - 改进版
+        估算文本的token开销（不取整，便于各部分累加后与整体估算一致）
         
         Args:
             text: 输入文本
             
         Returns:
-            int: 估算的token数量
+            float: 估算的token数量
         """
         # 中文字符数
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
+        chinese_chars = len(_CHINESE_CHAR_PATTERN.findall(text))
         
         # 英文单词数
-        english_words = len(re.findall(r'\b[a-zA-Z0-9]+\b', text))
+        english_words = len(_ENGLISH_WORD_PATTERN.findall(text))
         
         # 特殊符号和标点
-        special_chars = len(re.findall(r'[^\w\s\u4e00-\u9fff]', text))
+        special_chars = len(_SPECIAL_CHAR_PATTERN.findall(text))
         
         # 基于实际经验的token估算
         # 中文：1.3个字符≈1个token
         # 英文：4个字符≈1个token
         # 符号：按0.5计算
-        estimated_tokens = int(chinese_chars * 1.3 + english_words * 1.0 + special_chars * 0.5)
-        
-        return estimated_tokens
+        return chinese_chars * 1.3 + english_words * 1.0 + special_chars * 0.5
 
-    def _compress_prompt(self, prompt: str, current_tokens: int) -> str:
+    def _estimate_tokens(self, text: str) -> int:
         """
-        压缩提示词，主要通过截断上下文来实现
+        估算文本的token数量 - 改进版
         
         Args:
-            prompt: 原始提示词
-            current_tokens: 当前估算的token数量
+            text: 输入文本
             
         Returns:
-            str: 压缩后的提示词
+            int: 估算的token数量
         """
-        # 分解提示词的各个部分
-        parts = prompt.split("\n\n")
-        
-        # 找到文献内容部分
-        context_start = -1
-        context_end = -1
-        for i, part in enumerate(parts):
-            if "📚 相关文献内容" in part:
-                context_start = i
-            elif context_start != -1 and ("🤔 用户问题" in part or "💬 对话历史" in part or "重要指示" in part):
-                context_end = i
-                break
-        
-        if context_start == -1:
-            logger.error("Could not find context section to compress")
-            return prompt
-        
-        if context_end == -1:
-            context_end = len(parts)
-        
-        # 计算非上下文部分的token
-        non_context_parts = parts[:context_start] + parts[context_end:]
-        non_context_text = "\n\n".join(non_context_parts)
-        non_context_tokens = self._estimate_tokens(non_context_text)
-        
-        # 计算上下文部分允许的最大token
-        allowed_context_tokens = self.max_context_tokens - non_context_tokens - 200  # 留200token缓冲
-        
-        if allowed_context_tokens <= 0:
-            logger.error("Not enough tokens for context after reserving for other parts")
-            return "\n\n".join(parts[:context_start] + ["## 📚 相关文献内容\n⚠️ 上下文内容因长度限制已被移除"] + parts[context_end:])
-        
-        # 压缩上下文部分
-        context_parts = parts[context_start:context_end]
-        context_text = "\n\n".join(context_parts)
-        
-        # 按来源逐个添加，直到达到token限制
-        compressed_context = parts[context_start]  # 保留标题
-        current_context_tokens = self._estimate_tokens(compressed_context)
-        
-        # 提取各个来源
-        source_pattern = r'### 【来源\d+】.*?(?=### 【来源\d+】|---|\n\n💡|$)'
-        sources = re.findall(source_pattern, context_text, re.DOTALL)
-        
-        for source in sources:
-            source_tokens = self._estimate_tokens(source)
-            if current_context_tokens + source_tokens <= allowed_context_tokens:
-                compressed_context += "\n\n" + source
-                current_context_tokens += source_tokens
-            else:
-                logger.info(f"Context truncation: Stopped adding sources. Used {current_context_tokens} of {allowed_context_tokens} allowed tokens")
-                break
-        
-        # 重新组装提示词
-        final_parts = parts[:context_start] + [compressed_context] + parts[context_end:]
-        return "\n\n".join(final_parts)
+        return int(self._token_weight(text))
 
     def build_preset_questions_prompt(self, literature_title: str, literature_summary: str = "") -> List[str]:
         """
@@ -5,23 +5,28 @@ RAG问答系统核心服务
 """
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, AsyncIterator
 from datetime import datetime
 import traceback
 import re
+import numpy as np
 
 # 导入相关组件
 from app.utils.embedding_service import embedding_service
 from app.utils.vector_store import vector_store
+from app.utils.text_processor import evaluate_chunk_quality
+from app.utils.extractive_answer import build_extractive_answer
+from app.utils.preset_answers import preset_answer_store, preset_precomputer
+from app.utils.conversation_manager import conversation_manager
 from app.utils.prompt_builder import PromptBuilder
-from app.utils.answer_processor import AnswerProcessor
+from app.utils.answer_processor import AnswerProcessor, StreamingAnswerParser
 from app.utils.cache_manager import cache_manager
+from app.utils.hierarchical_embeddings import LEVEL_TITLE, LEVEL_SECTION
+from app.utils.stage_executors import run_in_stage, get_stage_stats, STAGE_VECTOR, STAGE_CPU
+from app.utils.llm_providers import llm_router
+from app.utils.resilience import Deadline, DeadlineExceededError
 from app.config import Config
 
-# Google AI 相关导入
-from google import genai
-from google.genai import types
-
 class RAGService:
     """RAG问答系统核心服务类"""
     
@@ -32,6 +37,9 @@ class RAGService:
         self.prompt_builder = PromptBuilder()
         self.answer_processor = AnswerProcessor()
         
+        # 预设问题与文献标题无关的部分，用于快速判断是否可能有预生成答案
+        self.preset_questions = set(self.prompt_builder.build_preset_questions_prompt(""))
+        
         # 配置参数
         self.max_context_tokens = Config.RAG_MAX_CONTEXT_TOKENS
         self.top_k_retrieval = Config.RAG_TOP_K_RETRIEVAL
@@ -40,30 +48,62 @@ class RAGService:
         # 配置日志
         self.logger = logging.getLogger(__name__)
         
-        # 初始化Google AI
-        self._init_google_ai()
+        # 生成服务按配置的提供商顺序调用，失败时自动回退
+        self.llm = llm_router
+        self.model_name = self.llm.model_name
 
-    def _init_google_ai(self):
-        """初始化Google AI服务"""
+    async def process_question(
+        self,
+        question: str,
+        literature_id: str,
+        group_id: str,
+        session_id: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        top_k: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        处理用户问题的完整RAG流程（带缓存支持）
+        
+        Args:
+            question: 用户问题
+            literature_id: 文献ID
+            group_id: 研究组ID
+            session_id: 会话ID（可选）
+            conversation_history: 对话历史（可选）
+            top_k: 检索数量（可选）
+            
+        Returns:
+            Dict: 处理结果
+        """
+        start_time = datetime.now()
+        deadline = Deadline(Config.RAG_REQUEST_DEADLINE)
+        
         try:
-            # 检查API密钥
-            if not Config.GOOGLE_API_KEY:
-                self.logger.error("Google API密钥未配置")
-                self.client = None
-                return
+            self.logger.info(f"开始处理问题: {question[:50]}... (文献ID: {literature_id})")
             
-            # 创建Google GenAI客户端
-            self.client = genai.Client(api_key=Config.GOOGLE_API_KEY)
+            # 1-5. 预处理、检索、缓存检查和提示词构建
+            early_response, prepared = await self._prepare_answer_context(
+                question, literature_id, group_id, conversation_history, top_k, start_time, deadline
+            )
+            if early_response is not None:
+                return early_response
             
-            # 使用最新的模型
-            self.model_name = Config.GEMINI_MODEL  # gemini-2.0-flash-exp
+            # 6-9. 生成答案、处理并缓存
+            processed_answer = await self._answer_prepared(
+                question, prepared, literature_id, group_id, session_id, start_time, deadline
+            )
+            
+            self.logger.info(f"问题处理完成，耗时: {processed_answer['metadata']['processing_time']:.2f}秒")
+            return processed_answer
             
-            self.logger.info(f"Google AI服务初始化成功，使用模型: {self.model_name}")
+        except DeadlineExceededError as e:
+            self.logger.warning(f"问题处理超时: {e.message}")
+            return self._create_error_response("timeout", question)
         except Exception as e:
-            self.logger.error(f"Google AI服务初始化失败: {str(e)}")
-            self.client = None
+            self.logger.error(f"RAG处理出错: {str(e)}\n{traceback.format_exc()}")
+            return self._create_error_response("system_error", question)
 
-    async def process_question(
+    async def stream_question(
         self,
         question: str,
         literature_id: str,
@@ -71,9 +111,9 @@ class RAGService:
         session_id: Optional[str] = None,
         conversation_history: Optional[List[Dict]] = None,
         top_k: Optional[int] = None
-    ) -> Dict[str, Any]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        处理用户问题的完整RAG流程（带缓存支持）
+        流式处理用户问题，边生成边输出答案片段
         
         Args:
             question: 用户问题
@@ -83,98 +123,709 @@ class RAGService:
             conversation_history: 对话历史（可选）
             top_k: 检索数量（可选）
             
+        Yields:
+            Dict: 事件，type 为 meta（检索完成）、section（进入关键发现/局限性部分）、
+                  delta（答案增量文本）或 result（与 process_question 相同结构的最终结果）
+        """
+        start_time = datetime.now()
+        deadline = Deadline(Config.RAG_REQUEST_DEADLINE)
+        
+        try:
+            self.logger.info(f"开始流式处理问题: {question[:50]}... (文献ID: {literature_id})")
+            
+            early_response, prepared = await self._prepare_answer_context(
+                question, literature_id, group_id, conversation_history, top_k, start_time, deadline
+            )
+            if early_response is not None:
+                yield {"type": "result", "answer": early_response}
+                return
+            validated_question, context_chunks, prompt, question_embedding, vector_version, retrieval_info = prepared
+            
+            yield {
+                "type": "meta",
+                "chunks_retrieved": len(context_chunks),
+                "retrieval_depth": retrieval_info["retrieval_depth"]
+            }
+            
+            # 流式生成答案并增量解析结构（熔断或时间不足时直接使用抽取式答案）
+            raw_answer = ""
+            fallback_reason = self._extractive_reason(deadline)
+            if fallback_reason is None:
+                parser = StreamingAnswerParser()
+                raw_parts = []
+                try:
+                    async for text in self._stream_ai_answer(prompt, deadline):
+                        raw_parts.append(text)
+                        for event in parser.feed(text):
+                            yield event
+                    for event in parser.finish():
+                        yield event
+                except DeadlineExceededError as e:
+                    self.logger.warning(f"流式生成超时: {e.message}")
+                    fallback_reason = "generation_timeout"
+                except Exception as e:
+                    # 已输出部分内容后中断：截断的答案不缓存、不保存
+                    self.logger.error(f"流式生成中断: {e}")
+                    fallback_reason = "generation_failed"
+                raw_answer = "".join(raw_parts)
+                if fallback_reason is None and not raw_answer.strip():
+                    fallback_reason = "generation_failed"
+            
+            # 生成失败时已输出的片段作废，由完整的抽取式答案替代
+            if fallback_reason is not None:
+                extractive_answer = await self._build_extractive_response(
+                    validated_question, context_chunks, literature_id, fallback_reason, start_time,
+                    {"session_id": session_id, "group_id": group_id, "retrieval_depth": retrieval_info["retrieval_depth"]}
+                )
+                if extractive_answer is not None:
+                    extractive_answer["metadata"]["streamed"] = True
+                yield {
+                    "type": "result",
+                    "answer": self._with_question_embedding(
+                        extractive_answer or self._create_error_response("ai_generation_failed", question),
+                        question_embedding
+                    )
+                }
+                return
+            
+            processed_answer = await self._finalize_answer(
+                raw_answer, validated_question, context_chunks, prompt,
+                literature_id, group_id, session_id, start_time,
+                question_embedding, vector_version, retrieval_info
+            )
+            processed_answer["metadata"]["streamed"] = True
+            
+            self.logger.info(f"流式问题处理完成，耗时: {processed_answer['metadata']['processing_time']:.2f}秒")
+            yield {"type": "result", "answer": self._with_question_embedding(processed_answer, question_embedding)}
+            
+        except DeadlineExceededError as e:
+            self.logger.warning(f"流式问题处理超时: {e.message}")
+            yield {"type": "result", "answer": self._create_error_response("timeout", question)}
+        except Exception as e:
+            self.logger.error(f"RAG流式处理出错: {str(e)}\n{traceback.format_exc()}")
+            yield {"type": "result", "answer": self._create_error_response("system_error", question)}
+
+    async def process_question_batch(
+        self,
+        questions: List[str],
+        literature_id: str,
+        group_id: str,
+        session_id: Optional[str] = None,
+        top_k: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        批量回答同一文献的多个问题，按完成顺序逐个返回
+        
+        所有问题的embedding合并为一次接口调用，向量检索合并为一次查询，
+        生成阶段按 max_concurrency 限制并发。批量问题彼此独立，不使用对话历史。
+        
+        Args:
+            questions: 问题列表
+            literature_id: 文献ID
+            group_id: 研究组ID
+            session_id: 会话ID（可选）
+            top_k: 检索数量（可选）
+            max_concurrency: 同时生成的问题数（可选）
+            
+        Yields:
+            Tuple[int, Dict]: (问题在输入中的序号, 与 process_question 相同结构的结果)
+        """
+        start_time = datetime.now()
+        deadline = Deadline(Config.RAG_REQUEST_DEADLINE)
+        top_k = top_k or self.top_k_retrieval
+        vector_version = cache_manager.get_literature_version(literature_id)
+        
+        validated: Dict[int, str] = {}
+        contexts: Dict[int, Tuple[List[Dict], List[float], Dict[str, Any]]] = {}
+        finished = set()
+        
+        self.logger.info(f"开始批量处理 {len(questions)} 个问题 (文献ID: {literature_id})")
+        
+        try:
+            # 1. 预处理；预设答案和检索缓存命中的问题不参与批量embedding
+            for index, question in enumerate(questions):
+                validated_question = self._preprocess_question(question)
+                if not validated_question:
+                    finished.add(index)
+                    yield index, self._create_error_response("invalid_question", question)
+                    continue
+                
+                precomputed_answer = await self._get_precomputed_answer(literature_id, validated_question, start_time)
+                if precomputed_answer is not None:
+                    finished.add(index)
+                    yield index, precomputed_answer
+                    continue
+                
+                validated[index] = validated_question
+                cached_retrieval = cache_manager.get_retrieval(literature_id, validated_question, top_k, vector_version)
+                if cached_retrieval is not None:
+                    context_chunks, question_embedding = cached_retrieval
+                    contexts[index] = (context_chunks, question_embedding, {
+                        "retrieval_depth": 0, "candidates": 0, "widened": False, "reason": "retrieval_cache"
+                    })
+            
+            # 2. 一次接口调用生成其余问题的embedding
+            to_embed = [index for index in validated if index not in contexts]
+            embeddings = []
+            if to_embed:
+                embeddings = await deadline.wait(
+                    self.embedding_service.agenerate_query_embeddings([validated[index] for index in to_embed]),
+                    "embedding"
+                )
+            
+            to_search = []
+            for index, question_embedding in zip(to_embed, embeddings):
+                if not question_embedding:
+                    finished.add(index)
+                    yield index, self._create_error_response("embedding_failed", questions[index])
+                    continue
+                semantic_answer = self._get_semantic_answer(
+                    questions[index], literature_id, question_embedding, vector_version, start_time
+                )
+                if semantic_answer is not None:
+                    finished.add(index)
+                    yield index, semantic_answer
+                    continue
+                to_search.append((index, question_embedding))
+            
+            # 3. 一次向量查询检索所有问题的候选文档块（批量模式使用完整检索深度，不再分轮扩大）
+            if to_search:
+                full_k = max(top_k * 3, 20)
+                results = await deadline.wait(run_in_stage(
+                    STAGE_VECTOR,
+                    self.vector_store.search_similar_chunks_batch,
+                    [question_embedding for _, question_embedding in to_search],
+                    group_id,
+                    literature_id,
+                    full_k
+                ), "retrieval")
+                
+                for (index, question_embedding), chunks in zip(to_search, results):
+                    context_chunks = await run_in_stage(STAGE_CPU, self._rerank_chunks, chunks, top_k)
+                    if not context_chunks:
+                        finished.add(index)
+                        yield index, self._create_error_response("no_relevant_content", questions[index])
+                        continue
+                    cache_manager.set_retrieval(
+                        literature_id, validated[index], top_k, vector_version, context_chunks, question_embedding
+                    )
+                    contexts[index] = (context_chunks, question_embedding, {
+                        "retrieval_depth": full_k, "candidates": len(chunks), "widened": False, "reason": "batch"
+                    })
+            
+            # 4. 有限并发地生成答案，每个问题有独立的截止时间
+            semaphore = asyncio.Semaphore(max_concurrency or Config.RAG_BATCH_MAX_CONCURRENCY)
+            
+            async def answer_one(index: int) -> Tuple[int, Dict[str, Any]]:
+                async with semaphore:
+                    context_chunks, question_embedding, retrieval_info = contexts[index]
+                    try:
+                        cached_answer, prompt = self._build_prompt(
+                            validated[index], literature_id, context_chunks, [], start_time
+                        )
+                        if cached_answer is not None:
+                            return index, cached_answer
+                        prepared = (
+                            validated[index], context_chunks, prompt,
+                            question_embedding, vector_version, retrieval_info
+                        )
+                        return index, await self._answer_prepared(
+                            questions[index], prepared, literature_id, group_id, session_id,
+                            start_time, Deadline(Config.RAG_REQUEST_DEADLINE)
+                        )
+                    except DeadlineExceededError as e:
+                        self.logger.warning(f"批量问题处理超时: {e.message}")
+                        return index, self._create_error_response("timeout", questions[index])
+                    except Exception as e:
+                        self.logger.error(f"批量问题处理出错: {str(e)}\n{traceback.format_exc()}")
+                        return index, self._create_error_response("system_error", questions[index])
+            
+            tasks = [asyncio.ensure_future(answer_one(index)) for index in contexts]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    index, answer = await next_done
+                    finished.add(index)
+                    yield index, answer
+            finally:
+                for task in tasks:
+                    task.cancel()
+            
+            self.logger.info(
+                f"批量问题处理完成: {len(questions)} 个，耗时: {(datetime.now() - start_time).total_seconds():.2f}秒"
+            )
+            
+        except DeadlineExceededError as e:
+            # 共享的embedding或检索阶段超时，其余问题统一返回超时
+            self.logger.warning(f"批量问题处理超时: {e.message}")
+            for index, question in enumerate(questions):
+                if index not in finished:
+                    yield index, self._create_error_response("timeout", question)
+        except Exception as e:
+            self.logger.error(f"批量问题处理出错: {str(e)}\n{traceback.format_exc()}")
+            for index, question in enumerate(questions):
+                if index not in finished:
+                    yield index, self._create_error_response("system_error", question)
+
+    async def process_library_question(
+        self,
+        question: str,
+        group_id: str,
+        top_documents: Optional[int] = None,
+        max_sources: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        跨文献问答：在整个研究组文献库中回答问题
+        
+        两阶段检索：先用文档级向量筛选相关文献，再在筛选出的文献内并行检索文本块。
+        
+        Args:
+            question: 用户问题
+            group_id: 研究组ID
+            top_documents: 第一阶段筛选的文献数（可选）
+            max_sources: 提示词中的来源总数（可选）
+            
         Returns:
-            Dict: 处理结果
+            Dict: 处理结果，额外包含 documents（筛选出的文献列表）
         """
         start_time = datetime.now()
+        deadline = Deadline(Config.RAG_REQUEST_DEADLINE)
+        top_documents = top_documents or Config.RAG_LIBRARY_TOP_DOCUMENTS
+        max_sources = max_sources or Config.RAG_LIBRARY_MAX_SOURCES
         
         try:
-            self.logger.info(f"开始处理问题: {question[:50]}... (文献ID: {literature_id})")
+            self.logger.info(f"开始跨文献问答: {question[:50]}... (研究组: {group_id})")
             
-            # 1. 问题预处理和验证
             validated_question = self._preprocess_question(question)
             if not validated_question:
                 return self._create_error_response("invalid_question", question)
             
-            # 2. 并行执行Embedding生成和历史处理
-            embedding_task = self._generate_question_embedding(validated_question)
-            history_task = self._process_conversation_history(conversation_history)
-            
-            # 等待并行任务完成
-            question_embedding, processed_history = await asyncio.gather(
-                embedding_task, history_task, return_exceptions=True
+            question_embedding = await deadline.wait(
+                self._generate_question_embedding(validated_question), "embedding"
             )
-            
-            # 检查并行任务结果
-            if isinstance(question_embedding, Exception):
-                self.logger.error(f"Embedding生成失败: {str(question_embedding)}")
+            if not question_embedding:
                 return self._create_error_response("embedding_failed", question)
             
-            if isinstance(processed_history, Exception):
-                self.logger.warning(f"历史处理失败: {str(processed_history)}")
-                processed_history = []
+            # 第一阶段：文档级向量和标题/章节向量共同筛选文献
+            documents, section_hits = await deadline.wait(asyncio.gather(
+                run_in_stage(
+                    STAGE_VECTOR,
+                    self.vector_store.search_similar_documents,
+                    question_embedding, group_id, top_documents
+                ),
+                run_in_stage(
+                    STAGE_VECTOR,
+                    self.vector_store.search_hierarchical_vectors,
+                    question_embedding, group_id, Config.RAG_LIBRARY_SECTION_CANDIDATES, [LEVEL_TITLE, LEVEL_SECTION]
+                )
+            ), "document_search")
+            documents = self._rank_library_documents(documents, section_hits, top_documents)
+            if not documents:
+                return self._create_error_response("no_relevant_content", question)
+            
+            # 第二阶段：在筛选出的文献内并行检索文本块
+            per_document = Config.RAG_LIBRARY_CHUNKS_PER_DOCUMENT
+            results = await deadline.wait(asyncio.gather(*[
+                run_in_stage(
+                    STAGE_VECTOR,
+                    self.vector_store.search_similar_chunks,
+                    question_embedding, group_id, document["literature_id"], max(per_document * 3, 10)
+                )
+                for document in documents
+            ], return_exceptions=True), "retrieval")
             
-            # 3. 检索相关文档块
-            context_chunks = await self._retrieve_relevant_chunks(
-                question_embedding, literature_id, group_id, top_k or self.top_k_retrieval
-            )
+            titles = {document["literature_id"]: document["literature_title"] for document in documents}
+            chunks_by_document = []
+            for document, chunks in zip(documents, results):
+                if isinstance(chunks, Exception) or not chunks:
+                    continue
+                for chunk in chunks:
+                    chunk["literature_id"] = document["literature_id"]
+                    chunk["literature_title"] = chunk.get("literature_title") or titles[document["literature_id"]]
+                reranked = await run_in_stage(STAGE_CPU, self._rerank_chunks, chunks, per_document)
+                if reranked:
+                    chunks_by_document.append(reranked)
             
+            context_chunks = self._interleave_document_chunks(chunks_by_document, max_sources)
             if not context_chunks:
                 return self._create_error_response("no_relevant_content", question)
             
-            # 4. 检查答案缓存
-            cached_answer = cache_manager.get_answer(validated_question, literature_id, context_chunks)
-            if cached_answer is not None:
-                self.logger.info(f"答案缓存命中: {question[:30]}...")
-                # 更新处理时间
-                processing_time = (datetime.now() - start_time).total_seconds()
-                cached_answer["metadata"]["processing_time"] = processing_time
-                cached_answer["metadata"]["from_cache"] = True
-                return cached_answer
-            
-            # 5. 构建提示词
+            # 提示词构建时已按token预算选取来源片段
             prompt = self.prompt_builder.build_qa_prompt(
-                validated_question, context_chunks, processed_history
+                validated_question, context_chunks, show_literature_title=True
             )
-            
-            # 验证提示词质量
             prompt_validation = self.prompt_builder.validate_prompt_quality(prompt)
             if not prompt_validation["is_valid"]:
                 self.logger.warning(f"提示词质量问题: {prompt_validation['issues']}")
-                # 尝试压缩提示词
-                prompt = self.prompt_builder._compress_prompt(prompt)
             
-            # 6. 调用AI生成答案
-            raw_answer = await self._generate_ai_answer(prompt)
+            raw_answer, fallback_reason = await self._generate_with_fallback(prompt, deadline)
             if not raw_answer:
-                return self._create_error_response("ai_generation_failed", question)
+                extractive_answer = await self._build_extractive_response(
+                    validated_question, context_chunks, None, fallback_reason, start_time,
+                    {"group_id": group_id, "mode": "library", "documents_searched": len(documents)}
+                )
+                if extractive_answer is None:
+                    return self._create_error_response("ai_generation_failed", question)
+                extractive_answer["documents"] = documents
+                return extractive_answer
             
-            # 7. 处理答案
-            processed_answer = self.answer_processor.process_answer(
-                raw_answer, context_chunks, validated_question, literature_id
+            processed_answer = await run_in_stage(
+                STAGE_CPU,
+                self.answer_processor.process_answer,
+                raw_answer, context_chunks, validated_question, None
             )
             
-            # 8. 添加元数据
             processing_time = (datetime.now() - start_time).total_seconds()
+            processed_answer["documents"] = documents
             processed_answer["metadata"].update({
-                "session_id": session_id,
                 "group_id": group_id,
+                "mode": "library",
                 "processing_time": processing_time,
                 "prompt_tokens": self.prompt_builder._estimate_tokens(prompt),
+                "documents_searched": len(documents),
                 "chunks_retrieved": len(context_chunks),
+                "answer_mode": "generative",
                 "from_cache": False
             })
             
-            # 9. 缓存答案
-            cache_manager.set_answer(validated_question, literature_id, context_chunks, processed_answer)
-            
-            self.logger.info(f"问题处理完成，耗时: {processing_time:.2f}秒")
+            self.logger.info(f"跨文献问答完成，涉及 {len(chunks_by_document)} 篇文献，耗时: {processing_time:.2f}秒")
             return processed_answer
             
+        except DeadlineExceededError as e:
+            self.logger.warning(f"跨文献问答超时: {e.message}")
+            return self._create_error_response("timeout", question)
         except Exception as e:
-            self.logger.error(f"RAG处理出错: {str(e)}\n{traceback.format_exc()}")
+            self.logger.error(f"跨文献问答出错: {str(e)}\n{traceback.format_exc()}")
             return self._create_error_response("system_error", question)
 
+    def _rank_library_documents(
+        self,
+        documents: List[Dict],
+        section_hits: List[Dict],
+        top_documents: int
+    ) -> List[Dict]:
+        """
+        合并文档级和章节级检索结果，按最佳匹配相似度对文献排序
+        
+        只在某一章节中讨论问题主题的文献，其文档级平均向量可能被其他内容稀释，
+        取两者的最大值可以避免漏掉这类文献。
+        
+        Args:
+            documents: 文档级检索结果
+            section_hits: 标题/章节级检索结果
+            top_documents: 保留的文献数
+            
+        Returns:
+            List[Dict]: 排序后的文献列表，附带 matched_section（最佳匹配的章节）
+        """
+        ranked: Dict[str, Dict] = {}
+        for document in documents:
+            ranked[document["literature_id"]] = {**document, "matched_section": "document"}
+        
+        for hit in section_hits:
+            current = ranked.get(hit["literature_id"])
+            if current is None or hit["similarity"] > current["similarity"]:
+                ranked[hit["literature_id"]] = {
+                    "literature_id": hit["literature_id"],
+                    "literature_title": hit["literature_title"] or (current or {}).get("literature_title", ""),
+                    "similarity": hit["similarity"],
+                    "matched_section": hit["section_type"] or hit["level"]
+                }
+        
+        return sorted(ranked.values(), key=lambda item: item["similarity"], reverse=True)[:top_documents]
+
+    def _interleave_document_chunks(self, chunks_by_document: List[List[Dict]], max_sources: int) -> List[Dict]:
+        """
+        按文献轮流选取文本块，保证来源覆盖尽可能多的文献
+        
+        Args:
+            chunks_by_document: 每篇文献重排序后的文本块
+            max_sources: 选取的文本块总数
+            
+        Returns:
+            List[Dict]: 选中的文本块
+        """
+        # 最相关的文献优先
+        ordered = sorted(
+            chunks_by_document,
+            key=lambda chunks: chunks[0].get("final_score", chunks[0].get("similarity", 0)),
+            reverse=True
+        )
+        
+        selected = []
+        depth = 0
+        while len(selected) < max_sources and any(depth < len(chunks) for chunks in ordered):
+            for chunks in ordered:
+                if depth < len(chunks) and len(selected) < max_sources:
+                    selected.append(chunks[depth])
+            depth += 1
+        return selected
+
+    async def _prepare_answer_context(
+        self,
+        question: str,
+        literature_id: str,
+        group_id: str,
+        conversation_history: Optional[List[Dict]],
+        top_k: Optional[int],
+        start_time: datetime,
+        deadline: Deadline
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[str, List[Dict], str, List[float], int, Dict[str, Any]]]]:
+        """
+        执行生成答案前的公共步骤：预处理、检索、缓存检查和提示词构建
+        
+        Args:
+            question: 用户问题
+            literature_id: 文献ID
+            group_id: 研究组ID
+            conversation_history: 对话历史
+            top_k: 检索数量
+            start_time: 请求开始时间
+            deadline: 请求截止时间，embedding和检索阶段超时抛出 DeadlineExceededError
+            
+        Returns:
+            Tuple: (提前返回的结果, None) 或 (None, (处理后的问题, 文档块, 提示词, 问题向量, 文献向量版本, 检索信息))
+        """
+        # 1. 问题预处理和验证
+        validated_question = self._preprocess_question(question)
+        if not validated_question:
+            return self._create_error_response("invalid_question", question), None
+        
+        # 预设问题优先使用入库后预先生成的答案
+        precomputed_answer = await self._get_precomputed_answer(literature_id, validated_question, start_time)
+        if precomputed_answer is not None:
+            return precomputed_answer, None
+        
+        top_k = top_k or self.top_k_retrieval
+        vector_version = cache_manager.get_literature_version(literature_id)
+        
+        # 先查检索结果缓存，重复问题无需生成embedding和向量检索
+        cached_retrieval = cache_manager.get_retrieval(literature_id, validated_question, top_k, vector_version)
+        if cached_retrieval is not None:
+            self.logger.info(f"检索缓存命中: {question[:30]}...")
+            context_chunks, question_embedding = cached_retrieval
+            retrieval_info = {"retrieval_depth": 0, "candidates": 0, "widened": False, "reason": "retrieval_cache"}
+            processed_history = await self._process_conversation_history(
+                conversation_history, validated_question, question_embedding
+            )
+        else:
+            # 2. 生成问题Embedding，再按相似度筛选对话历史
+            try:
+                question_embedding = await deadline.wait(
+                    self._generate_question_embedding(validated_question), "embedding"
+                )
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Embedding生成失败: {str(e)}")
+                return self._create_error_response("embedding_failed", question), None
+            
+            processed_history = await self._process_conversation_history(
+                conversation_history, validated_question, question_embedding
+            )
+            
+            # 检查语义答案缓存（相近问题直接复用，省去检索和生成）
+            semantic_answer = self._get_semantic_answer(
+                question, literature_id, question_embedding, vector_version, start_time
+            )
+            if semantic_answer is not None:
+                return semantic_answer, None
+            
+            # 3. 检索相关文档块（自适应检索深度）
+            context_chunks, retrieval_info = await deadline.wait(
+                self._retrieve_relevant_chunks(question_embedding, literature_id, group_id, top_k),
+                "retrieval"
+            )
+            
+            if not context_chunks:
+                return self._create_error_response("no_relevant_content", question), None
+            
+            cache_manager.set_retrieval(
+                literature_id, validated_question, top_k, vector_version, context_chunks, question_embedding
+            )
+        
+        # 4-5. 检查答案缓存并构建提示词
+        cached_answer, prompt = self._build_prompt(
+            validated_question, literature_id, context_chunks, processed_history, start_time
+        )
+        if cached_answer is not None:
+            return cached_answer, None
+        
+        return None, (validated_question, context_chunks, prompt, question_embedding, vector_version, retrieval_info)
+
+    def _get_semantic_answer(
+        self,
+        question: str,
+        literature_id: str,
+        question_embedding: List[float],
+        vector_version: int,
+        start_time: datetime
+    ) -> Optional[Dict[str, Any]]:
+        """检查语义答案缓存，命中时更新处理时间"""
+        semantic_answer = cache_manager.get_semantic_answer(literature_id, question_embedding, vector_version)
+        if semantic_answer is None:
+            return None
+        
+        self.logger.info(
+            f"语义缓存命中: {question[:30]}... "
+            f"(相似度 {semantic_answer['metadata']['semantic_cache']['similarity']})"
+        )
+        semantic_answer["metadata"]["processing_time"] = (datetime.now() - start_time).total_seconds()
+        semantic_answer["metadata"]["from_cache"] = True
+        return semantic_answer
+
+    def _build_prompt(
+        self,
+        validated_question: str,
+        literature_id: str,
+        context_chunks: List[Dict],
+        processed_history: List[Dict],
+        start_time: datetime
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        检查答案缓存，未命中时构建提示词
+        
+        Returns:
+            Tuple: (缓存的答案, None) 或 (None, 提示词)
+        """
+        # 检查答案缓存
+        cached_answer = cache_manager.get_answer(validated_question, literature_id, context_chunks)
+        if cached_answer is not None:
+            self.logger.info(f"答案缓存命中: {validated_question[:30]}...")
+            # 更新处理时间
+            processing_time = (datetime.now() - start_time).total_seconds()
+            cached_answer["metadata"]["processing_time"] = processing_time
+            cached_answer["metadata"]["from_cache"] = True
+            return cached_answer, None
+        
+        # 构建提示词（按token预算选取文档块和对话历史后一次性拼接）
+        prompt = self.prompt_builder.build_qa_prompt(
+            validated_question, context_chunks, processed_history
+        )
+        
+        # 验证提示词质量
+        prompt_validation = self.prompt_builder.validate_prompt_quality(prompt)
+        if not prompt_validation["is_valid"]:
+            self.logger.warning(f"提示词质量问题: {prompt_validation['issues']}")
+        
+        return None, prompt
+
+    async def _answer_prepared(
+        self,
+        question: str,
+        prepared: Tuple[str, List[Dict], str, List[float], int, Dict[str, Any]],
+        literature_id: str,
+        group_id: str,
+        session_id: Optional[str],
+        start_time: datetime,
+        deadline: Deadline
+    ) -> Dict[str, Any]:
+        """
+        根据已构建的提示词生成答案，处理后写入缓存
+        
+        生成服务熔断、失败或时间不足时改用抽取式答案。
+        
+        Args:
+            question: 原始问题
+            prepared: _prepare_answer_context 返回的 (处理后的问题, 文档块, 提示词, 问题向量, 文献向量版本, 检索信息)
+            literature_id: 文献ID
+            group_id: 研究组ID
+            session_id: 会话ID
+            start_time: 请求开始时间
+            deadline: 请求截止时间
+            
+        Returns:
+            Dict: 处理结果
+        """
+        validated_question, context_chunks, prompt, question_embedding, vector_version, retrieval_info = prepared
+        
+        # 6. 调用AI生成答案（熔断、失败或时间不足时改用抽取式答案）
+        raw_answer, fallback_reason = await self._generate_with_fallback(prompt, deadline)
+        if not raw_answer:
+            extractive_answer = await self._build_extractive_response(
+                validated_question, context_chunks, literature_id, fallback_reason, start_time,
+                {"session_id": session_id, "group_id": group_id, "retrieval_depth": retrieval_info["retrieval_depth"]}
+            )
+            return self._with_question_embedding(
+                extractive_answer or self._create_error_response("ai_generation_failed", question),
+                question_embedding
+            )
+        
+        # 7-9. 处理答案、添加元数据并缓存
+        processed_answer = await self._finalize_answer(
+            raw_answer, validated_question, context_chunks, prompt,
+            literature_id, group_id, session_id, start_time,
+            question_embedding, vector_version, retrieval_info
+        )
+        return self._with_question_embedding(processed_answer, question_embedding)
+
+    @staticmethod
+    def _with_question_embedding(answer: Dict[str, Any], question_embedding: List[float]) -> Dict[str, Any]:
+        """
+        附加问题向量，供调用方随对话轮次保存（复制结果，不修改缓存中的答案）
+        
+        Args:
+            answer: 处理结果
+            question_embedding: 问题向量
+            
+        Returns:
+            Dict: 带 question_embedding 的处理结果
+        """
+        return {**answer, "question_embedding": question_embedding}
+
+    async def _finalize_answer(
+        self,
+        raw_answer: str,
+        validated_question: str,
+        context_chunks: List[Dict],
+        prompt: str,
+        literature_id: str,
+        group_id: str,
+        session_id: Optional[str],
+        start_time: datetime,
+        question_embedding: List[float],
+        vector_version: int,
+        retrieval_info: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        处理AI原始答案，补充元数据并写入缓存
+        
+        Returns:
+            Dict: 处理后的答案
+        """
+        # 7. 处理答案
+        processed_answer = await run_in_stage(
+            STAGE_CPU,
+            self.answer_processor.process_answer,
+            raw_answer, context_chunks, validated_question, literature_id
+        )
+        
+        # 8. 添加元数据
+        processing_time = (datetime.now() - start_time).total_seconds()
+        processed_answer["metadata"].update({
+            "session_id": session_id,
+            "group_id": group_id,
+            "processing_time": processing_time,
+            "prompt_tokens": self.prompt_builder._estimate_tokens(prompt),
+            "chunks_retrieved": len(context_chunks),
+            "retrieval_depth": retrieval_info["retrieval_depth"],
+            "retrieval_widened": retrieval_info["widened"],
+            "retrieval_reason": retrieval_info["reason"],
+            "answer_mode": "generative",
+            "from_cache": False
+        })
+        
+        # 9. 缓存答案
+        cache_manager.set_answer(validated_question, literature_id, context_chunks, processed_answer)
+        
+        # 低置信度答案不进入语义缓存，避免被相近问题反复复用
+        if processed_answer.get("confidence", 0) >= Config.RAG_MIN_CONFIDENCE:
+            cache_manager.set_semantic_answer(
+                literature_id, validated_question, question_embedding, vector_version, processed_answer
+            )
+        
+        return processed_answer
+
     def _preprocess_question(self, question: str) -> Optional[str]:
         """
         预处理用户问题
@@ -213,24 +864,26 @@ class RAGService:
             List[float]: 问题的embedding向量
         """
         try:
-            # 使用异步方式生成embedding
-            loop = asyncio.get_event_loop()
-            embedding = await loop.run_in_executor(
-                None, 
-                self.embedding_service.generate_query_embedding, 
-                question
-            )
+            # 使用SDK异步接口生成，不占用线程
+            embedding = await self.embedding_service.agenerate_query_embedding(question)
             return embedding
         except Exception as e:
             self.logger.error(f"生成问题embedding失败: {str(e)}")
             raise
 
-    async def _process_conversation_history(self, history: Optional[List[Dict]]) -> List[Dict]:
+    async def _process_conversation_history(
+        self,
+        history: Optional[List[Dict]],
+        question: str = "",
+        question_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
         """
-        处理对话历史
+        处理对话历史，只保留与当前问题相关的轮次
         
         Args:
-            history: 原始对话历史
+            history: 原始对话历史（最近轮次，用户消息可带问题向量）
+            question: 当前问题
+            question_embedding: 当前问题向量
             
         Returns:
             List[Dict]: 处理后的对话历史
@@ -239,6 +892,9 @@ class RAGService:
             return []
         
         try:
+            # 按问题向量相似度筛选，不相关的历史不进入提示词
+            history = conversation_manager.select_relevant_history(history, question, question_embedding)
+            
             # 过滤和清理历史记录
             processed_history = []
             for turn in history[-Config.RAG_CONVERSATION_MAX_TURNS:]:
@@ -261,9 +917,11 @@ class RAGService:
         literature_id: str, 
         group_id: str, 
         top_k: int
-    ) -> List[Dict]:
+    ) -> Tuple[List[Dict], Dict[str, Any]]:
         """
-        检索相关文档块
+        检索相关文档块（自适应检索深度）
+        
+        先检索少量候选并重排序，只有当相似度分布显示结果不明确时才扩大到完整检索深度。
         
         Args:
             question_embedding: 问题embedding
@@ -272,52 +930,135 @@ class RAGService:
             top_k: 检索数量
             
         Returns:
-            List[Dict]: 相关文档块列表
+            Tuple[List[Dict], Dict]: (相关文档块列表, 检索信息 {retrieval_depth, candidates, widened, reason})
         """
+        # 完整检索深度：至少检索20个，或者是目标数量的3倍
+        full_k = max(top_k * 3, 20)
+        if Config.RAG_ADAPTIVE_RETRIEVAL_ENABLED:
+            search_k = min(max(Config.RAG_ADAPTIVE_INITIAL_K, top_k + 1), full_k)
+        else:
+            search_k = full_k
+        retrieval_info = {"retrieval_depth": search_k, "candidates": 0, "widened": False, "reason": "fixed"}
+        
         try:
             self.logger.debug(f"开始检索相关文档块：literature_id={literature_id}, group_id={group_id}, top_k={top_k}")
             
-            # 增加检索数量以提高找到高质量文档的概率
-            search_top_k = max(top_k * 3, 20)  # 至少检索20个，或者是目标数量的3倍
-            
-            # 使用异步方式检索
-            loop = asyncio.get_event_loop()
-            chunks = await loop.run_in_executor(
-                None,
-                self.vector_store.search_similar_chunks,
-                question_embedding,
-                group_id,
-                literature_id,
-                search_top_k  # 使用更大的检索数量
+            chunks, reranked_chunks = await self._search_and_rerank(
+                question_embedding, literature_id, group_id, search_k, top_k
             )
             
-            self.logger.info(f"原始检索结果数量: {len(chunks)}")
-            
-            # 记录原始检索结果的详细信息
-            if chunks:
-                for i, chunk in enumerate(chunks[:5]):  # 只记录前5个
-                    self.logger.debug(f"原始chunk {i}: similarity={chunk.get('similarity', 'N/A'):.4f}, "
-                                    f"raw_distance={chunk.get('raw_distance', 'N/A'):.4f}, "
-                                    f"chunk_index={chunk.get('chunk_index', 'N/A')}, "
-                                    f"text_preview='{chunk.get('text', '')[:100]}'...")
-            else:
-                self.logger.warning("没有检索到任何文档块")
+            if search_k < full_k:
+                widen, reason = self._needs_wider_retrieval(chunks, reranked_chunks, search_k, top_k)
+                retrieval_info["reason"] = reason
+                if widen:
+                    self.logger.info(f"首轮检索结果不明确，扩大检索深度: {search_k} -> {full_k}")
+                    chunks, reranked_chunks = await self._search_and_rerank(
+                        question_embedding, literature_id, group_id, full_k, top_k
+                    )
+                    retrieval_info.update({"retrieval_depth": full_k, "widened": True})
             
-            # 重排序和过滤
-            reranked_chunks = self._rerank_chunks(chunks, top_k)
-            
-            self.logger.info(f"重排序后返回文档块数量: {len(reranked_chunks)}")
+            retrieval_info["candidates"] = len(chunks)
+            self.logger.info(
+                f"重排序后返回文档块数量: {len(reranked_chunks)} "
+                f"(检索深度 {retrieval_info['retrieval_depth']}, {retrieval_info['reason']})"
+            )
             
-            return reranked_chunks
+            return reranked_chunks, retrieval_info
             
         except Exception as e:
             self.logger.error(f"检索相关文档块失败: {str(e)}")
-            return []
+            return [], retrieval_info
+
+    async def _search_and_rerank(
+        self,
+        question_embedding: List[float],
+        literature_id: str,
+        group_id: str,
+        search_k: int,
+        top_k: int
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        按指定深度检索候选文档块并重排序
+        
+        Returns:
+            Tuple[List[Dict], List[Dict]]: (原始候选, 重排序后的文档块)
+        """
+        # 在向量检索专用线程池中检索
+        chunks = await run_in_stage(
+            STAGE_VECTOR,
+            self.vector_store.search_similar_chunks,
+            question_embedding,
+            group_id,
+            literature_id,
+            search_k
+        )
+        
+        self.logger.info(f"原始检索结果数量: {len(chunks)}")
+        
+        # 记录原始检索结果的详细信息
+        if chunks:
+            for i, chunk in enumerate(chunks[:5]):  # 只记录前5个
+                self.logger.debug(f"原始chunk {i}: similarity={chunk.get('similarity', 0):.4f}, "
+                                f"chunk_index={chunk.get('chunk_index', 'N/A')}, "
+                                f"text_preview='{chunk.get('text', '')[:100]}'...")
+        else:
+            self.logger.warning("没有检索到任何文档块")
+        
+        # 重排序和过滤（CPU计算，放到后处理线程池避免阻塞事件循环）
+        reranked_chunks = await run_in_stage(STAGE_CPU, self._rerank_chunks, chunks, top_k)
+        return chunks, reranked_chunks
+
+    def _needs_wider_retrieval(
+        self,
+        chunks: List[Dict],
+        reranked_chunks: List[Dict],
+        search_k: int,
+        top_k: int
+    ) -> Tuple[bool, str]:
+        """
+        根据首轮检索的相似度分布判断是否需要扩大检索深度
+        
+        向量库按相似度降序返回结果，更深的候选相似度不会高于首轮的尾部结果。
+        
+        Args:
+            chunks: 首轮原始候选（按相似度降序）
+            reranked_chunks: 首轮重排序结果
+            search_k: 首轮检索深度
+            top_k: 目标数量
+            
+        Returns:
+            Tuple[bool, str]: (是否需要扩大检索, 判断原因)
+        """
+        # 候选数不足检索深度，说明文献的全部文本块都已检索到
+        if len(chunks) < search_k:
+            return False, "exhausted"
+        
+        top_similarity = chunks[0].get("similarity", 0)
+        tail_similarity = chunks[-1].get("similarity", 0)
+        
+        # 尾部已低于重排序的最低相似度阈值，更深的候选都会被过滤
+        if tail_similarity < 0.3:
+            return False, "tail_below_threshold"
+        
+        # 更深候选的综合得分上限为 0.5*相似度 + 0.3*1 + 0.2*1，
+        # 若当前第top_k个结果已不低于该上限，扩大检索不会改变结果
+        if len(reranked_chunks) >= top_k:
+            if reranked_chunks[-1].get("final_score", 0) >= tail_similarity * 0.5 + 0.5:
+                return False, "score_bound"
+            
+            # 首条结果足够相关，且与尾部拉开明显差距
+            if (top_similarity >= Config.RAG_ADAPTIVE_CONFIDENT_SIMILARITY
+                    and top_similarity - tail_similarity >= Config.RAG_ADAPTIVE_MIN_SCORE_GAP):
+                return False, "clear_gap"
+        
+        return True, "ambiguous"
 
     def _rerank_chunks(self, chunks: List[Dict], top_k: int) -> List[Dict]:
         """
         重排序文档块
         
+        文本质量分数在入库时已写入向量元数据，这里只对预先计算好的特征做一次向量化打分。
+        
         Args:
             chunks: 原始文档块
             top_k: 返回数量
@@ -336,82 +1077,44 @@ class RAGService:
         MEDIUM_SIMILARITY_THRESHOLD = 0.4  # 中等相似度阈值
         MIN_SIMILARITY_THRESHOLD = 0.3  # 最低相似度阈值
         
-        # 首先尝试获取高质量文档
-        high_quality_chunks = []
-        medium_quality_chunks = []
-        low_quality_chunks = []
-        
+        # 旧数据的元数据中没有质量分数，按需补算
         for chunk in chunks:
-            similarity = chunk.get("similarity", 0)
-            text_quality = self._evaluate_text_quality(chunk.get("text", ""))
-            
-            # 根据相似度和文档质量分类
-            if similarity >= HIGH_SIMILARITY_THRESHOLD:
-                high_quality_chunks.append(chunk)
-            elif similarity >= MEDIUM_SIMILARITY_THRESHOLD:
-                # 中等相似度的文档，如果质量高也保留
-                if text_quality >= 0.3:
-                    medium_quality_chunks.append(chunk)
-                else:
-                    self.logger.debug(f"过滤中等相似度低质量文档: similarity={similarity:.3f}, quality={text_quality:.3f}")
-            elif similarity >= MIN_SIMILARITY_THRESHOLD:
-                # 低相似度的文档，只有质量很高才保留
-                if text_quality >= 0.5:
-                    low_quality_chunks.append(chunk)
-                    self.logger.debug(f"保留低相似度高质量文档: similarity={similarity:.3f}, quality={text_quality:.3f}")
-                else:
-                    self.logger.debug(f"过滤低相似度文档: similarity={similarity:.3f}, quality={text_quality:.3f}")
-            else:
-                self.logger.debug(f"过滤超低相似度文档: similarity={similarity:.3f}")
+            if chunk.get("text_quality") is None:
+                chunk["text_quality"] = self._evaluate_text_quality(chunk.get("text", ""))
+        
+        similarity = np.fromiter((chunk.get("similarity", 0) for chunk in chunks), dtype=np.float64, count=len(chunks))
+        quality = np.fromiter((chunk["text_quality"] for chunk in chunks), dtype=np.float64, count=len(chunks))
+        length = np.fromiter((len(chunk.get("text", "")) for chunk in chunks), dtype=np.float64, count=len(chunks))
         
-        # 合并筛选后的文档块，优先级：高>中>低
-        filtered_chunks = high_quality_chunks + medium_quality_chunks + low_quality_chunks
+        # 根据相似度和文档质量分层：高相似度直接保留，中等相似度要求质量>=0.3，低相似度要求质量>=0.5
+        high = similarity >= HIGH_SIMILARITY_THRESHOLD
+        medium = ~high & (similarity >= MEDIUM_SIMILARITY_THRESHOLD) & (quality >= 0.3)
+        low = (similarity < MEDIUM_SIMILARITY_THRESHOLD) & (similarity >= MIN_SIMILARITY_THRESHOLD) & (quality >= 0.5)
+        tier = np.select([high, medium, low], [0, 1, 2], default=3)
         
-        if not filtered_chunks:
+        candidates = np.flatnonzero(tier < 3)
+        self.logger.debug(f"文档质量分类: 高质量={int(high.sum())}, 中质量={int(medium.sum())}, 低质量={int(low.sum())}")
+        
+        if candidates.size == 0:
             self.logger.warning(f"经过质量和相似度过滤后无可用文档块")
             # 如果完全没有，则返回原始的最佳几个文档（降级处理）
-            if chunks:
-                self.logger.info("执行降级策略：返回原始最佳文档块")
-                filtered_chunks = sorted(chunks, key=lambda x: x.get("similarity", 0), reverse=True)[:3]
-            else:
-                return []
-        
-        self.logger.debug(f"文档质量分类: 高质量={len(high_quality_chunks)}, 中质量={len(medium_quality_chunks)}, 低质量={len(low_quality_chunks)}")
-        self.logger.debug(f"过滤后保留 {len(filtered_chunks)} 个文档块")
-        
-        # 基于相似度和其他因素重排序
-        scored_chunks = []
-        for i, chunk in enumerate(filtered_chunks):
-            similarity = chunk.get("similarity", 0)
-            text = chunk.get("text", "")
-            text_length = len(text)
-            
-            # 评估文档质量（如果还没评估过）
-            if "text_quality" not in chunk:
-                text_quality = self._evaluate_text_quality(text)
-                chunk["text_quality"] = text_quality
-            else:
-                text_quality = chunk["text_quality"]
-            
-            # 综合评分：相似度(50%) + 文档质量(30%) + 长度因子(20%)
-            length_factor = min(text_length / 500, 1.0)  # 适中长度加分
-            score = similarity * 0.5 + text_quality * 0.3 + length_factor * 0.2
-            
-            chunk["final_score"] = score
-            scored_chunks.append(chunk)
-            
-            self.logger.debug(f"Chunk {i}: similarity={similarity:.3f}, quality={text_quality:.3f}, "
-                            f"length={text_length}, final_score={score:.3f}")
+            self.logger.info("执行降级策略：返回原始最佳文档块")
+            candidates = np.argsort(-similarity, kind="stable")[:3]
         
-        # 按综合得分排序
-        scored_chunks.sort(key=lambda x: x["final_score"], reverse=True)
+        self.logger.debug(f"过滤后保留 {candidates.size} 个文档块")
         
-        # 返回前top_k个结果
-        final_chunks = scored_chunks[:top_k]
+        # 综合评分：相似度(50%) + 文档质量(30%) + 长度因子(20%)，适中长度加分
+        scores = similarity * 0.5 + quality * 0.3 + np.minimum(length / 500, 1.0) * 0.2
         
-        # 记录最终选择的文档块信息
-        for i, chunk in enumerate(final_chunks):
-            self.logger.debug(f"Final chunk {i}: final_score={chunk['final_score']:.3f}, "
+        # 按综合得分排序，同分时保持高>中>低的分层顺序
+        order = candidates[np.lexsort((tier[candidates], -scores[candidates]))][:top_k]
+        
+        final_chunks = []
+        for i in order:
+            chunk = chunks[i]
+            chunk["final_score"] = float(scores[i])
+            final_chunks.append(chunk)
+            self.logger.debug(f"Final chunk: final_score={chunk['final_score']:.3f}, "
                             f"similarity={chunk.get('similarity', 0):.3f}, "
                             f"chunk_index={chunk.get('chunk_index', 'unknown')}")
         
@@ -420,7 +1123,7 @@ class RAGService:
     
     def _evaluate_text_quality(self, text: str) -> float:
         """
-        评估文本块的质量
+        评估文本块的质量（用于元数据中没有预计算质量分数的旧数据）
         
         Args:
             text: 文本内容
@@ -428,105 +1131,172 @@ class RAGService:
         Returns:
             float: 质量分数 (0-1)
         """
-        if not text:
-            return 0.0
-        
-        quality_score = 0.0
-        text_lower = text.lower()
-        
-        # 检查是否包含高价值的学术内容关键词
-        high_value_keywords = [
-            # 中文关键词
-            '摘要', '结论', '创新', '贡献', '意义', '目的', '方法', '结果', 
-            '讨论', '背景', '研究', '发现', '提出', '证明', '表明', '显示',
-            '分析', '实验', '理论', '模型', '算法', '技术', '系统',
-            
-            # 英文关键词  
-            'abstract', 'conclusion', 'novelty', 'contribution', 'significance',
-            'purpose', 'method', 'result', 'discussion', 'background', 
-            'research', 'finding', 'propose', 'demonstrate', 'show', 'indicate',
-            'analysis', 'experiment', 'theory', 'model', 'algorithm', 'system',
-            'innovation', 'approach', 'framework', 'investigation', 'study'
-        ]
-        
-        # 低价值内容关键词（版权、格式等）
-        low_value_keywords = [
-            'creative commons', 'attribution', 'license', 'copyright', 
-            'permission', 'reproduce', 'distribution', 'doi.org',
-            '版权', '许可', '授权', '转载', '引用格式'
-        ]
-        
-        # 计算高价值关键词匹配度
-        high_value_matches = sum(1 for keyword in high_value_keywords if keyword in text_lower)
-        quality_score += min(high_value_matches * 0.1, 0.4)  # 最多0.4分
-        
-        # 检查低价值内容，降低分数
-        low_value_matches = sum(1 for keyword in low_value_keywords if keyword in text_lower)
-        quality_score -= min(low_value_matches * 0.2, 0.3)  # 最多扣0.3分
-        
-        # 检查文本长度合理性
-        if 100 <= len(text) <= 2000:
-            quality_score += 0.2
-        elif len(text) < 50:
-            quality_score -= 0.2
-            
-        # 检查是否主要是数字和符号（低质量指标）
-        non_alphanumeric_ratio = sum(1 for c in text if not c.isalnum() and not c.isspace()) / len(text)
-        if non_alphanumeric_ratio > 0.3:
-            quality_score -= 0.2
-            
-        # 检查是否包含完整句子
-        sentence_count = len([s for s in text.split('.') if len(s.strip()) > 10])
-        if sentence_count >= 2:
-            quality_score += 0.1
-            
-        return max(0.0, min(1.0, quality_score))
-
-    async def _generate_ai_answer(self, prompt: str) -> Optional[str]:
+        return evaluate_chunk_quality(text)
+
+    async def _generate_ai_answer(self, prompt: str, deadline: Optional[Deadline] = None) -> Optional[str]:
         """
         使用AI生成答案
         
         Args:
             prompt: 完整的提示词
+            deadline: 请求截止时间（可选），生成超时取其剩余时间与 RAG_AI_TIMEOUT 的较小值
             
         Returns:
             Optional[str]: AI生成的答案
+            
+        Raises:
+            DeadlineExceededError: 生成超时
         """
-        if not self.client:
-            self.logger.error("Google AI客户端未初始化")
+        if not self.llm.is_available():
+            self.logger.error("没有可用的生成服务提供商")
             return None
         
-        try:
-            # 使用异步方式调用AI
-            loop = asyncio.get_event_loop()
-            
-            # 生成配置
-            config = types.GenerateContentConfig(
-                temperature=0.3,  # 较低的温度保证准确性
-                top_p=0.8,
-                max_output_tokens=2000,
-                candidate_count=1
-            )
+        answer = await self.llm.agenerate(prompt, timeout=self._generation_timeout(deadline))
+        if not answer:
+            self.logger.warning("AI返回空响应")
+        return answer
+
+    async def _get_precomputed_answer(self, literature_id: str, question: str, start_time: datetime) -> Optional[Dict[str, Any]]:
+        """
+        获取预设问题的预生成答案（数据库查询在线程中执行，不阻塞事件循环）
+        
+        Args:
+            literature_id: 文献ID
+            question: 处理后的问题
+            start_time: 请求开始时间
             
-            # 使用最新的API格式异步调用
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=[prompt],
-                    config=config
-                )
-            )
+        Returns:
+            Optional[Dict[str, Any]]: 预生成的答案，不是预设问题或尚未生成时返回None
+        """
+        if question not in self.preset_questions:
+            return None
+        
+        answer = await asyncio.to_thread(preset_answer_store.get, literature_id, question)
+        if answer is None:
+            return None
+        
+        self.logger.info(f"预设答案命中: {question[:30]}...")
+        answer["metadata"] = dict(answer.get("metadata", {}))
+        answer["metadata"].update({
+            "processing_time": (datetime.now() - start_time).total_seconds(),
+            "from_cache": True,
+            "precomputed": True
+        })
+        return answer
+
+    def _extractive_reason(self, deadline: Deadline) -> Optional[str]:
+        """
+        判断是否应跳过生成服务，直接使用抽取式答案
+        
+        Args:
+            deadline: 请求截止时间
             
-            if response and hasattr(response, 'text') and response.text:
-                return response.text
-            else:
-                self.logger.warning("AI返回空响应")
-                return None
-                
-        except Exception as e:
-            self.logger.error(f"AI生成答案失败: {str(e)}")
+        Returns:
+            Optional[str]: 跳过原因（circuit_open/deadline），无需跳过时返回None
+        """
+        if not Config.RAG_EXTRACTIVE_FALLBACK_ENABLED:
             return None
+        if not self.llm.can_generate():
+            return "circuit_open"
+        if deadline.remaining() < Config.RAG_EXTRACTIVE_MIN_GENERATION_TIME:
+            return "deadline"
+        return None
+
+    async def _generate_with_fallback(self, prompt: str, deadline: Deadline) -> Tuple[Optional[str], Optional[str]]:
+        """
+        调用生成服务，并给出未能生成答案的原因
+        
+        Args:
+            prompt: 完整的提示词
+            deadline: 请求截止时间
+            
+        Returns:
+            Tuple[Optional[str], Optional[str]]: (AI答案, 回退原因)，生成成功时回退原因为None
+        """
+        fallback_reason = self._extractive_reason(deadline)
+        if fallback_reason is not None:
+            self.logger.info(f"跳过生成服务，使用抽取式答案: {fallback_reason}")
+            return None, fallback_reason
+        
+        try:
+            raw_answer = await self._generate_ai_answer(prompt, deadline)
+        except DeadlineExceededError as e:
+            self.logger.warning(f"生成超时: {e.message}")
+            return None, "generation_timeout"
+        if not raw_answer:
+            return None, "generation_failed"
+        return raw_answer, None
+
+    async def _build_extractive_response(
+        self,
+        validated_question: str,
+        context_chunks: List[Dict],
+        literature_id: Optional[str],
+        fallback_reason: Optional[str],
+        start_time: datetime,
+        extra_metadata: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        从检索到的文档块中摘录原文句子生成答案（不写入答案缓存，服务恢复后重新生成）
+        
+        Args:
+            validated_question: 处理后的问题
+            context_chunks: 检索到的文档块
+            literature_id: 文献ID（跨文献问答时为None）
+            fallback_reason: 未使用生成服务的原因
+            start_time: 请求开始时间
+            extra_metadata: 需要补充的元数据
+            
+        Returns:
+            Optional[Dict[str, Any]]: 处理后的答案，未启用或没有可摘录的句子时返回None
+        """
+        if not Config.RAG_EXTRACTIVE_FALLBACK_ENABLED:
+            return None
+        
+        raw_answer = await run_in_stage(STAGE_CPU, build_extractive_answer, validated_question, context_chunks)
+        if not raw_answer:
+            return None
+        
+        processed_answer = await run_in_stage(
+            STAGE_CPU,
+            self.answer_processor.process_answer,
+            raw_answer, context_chunks, validated_question, literature_id
+        )
+        processed_answer["metadata"].update(extra_metadata)
+        processed_answer["metadata"].update({
+            "answer_mode": "extractive",
+            "fallback_reason": fallback_reason,
+            "processing_time": (datetime.now() - start_time).total_seconds(),
+            "chunks_retrieved": len(context_chunks),
+            "from_cache": False
+        })
+        self.logger.info(f"使用抽取式答案（{fallback_reason}），耗时: {processed_answer['metadata']['processing_time']:.2f}秒")
+        return processed_answer
+
+    async def _stream_ai_answer(self, prompt: str, deadline: Optional[Deadline] = None) -> AsyncIterator[str]:
+        """
+        使用AI流式生成答案
+        
+        Args:
+            prompt: 完整的提示词
+            deadline: 请求截止时间（可选）
+            
+        Yields:
+            str: AI逐段返回的文本
+        """
+        if not self.llm.is_available():
+            self.logger.error("没有可用的生成服务提供商")
+            return
+        
+        # 输出部分内容后出错时 astream 会抛出异常，由调用方改用抽取式答案
+        async for text in self.llm.astream(prompt, timeout=self._generation_timeout(deadline)):
+            yield text
+
+    def _generation_timeout(self, deadline: Optional[Deadline]) -> float:
+        """生成阶段的超时：单次生成上限与请求剩余时间取较小值"""
+        if deadline is None:
+            return self.ai_timeout
+        return min(self.ai_timeout, deadline.remaining())
 
     def get_preset_questions(self, literature_id: str, literature_title: str = "") -> List[str]:
         """
@@ -581,6 +1351,8 @@ class RAGService:
 我可以基于现有内容回答技术细节相关的问题。""".format(question)
             else:
                 answer = "抱歉，在当前检索到的文档内容中，我无法找到足够相关的信息来回答您的问题。请尝试重新表述问题或询问文献中的其他内容。"
+        elif error_type == "timeout":
+            answer = "处理您的问题超时，生成服务当前响应较慢，请稍后重试。"
         else:
             answer = "处理您的问题时遇到了技术问题，请稍后重试。"
         
@@ -645,7 +1417,7 @@ class RAGService:
             
             # 检查AI服务
             try:
-                if self.client:
+                if self.llm.is_available():
                     # 简单测试
                     test_response = await self._generate_ai_answer("你好，这是一个测试。请简单回复。")
                     health_status["components"]["ai_service"] = {
@@ -655,7 +1427,7 @@ class RAGService:
                 else:
                     health_status["components"]["ai_service"] = {
                         "status": "unhealthy",
-                        "details": "AI客户端未初始化"
+                        "details": "没有可用的生成服务提供商"
                     }
             except Exception as e:
                 health_status["components"]["ai_service"] = {
@@ -700,6 +1472,9 @@ class RAGService:
                 "embedding_service": "EmbeddingService",
                 "vector_store": "VectorStore"
             },
+            "executors": get_stage_stats(),
+            "llm": self.llm.get_stats(),
+            "preset_answers": preset_precomputer.get_stats(),
             "timestamp": datetime.now().isoformat()
         }
 
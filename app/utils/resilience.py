@@ -0,0 +1,158 @@
+"""
+外部调用容错模块
+提供请求截止时间、按提供商的熔断器和延迟分位数统计，
+用于限制大模型等外部服务故障时的尾部延迟
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Dict, Optional
+
+from app.utils.error_handler import LiteratureSystemError
+
+# 熔断器状态
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class DeadlineExceededError(LiteratureSystemError):
+    """请求已超过截止时间"""
+    pass
+
+
+class Deadline:
+    """请求截止时间，在embedding、检索和生成各阶段之间传递"""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """剩余时间（秒），已超时返回0"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """是否已超时"""
+        return time.monotonic() >= self.expires_at
+
+    async def wait(self, awaitable: Awaitable, stage: str) -> Any:
+        """
+        在剩余时间内等待异步操作完成
+
+        Args:
+            awaitable: 异步操作
+            stage: 阶段名称（用于错误信息）
+
+        Returns:
+            Any: 异步操作的结果
+
+        Raises:
+            DeadlineExceededError: 剩余时间内未完成
+        """
+        try:
+            return await asyncio.wait_for(awaitable, timeout=self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceededError(f"{stage} 阶段超过请求截止时间（{self.timeout}秒）", "deadline_exceeded")
+
+
+class LatencyTracker:
+    """记录最近若干次成功调用的耗时，用于计算对冲请求的等待时间"""
+
+    def __init__(self, window: int = 100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        计算耗时分位数
+
+        Args:
+            percentile: 分位（0-100）
+
+        Returns:
+            Optional[float]: 分位数，样本为空时返回None
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，冷却期内直接拒绝请求；
+    冷却结束后进入半开状态，只放行一个试探请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._rejected = 0
+
+    def allow_request(self) -> bool:
+        """判断是否允许发起请求"""
+        with self._lock:
+            if self._state == CIRCUIT_OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._rejected += 1
+                    return False
+                self._state = CIRCUIT_HALF_OPEN
+                self._trial_in_flight = False
+
+            if self._state == CIRCUIT_HALF_OPEN:
+                if self._trial_in_flight:
+                    self._rejected += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def is_open(self) -> bool:
+        """是否处于熔断冷却期（只查询状态，不占用半开状态的试探机会）"""
+        with self._lock:
+            return self._state == CIRCUIT_OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self._state = CIRCUIT_CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == CIRCUIT_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = CIRCUIT_OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_cancelled(self):
+        """请求被主动取消（如对冲请求中落后的一方），不计入成功或失败"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def get_state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "rejected": self._rejected
+            }
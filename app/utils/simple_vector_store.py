@@ -9,6 +9,7 @@ import logging
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 from app.config import settings
+from app.utils.text_processor import evaluate_chunk_quality
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -118,7 +119,8 @@ class SimpleVectorStore:
                     "group_id": chunk["group_id"],
                     "chunk_index": chunk["chunk_index"],
                     "literature_title": chunk.get("literature_title", ""),
-                    "chunk_length": chunk["chunk_length"]
+                    "chunk_length": chunk["chunk_length"],
+                    "text_quality": chunk["text_quality"] if "text_quality" in chunk else evaluate_chunk_quality(chunk["text"])
                 }
                 collection["metadatas"].append(metadata)
             
@@ -189,55 +191,305 @@ class SimpleVectorStore:
         top_k: int = None
     ) -> List[Dict]:
         """搜索相似的文档块"""
+        results = self.search_similar_chunks_batch([query_embedding], group_id, literature_id, top_k)
+        return results[0] if results else []
+    
+    def search_similar_chunks_batch(
+        self,
+        query_embeddings: List[List[float]],
+        group_id: str,
+        literature_id: Optional[str] = None,
+        top_k: int = None
+    ) -> List[List[Dict]]:
+        """用一次矩阵运算为多个查询向量检索相似的文档块"""
         top_k = top_k or settings.MAX_RETRIEVAL_DOCS
+        empty = [[] for _ in query_embeddings]
+        if not query_embeddings:
+            return empty
         
         try:
             collection = self.get_or_create_collection(group_id)
             if not collection:
                 logger.warning(f"研究组 {group_id} 的向量集合不存在")
-                return []
+                return empty
             
-            # 计算相似度
-            similarities = []
-            for i, embedding in enumerate(collection["embeddings"]):
-                metadata = collection["metadatas"][i]
-                
-                # 如果指定了文献ID，则过滤
-                if literature_id and metadata.get("literature_id") != literature_id:
-                    continue
-                
-                similarity = self._cosine_similarity(query_embedding, embedding)
-                similarities.append({
-                    "index": i,
-                    "similarity": similarity,
-                    "text": collection["documents"][i],
-                    "metadata": metadata
-                })
-            
-            # 按相似度排序
-            similarities.sort(key=lambda x: x["similarity"], reverse=True)
+            # 如果指定了文献ID，则过滤
+            indices = [
+                i for i, metadata in enumerate(collection["metadatas"])
+                if not literature_id or metadata.get("literature_id") == literature_id
+            ]
+            if not indices:
+                return empty
             
-            # 取前top_k个结果
-            results = similarities[:top_k]
+            # 计算余弦相似度矩阵：行是查询，列是候选文档块
+            matrix = np.array([collection["embeddings"][i] for i in indices], dtype=np.float64)
+            queries = np.array(query_embeddings, dtype=np.float64)
+            matrix_norms = np.linalg.norm(matrix, axis=1)
+            query_norms = np.linalg.norm(queries, axis=1)
+            denominator = np.outer(query_norms, matrix_norms)
+            scores = np.divide(queries @ matrix.T, denominator, out=np.zeros_like(denominator), where=denominator > 0)
             
-            # 格式化结果
             search_results = []
-            for result in results:
-                search_result = {
-                    "text": result["text"],
-                    "metadata": result["metadata"],
-                    "similarity": result["similarity"],
-                    "literature_id": result["metadata"]["literature_id"],
-                    "chunk_index": result["metadata"]["chunk_index"],
-                    "literature_title": result["metadata"].get("literature_title", "")
-                }
-                search_results.append(search_result)
+            for row in scores:
+                # 按相似度排序，取前top_k个结果
+                order = np.argsort(-row, kind="stable")[:top_k]
+                chunks = []
+                for position in order:
+                    i = indices[position]
+                    metadata = collection["metadatas"][i]
+                    chunks.append({
+                        "text": collection["documents"][i],
+                        "metadata": metadata,
+                        "similarity": float(row[position]),
+                        "literature_id": metadata["literature_id"],
+                        "chunk_index": metadata["chunk_index"],
+                        "literature_title": metadata.get("literature_title", ""),
+                        "text_quality": metadata.get("text_quality")  # 旧数据没有该字段
+                    })
+                search_results.append(chunks)
             
-            logger.info(f"相似度搜索完成，返回 {len(search_results)} 个结果")
+            logger.info(f"相似度搜索完成，{len(query_embeddings)} 个查询")
             return search_results
             
         except Exception as e:
             logger.error(f"相似度搜索失败: {e}")
+            return empty
+    
+    # ====== 文档级摘要向量（跨文献问答的第一阶段检索） ======
+    
+    def _get_summary_collection(self, group_id: str) -> Dict:
+        """获取或创建文档级向量集合"""
+        name = f"{self.get_collection_name(group_id)}_docs"
+        if name not in self.collections:
+            self.collections[name] = {
+                "group_id": group_id,
+                "documents": [],
+                "embeddings": [],
+                "metadatas": [],
+                "ids": []
+            }
+        return self.collections[name]
+    
+    def store_document_summary(
+        self,
+        literature_id: str,
+        group_id: str,
+        embedding: List[float],
+        literature_title: str = "",
+        chunk_count: int = 0
+    ) -> bool:
+        """存储文献的文档级向量（已存在时覆盖）"""
+        if not embedding:
+            return False
+        try:
+            collection = self._get_summary_collection(group_id)
+            metadata = {
+                "literature_id": literature_id,
+                "group_id": group_id,
+                "literature_title": literature_title or "",
+                "chunk_count": chunk_count
+            }
+            if literature_id in collection["ids"]:
+                i = collection["ids"].index(literature_id)
+                collection["embeddings"][i] = embedding
+                collection["documents"][i] = literature_title or ""
+                collection["metadatas"][i] = metadata
+            else:
+                collection["ids"].append(literature_id)
+                collection["embeddings"].append(embedding)
+                collection["documents"].append(literature_title or "")
+                collection["metadatas"].append(metadata)
+            self._save_to_disk()
+            return True
+        except Exception as e:
+            logger.error(f"存储文档级向量失败: {e}")
+            return False
+    
+    def delete_document_summary(self, literature_id: str, group_id: str) -> bool:
+        """删除文献的文档级向量"""
+        try:
+            collection = self._get_summary_collection(group_id)
+            if literature_id in collection["ids"]:
+                i = collection["ids"].index(literature_id)
+                for key in ("ids", "documents", "embeddings", "metadatas"):
+                    collection[key].pop(i)
+            self._remove_hierarchical_entries(self._get_hierarchical_collection(group_id), literature_id)
+            self._save_to_disk()
+            return True
+        except Exception as e:
+            logger.error(f"删除文档级向量失败: {e}")
+            return False
+    
+    def rebuild_document_summary(self, literature_id: str, group_id: str, literature_title: str = "") -> bool:
+        """根据已存储的文本块向量重建文献的文档级向量"""
+        from .embedding_service import average_embedding
+        
+        collection = self.get_or_create_collection(group_id)
+        if not collection:
+            return False
+        indices = [
+            i for i, metadata in enumerate(collection["metadatas"])
+            if metadata.get("literature_id") == literature_id
+        ]
+        if not indices:
+            return False
+        embeddings = [collection["embeddings"][i] for i in indices]
+        stored = self.store_document_summary(
+            literature_id, group_id, average_embedding(embeddings), literature_title, len(embeddings)
+        )
+        
+        # 同时补建分层向量
+        if stored and settings.HIERARCHICAL_EMBEDDINGS_ENABLED:
+            from .hierarchical_embeddings import build_hierarchical_vectors
+            texts = [collection["documents"][i] for i in indices]
+            entries = build_hierarchical_vectors(literature_id, literature_title, texts, embeddings)
+            self.store_hierarchical_vectors(literature_id, group_id, entries, literature_title)
+        return stored
+    
+    def search_similar_documents(
+        self,
+        query_embedding: List[float],
+        group_id: str,
+        top_k: int
+    ) -> List[Dict]:
+        """按文档级向量检索最相关的文献"""
+        try:
+            collection = self._get_summary_collection(group_id)
+            if not collection["embeddings"]:
+                return []
+            
+            # 一次矩阵运算计算全部文献的相似度
+            matrix = np.asarray(collection["embeddings"], dtype=np.float32)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            similarities = np.divide(matrix @ query, norms, out=np.zeros(len(matrix), dtype=np.float32), where=norms > 0)
+            
+            top_k = min(top_k, len(similarities))
+            top_indices = np.argpartition(-similarities, top_k - 1)[:top_k]
+            top_indices = top_indices[np.argsort(-similarities[top_indices])]
+            
+            return [
+                {
+                    "literature_id": collection["metadatas"][i]["literature_id"],
+                    "literature_title": collection["metadatas"][i].get("literature_title", ""),
+                    "similarity": float(similarities[i])
+                }
+                for i in top_indices
+            ]
+        except Exception as e:
+            logger.error(f"文档级检索失败: {e}")
+            return []
+    
+    # ====== 分层向量（文档、标题/摘要、章节级） ======
+    
+    def _get_hierarchical_collection(self, group_id: str) -> Dict:
+        """获取或创建分层向量集合"""
+        name = f"{self.get_collection_name(group_id)}_sections"
+        if name not in self.collections:
+            self.collections[name] = {
+                "group_id": group_id,
+                "documents": [],
+                "embeddings": [],
+                "metadatas": [],
+                "ids": []
+            }
+        return self.collections[name]
+    
+    def _remove_hierarchical_entries(self, collection: Dict, literature_id: str) -> int:
+        """移除集合中某篇文献的全部分层向量，返回移除数量"""
+        keep = [
+            i for i, metadata in enumerate(collection["metadatas"])
+            if metadata.get("literature_id") != literature_id
+        ]
+        removed = len(collection["ids"]) - len(keep)
+        if removed:
+            for key in ("ids", "documents", "embeddings", "metadatas"):
+                collection[key] = [collection[key][i] for i in keep]
+        return removed
+    
+    def store_hierarchical_vectors(
+        self,
+        literature_id: str,
+        group_id: str,
+        entries: List[Dict],
+        literature_title: str = ""
+    ) -> bool:
+        """存储文献的分层向量（先删除该文献的旧向量）"""
+        if not entries:
+            return False
+        try:
+            collection = self._get_hierarchical_collection(group_id)
+            self._remove_hierarchical_entries(collection, literature_id)
+            for entry in entries:
+                collection["ids"].append(entry["vector_id"])
+                collection["embeddings"].append(entry["embedding"])
+                collection["documents"].append(literature_title or "")
+                collection["metadatas"].append({
+                    "literature_id": literature_id,
+                    "group_id": group_id,
+                    "literature_title": literature_title or "",
+                    "level": entry["level"],
+                    "section_type": entry["section_type"],
+                    "chunk_count": entry["chunk_count"]
+                })
+            self._save_to_disk()
+            return True
+        except Exception as e:
+            logger.error(f"存储分层向量失败: {e}")
+            return False
+    
+    def delete_hierarchical_vectors(self, literature_id: str, group_id: str) -> bool:
+        """删除文献的分层向量"""
+        try:
+            collection = self._get_hierarchical_collection(group_id)
+            if self._remove_hierarchical_entries(collection, literature_id):
+                self._save_to_disk()
+            return True
+        except Exception as e:
+            logger.error(f"删除分层向量失败: {e}")
+            return False
+    
+    def search_hierarchical_vectors(
+        self,
+        query_embedding: List[float],
+        group_id: str,
+        top_k: int,
+        levels: Optional[List[str]] = None,
+        literature_id: Optional[str] = None
+    ) -> List[Dict]:
+        """检索分层向量，可按层级和文献过滤"""
+        try:
+            collection = self._get_hierarchical_collection(group_id)
+            candidates = [
+                i for i, metadata in enumerate(collection["metadatas"])
+                if (not levels or metadata.get("level") in levels)
+                and (not literature_id or metadata.get("literature_id") == literature_id)
+            ]
+            if not candidates:
+                return []
+            
+            matrix = np.asarray([collection["embeddings"][i] for i in candidates], dtype=np.float32)
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            similarities = np.divide(matrix @ query, norms, out=np.zeros(len(matrix), dtype=np.float32), where=norms > 0)
+            
+            top_k = min(top_k, len(similarities))
+            top_indices = np.argpartition(-similarities, top_k - 1)[:top_k]
+            top_indices = top_indices[np.argsort(-similarities[top_indices])]
+            
+            results = []
+            for position in top_indices:
+                metadata = collection["metadatas"][candidates[position]]
+                results.append({
+                    "literature_id": metadata["literature_id"],
+                    "literature_title": metadata.get("literature_title", ""),
+                    "level": metadata.get("level", ""),
+                    "section_type": metadata.get("section_type", ""),
+                    "similarity": float(similarities[position])
+                })
+            return results
+        except Exception as e:
+            logger.error(f"分层向量检索失败: {e}")
             return []
     
     def get_collection_stats(self, group_id: str) -> Dict:
@@ -0,0 +1,160 @@
+"""
+问答流水线分阶段线程池模块
+为embedding、向量检索、大模型调用和CPU后处理分别提供独立、有上限的线程池，
+避免慢速的大模型调用占满默认线程池而阻塞廉价的向量检索
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+from app.config import settings
+from app.utils.error_handler import LiteratureSystemError
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 流水线阶段
+STAGE_EMBEDDING = "embedding"
+STAGE_VECTOR = "vector"
+STAGE_LLM = "llm"
+STAGE_CPU = "cpu"
+
+
+class StageOverloadedError(LiteratureSystemError):
+    """阶段线程池排队任务已满"""
+    pass
+
+
+class StageExecutor:
+    """单个阶段的线程池，记录排队长度和等待时间"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"rag-{name}")
+        self._lock = threading.Lock()
+
+        self._queued = 0
+        self._running = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "total_run_time": 0.0
+        }
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在本阶段线程池中执行同步函数
+
+        Args:
+            func: 要执行的函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            Any: 函数返回值
+
+        Raises:
+            StageOverloadedError: 排队任务数超过上限
+        """
+        with self._lock:
+            if self.max_queue > 0 and self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise StageOverloadedError(f"{self.name} 阶段繁忙，请稍后重试", "stage_overloaded")
+            self._queued += 1
+            self._stats["submitted"] += 1
+
+        enqueued_at = time.perf_counter()
+        call = partial(func, *args, **kwargs)
+        state = {"started": False}
+
+        def _timed_call():
+            started_at = time.perf_counter()
+            wait_time = started_at - enqueued_at
+            with self._lock:
+                state["started"] = True
+                self._queued -= 1
+                self._running += 1
+                self._stats["total_wait_time"] += wait_time
+                self._stats["max_wait_time"] = max(self._stats["max_wait_time"], wait_time)
+            succeeded = False
+            try:
+                result = call()
+                succeeded = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._stats["total_run_time"] += time.perf_counter() - started_at
+                    self._stats["completed" if succeeded else "failed"] += 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, _timed_call)
+        except asyncio.CancelledError:
+            # 请求在排队期间被取消时任务不会再执行，需要在这里扣减排队数
+            with self._lock:
+                if not state["started"]:
+                    self._queued -= 1
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取本阶段的容量和等待指标"""
+        with self._lock:
+            started = self._stats["completed"] + self._stats["failed"] + self._running
+            finished = self._stats["completed"] + self._stats["failed"]
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_length": self._queued,
+                "running": self._running,
+                "submitted": self._stats["submitted"],
+                "completed": self._stats["completed"],
+                "failed": self._stats["failed"],
+                "rejected": self._stats["rejected"],
+                "avg_wait_time": self._stats["total_wait_time"] / started if started else 0.0,
+                "max_wait_time": self._stats["max_wait_time"],
+                "avg_run_time": self._stats["total_run_time"] / finished if finished else 0.0
+            }
+
+    def shutdown(self):
+        """关闭线程池（不等待运行中的任务）"""
+        self._executor.shutdown(wait=False)
+
+
+# 创建各阶段的全局线程池
+stage_executors: Dict[str, StageExecutor] = {
+    STAGE_EMBEDDING: StageExecutor(STAGE_EMBEDDING, settings.RAG_EXECUTOR_EMBEDDING_WORKERS, settings.RAG_EXECUTOR_MAX_QUEUE),
+    STAGE_VECTOR: StageExecutor(STAGE_VECTOR, settings.RAG_EXECUTOR_VECTOR_WORKERS, settings.RAG_EXECUTOR_MAX_QUEUE),
+    STAGE_LLM: StageExecutor(STAGE_LLM, settings.RAG_EXECUTOR_LLM_WORKERS, settings.RAG_EXECUTOR_MAX_QUEUE),
+    STAGE_CPU: StageExecutor(STAGE_CPU, settings.RAG_EXECUTOR_CPU_WORKERS, settings.RAG_EXECUTOR_MAX_QUEUE)
+}
+
+
+async def run_in_stage(stage: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    便捷函数：在指定阶段的线程池中执行同步函数
+
+    Args:
+        stage: 阶段名称（embedding/vector/llm/cpu）
+        func: 要执行的函数
+        *args, **kwargs: 函数参数
+
+    Returns:
+        Any: 函数返回值
+    """
+    return await stage_executors[stage].run(func, *args, **kwargs)
+
+
+def get_stage_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有阶段线程池的指标"""
+    return {name: executor.get_stats() for name, executor in stage_executors.items()}
@@ -41,6 +41,8 @@ def extract_pdf_text_with_pymupdf(file_path: str) -> Optional[str]:
                 if page_text and page_text.strip():
                     text += page_text + "\n"
                     continue
+            except MemoryError:
+                raise
             except:
                 pass
             
@@ -65,6 +67,8 @@ def extract_pdf_text_with_pymupdf(file_path: str) -> Optional[str]:
                 if page_text.strip():
                     text += page_text + "\n"
                     continue
+            except MemoryError:
+                raise
             except:
                 pass
             
@@ -73,6 +77,8 @@ def extract_pdf_text_with_pymupdf(file_path: str) -> Optional[str]:
                 page_text = page.get_text()
                 if page_text and page_text.strip():
                     text += page_text + "\n"
+            except MemoryError:
+                raise
             except:
                 logger.warning(f"页面 {page_num + 1} 文本提取失败")
         
@@ -91,6 +97,9 @@ def extract_pdf_text_with_pymupdf(file_path: str) -> Optional[str]:
     except ImportError:
         logger.warning("PyMuPDF库未安装，回退到PyPDF2")
         return None
+    except MemoryError:
+        # 内存不足交给调用方（提取沙箱）处理，不能当作没有提取到文本
+        raise
     except Exception as e:
         logger.error(f"PyMuPDF提取PDF文本失败: {e}")
         return None
@@ -139,6 +148,8 @@ def extract_pdf_text(file_path: str) -> Optional[str]:
     except ImportError:
         logger.error("PyPDF2库未安装，无法提取PDF文本")
         return ""
+    except MemoryError:
+        raise
     except Exception as e:
         logger.error(f"PyPDF2提取PDF文本失败: {e}")
         return ""
@@ -276,6 +287,8 @@ def extract_docx_text(file_path: str) -> Optional[str]:
     except ImportError:
         logger.error("python-docx库未安装，无法提取DOCX文本")
         return ""
+    except MemoryError:
+        raise
     except Exception as e:
         logger.error(f"提取DOCX文本失败: {e}")
         return ""
@@ -319,6 +332,8 @@ def extract_html_text(file_path: str) -> Optional[str]:
     except ImportError:
         logger.error("beautifulsoup4库未安装，无法提取HTML文本")
         return ""
+    except MemoryError:
+        raise
     except Exception as e:
         logger.error(f"提取HTML文本失败: {e}")
         return ""
@@ -416,6 +431,9 @@ def extract_text_from_file(file_path: str) -> str:
         
     Returns:
         str: 提取的文本内容，失败时返回空字符串
+        
+    Raises:
+        MemoryError: 提取过程内存不足（如超出提取沙箱的内存限制）
     """
     file_ext = Path(file_path).suffix.lower()
     
@@ -430,6 +448,8 @@ def extract_text_from_file(file_path: str) -> str:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
                 text = file.read()
             return clean_extracted_text(text)
+        except MemoryError:
+            raise
         except Exception as e:
             logger.error(f"读取TXT文件失败: {e}")
             return ""
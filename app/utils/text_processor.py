@@ -130,6 +130,70 @@ def _force_split_text(text: str, chunk_size: int, overlap: int) -> List[str]:
     
     return chunks
 
+# 高价值的学术内容关键词
+HIGH_VALUE_KEYWORDS = (
+    # 中文关键词
+    '摘要', '结论', '创新', '贡献', '意义', '目的', '方法', '结果', 
+    '讨论', '背景', '研究', '发现', '提出', '证明', '表明', '显示',
+    '分析', '实验', '理论', '模型', '算法', '技术', '系统',
+    
+    # 英文关键词  
+    'abstract', 'conclusion', 'novelty', 'contribution', 'significance',
+    'purpose', 'method', 'result', 'discussion', 'background', 
+    'research', 'finding', 'propose', 'demonstrate', 'show', 'indicate',
+    'analysis', 'experiment', 'theory', 'model', 'algorithm', 'system',
+    'innovation', 'approach', 'framework', 'investigation', 'study'
+)
+
+# 低价值内容关键词（版权、格式等）
+LOW_VALUE_KEYWORDS = (
+    'creative commons', 'attribution', 'license', 'copyright', 
+    'permission', 'reproduce', 'distribution', 'doi.org',
+    '版权', '许可', '授权', '转载', '引用格式'
+)
+
+def evaluate_chunk_quality(text: str) -> float:
+    """
+    评估文本块的质量（只依赖文本内容，入库时计算一次并写入向量元数据）
+    
+    Args:
+        text: 文本内容
+        
+    Returns:
+        float: 质量分数 (0-1)
+    """
+    if not text:
+        return 0.0
+    
+    quality_score = 0.0
+    text_lower = text.lower()
+    
+    # 计算高价值关键词匹配度
+    high_value_matches = sum(1 for keyword in HIGH_VALUE_KEYWORDS if keyword in text_lower)
+    quality_score += min(high_value_matches * 0.1, 0.4)  # 最多0.4分
+    
+    # 检查低价值内容，降低分数
+    low_value_matches = sum(1 for keyword in LOW_VALUE_KEYWORDS if keyword in text_lower)
+    quality_score -= min(low_value_matches * 0.2, 0.3)  # 最多扣0.3分
+    
+    # 检查文本长度合理性
+    if 100 <= len(text) <= 2000:
+        quality_score += 0.2
+    elif len(text) < 50:
+        quality_score -= 0.2
+        
+    # 检查是否主要是数字和符号（低质量指标）
+    non_alphanumeric_ratio = sum(1 for c in text if not c.isalnum() and not c.isspace()) / len(text)
+    if non_alphanumeric_ratio > 0.3:
+        quality_score -= 0.2
+        
+    # 检查是否包含完整句子
+    sentence_count = len([s for s in text.split('.') if len(s.strip()) > 10])
+    if sentence_count >= 2:
+        quality_score += 0.1
+        
+    return max(0.0, min(1.0, quality_score))
+
 def prepare_chunks_for_embedding(
     chunks: List[str], 
     literature_id: str, 
@@ -158,6 +222,7 @@ def prepare_chunks_for_embedding(
             "group_id": group_id,
             "literature_title": literature_title,
             "chunk_length": len(chunk),
+            "text_quality": evaluate_chunk_quality(chunk),
             "chunk_id": f"{literature_id}_chunk_{i}"
         }
         prepared_chunks.append(chunk_data)
@@ -7,6 +7,7 @@ import os
 import logging
 from typing import List, Dict, Optional, Tuple
 from app.config import settings
+from app.utils.text_processor import evaluate_chunk_quality
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -195,7 +196,8 @@ class VectorStore:
                     "group_id": chunk["group_id"] if chunk["group_id"] is not None else "private",
                     "chunk_index": str(chunk["chunk_index"]),  # 确保是字符串
                     "literature_title": chunk.get("literature_title", ""),
-                    "chunk_length": str(chunk["chunk_length"])  # 确保是字符串
+                    "chunk_length": str(chunk["chunk_length"]),  # 确保是字符串
+                    "text_quality": float(chunk["text_quality"] if "text_quality" in chunk else evaluate_chunk_quality(chunk["text"]))
                 }
                 metadatas.append(metadata)
             
@@ -287,6 +289,59 @@ class VectorStore:
             logger.error(f"查询搜索失败: {e}")
             return []
     
+    def _chunk_where_condition(self, group_id: str, literature_id: Optional[str]) -> Dict:
+        """构建文档块检索的过滤条件"""
+        # 修复私人文献的group_id处理
+        actual_group_id = group_id if group_id is not None else "private"
+        
+        if literature_id:
+            # 如果指定了文献ID，同时过滤group_id和literature_id
+            return {
+                "$and": [
+                    {"group_id": {"$eq": actual_group_id}},
+                    {"literature_id": {"$eq": literature_id}}
+                ]
+            }
+        # 只过滤group_id
+        return {"group_id": {"$eq": actual_group_id}}
+    
+    def _format_chunk_results(self, results: Dict, query_index: int = 0) -> List[Dict]:
+        """将ChromaDB查询结果中第 query_index 个查询的结果格式化为文档块列表"""
+        search_results = []
+        documents = results.get("documents") or []
+        if query_index >= len(documents) or not documents[query_index]:
+            return search_results
+        
+        for i in range(len(documents[query_index])):
+            # 修复相似度计算：对于余弦距离，相似度 = 1 - 距离
+            # 但需要确保结果在合理范围内
+            distance = results["distances"][query_index][i]
+            
+            # ChromaDB默认使用L2距离，我们需要处理不同的距离度量
+            # 对于L2距离，我们使用基于距离的相似度计算
+            if distance <= 0:
+                similarity = 1.0  # 完全相同
+            elif distance >= 2.0:
+                similarity = 0.0  # 完全不相似
+            else:
+                # 将L2距离转换为0-1的相似度分数
+                similarity = max(0.0, 1.0 - (distance / 2.0))
+            
+            logger.debug(f"结果 {i}: raw_distance={distance:.4f}, calculated_similarity={similarity:.4f}")
+            
+            metadata = results["metadatas"][query_index][i]
+            search_results.append({
+                "text": documents[query_index][i],
+                "metadata": metadata,
+                "similarity": similarity,  # 现在应该在[0,1]范围内
+                "raw_distance": distance,  # 保留原始距离用于调试
+                "literature_id": metadata["literature_id"],
+                "chunk_index": metadata["chunk_index"],
+                "literature_title": metadata.get("literature_title", ""),
+                "text_quality": metadata.get("text_quality")  # 旧数据没有该字段
+            })
+        return search_results
+    
     def search_similar_chunks(
         self, 
         query_embedding: List[float], 
@@ -306,9 +361,35 @@ class VectorStore:
         Returns:
             List[Dict]: 搜索结果列表
         """
+        results = self.search_similar_chunks_batch([query_embedding], group_id, literature_id, top_k)
+        return results[0] if results else []
+    
+    def search_similar_chunks_batch(
+        self,
+        query_embeddings: List[List[float]],
+        group_id: str,
+        literature_id: Optional[str] = None,
+        top_k: int = None
+    ) -> List[List[Dict]]:
+        """
+        用一次查询为多个查询向量检索相似的文档块
+        
+        Args:
+            query_embeddings: 查询向量列表
+            group_id: 研究组ID
+            literature_id: 可选的文献ID（限制搜索范围）
+            top_k: 每个查询返回的最大结果数
+            
+        Returns:
+            List[List[Dict]]: 与查询向量一一对应的搜索结果列表
+        """
+        empty = [[] for _ in query_embeddings]
+        if not query_embeddings:
+            return empty
+        
         if not self.is_available():
             logger.error("向量数据库不可用")
-            return []
+            return empty
         
         top_k = top_k or settings.MAX_RETRIEVAL_DOCS
         
@@ -316,71 +397,335 @@ class VectorStore:
             collection = self.get_or_create_collection(group_id)
             if not collection:
                 logger.warning(f"研究组 {group_id} 的向量集合不存在")
-                return []
+                return empty
             
-            # 构建查询条件 - 修复私人文献的group_id处理
-            actual_group_id = group_id if group_id is not None else "private"
-            
-            if literature_id:
-                # 如果指定了文献ID，同时过滤group_id和literature_id
-                where_condition = {
-                    "$and": [
-                        {"group_id": {"$eq": actual_group_id}},
-                        {"literature_id": {"$eq": literature_id}}
-                    ]
-                }
-            else:
-                # 只过滤group_id
-                where_condition = {"group_id": {"$eq": actual_group_id}}
+            where_condition = self._chunk_where_condition(group_id, literature_id)
             
             # 执行相似度搜索
             results = collection.query(
-                query_embeddings=[query_embedding],
+                query_embeddings=query_embeddings,
                 n_results=top_k,
                 where=where_condition,
                 include=["documents", "metadatas", "distances"]
             )
             
-            logger.debug(f"ChromaDB查询参数: n_results={top_k}, where={where_condition}")
-            logger.debug(f"ChromaDB原始结果: {len(results.get('documents', [[]])[0])} 个文档")
-            
-            # 格式化结果
-            search_results = []
-            if results["documents"] and results["documents"][0]:
-                logger.debug("开始处理查询结果...")
-                for i in range(len(results["documents"][0])):
-                    # 修复相似度计算：对于余弦距离，相似度 = 1 - 距离
-                    # 但需要确保结果在合理范围内
-                    distance = results["distances"][0][i]
-                    
-                    # ChromaDB默认使用L2距离，我们需要处理不同的距离度量
-                    # 对于L2距离，我们使用基于距离的相似度计算
-                    if distance <= 0:
-                        similarity = 1.0  # 完全相同
-                    elif distance >= 2.0:
-                        similarity = 0.0  # 完全不相似
-                    else:
-                        # 将L2距离转换为0-1的相似度分数
-                        similarity = max(0.0, 1.0 - (distance / 2.0))
-                    
-                    logger.debug(f"结果 {i}: raw_distance={distance:.4f}, calculated_similarity={similarity:.4f}")
-                    
-                    result = {
-                        "text": results["documents"][0][i],
-                        "metadata": results["metadatas"][0][i],
-                        "similarity": similarity,  # 现在应该在[0,1]范围内
-                        "raw_distance": distance,  # 保留原始距离用于调试
-                        "literature_id": results["metadatas"][0][i]["literature_id"],
-                        "chunk_index": results["metadatas"][0][i]["chunk_index"],
-                        "literature_title": results["metadatas"][0][i].get("literature_title", "")
-                    }
-                    search_results.append(result)
-            
-            logger.info(f"相似度搜索完成，返回 {len(search_results)} 个结果")
+            logger.debug(f"ChromaDB查询参数: n_results={top_k}, where={where_condition}, 查询数={len(query_embeddings)}")
+            
+            search_results = [self._format_chunk_results(results, index) for index in range(len(query_embeddings))]
+            
+            logger.info(
+                f"相似度搜索完成，{len(query_embeddings)} 个查询共返回 "
+                f"{sum(len(chunks) for chunks in search_results)} 个结果"
+            )
             return search_results
             
         except Exception as e:
             logger.error(f"相似度搜索失败: {e}")
+            return empty
+    
+    # ====== 文档级摘要向量（跨文献问答的第一阶段检索） ======
+    
+    def get_summary_collection_name(self, group_id: str) -> str:
+        """获取研究组文档级向量集合名称"""
+        return f"{self.get_collection_name(group_id)}_docs"
+    
+    def _get_or_create_summary_collection(self, group_id: str):
+        """获取或创建文档级向量集合（使用余弦距离）"""
+        if not self.is_available():
+            return None
+        try:
+            return self.client.get_or_create_collection(
+                name=self.get_summary_collection_name(group_id),
+                metadata={
+                    "group_id": group_id if group_id is not None else "private",
+                    "hnsw:space": "cosine"
+                }
+            )
+        except Exception as e:
+            logger.error(f"获取文档级向量集合失败: {e}")
+            return None
+    
+    def store_document_summary(
+        self,
+        literature_id: str,
+        group_id: str,
+        embedding: List[float],
+        literature_title: str = "",
+        chunk_count: int = 0
+    ) -> bool:
+        """
+        存储文献的文档级向量
+        
+        Args:
+            literature_id: 文献ID
+            group_id: 研究组ID
+            embedding: 文档向量
+            literature_title: 文献标题
+            chunk_count: 文本块数量
+            
+        Returns:
+            bool: 是否存储成功
+        """
+        collection = self._get_or_create_summary_collection(group_id)
+        if not collection or not embedding:
+            return False
+        
+        try:
+            collection.upsert(
+                ids=[literature_id],
+                embeddings=[embedding],
+                documents=[literature_title or ""],
+                metadatas=[{
+                    "literature_id": literature_id,
+                    "group_id": group_id if group_id is not None else "private",
+                    "literature_title": literature_title or "",
+                    "chunk_count": str(chunk_count)
+                }]
+            )
+            return True
+        except Exception as e:
+            logger.error(f"存储文档级向量失败: {e}")
+            return False
+    
+    def delete_document_summary(self, literature_id: str, group_id: str) -> bool:
+        """删除文献的文档级向量"""
+        collection = self._get_or_create_summary_collection(group_id)
+        if not collection:
+            return False
+        try:
+            collection.delete(ids=[literature_id])
+            self.delete_hierarchical_vectors(literature_id, group_id)
+            return True
+        except Exception as e:
+            logger.error(f"删除文档级向量失败: {e}")
+            return False
+    
+    def rebuild_document_summary(self, literature_id: str, group_id: str, literature_title: str = "") -> bool:
+        """
+        根据已入库的文本块向量重建文献的文档级向量（用于历史文献补建和文献恢复）
+        
+        启用分层向量时会额外调用一次embedding接口生成标题/摘要向量。
+        
+        Args:
+            literature_id: 文献ID
+            group_id: 研究组ID
+            literature_title: 文献标题
+            
+        Returns:
+            bool: 是否重建成功
+        """
+        collection = self.get_or_create_collection(group_id)
+        if not collection:
+            return False
+        
+        try:
+            from .embedding_service import average_embedding
+            
+            results = collection.get(where={"literature_id": literature_id}, include=["embeddings", "documents"])
+            embeddings = results.get("embeddings")
+            if embeddings is None or len(embeddings) == 0:
+                return False
+            
+            embeddings = [list(vector) for vector in embeddings]
+            summary = average_embedding(embeddings)
+            stored = self.store_document_summary(
+                literature_id, group_id, summary, literature_title, len(embeddings)
+            )
+            
+            # 同时补建分层向量
+            if stored and settings.HIERARCHICAL_EMBEDDINGS_ENABLED:
+                from .hierarchical_embeddings import build_hierarchical_vectors
+                entries = build_hierarchical_vectors(
+                    literature_id, literature_title, list(results.get("documents") or []), embeddings
+                )
+                self.store_hierarchical_vectors(literature_id, group_id, entries, literature_title)
+            return stored
+        except Exception as e:
+            logger.error(f"重建文档级向量失败: {e}")
+            return False
+    
+    def search_similar_documents(
+        self,
+        query_embedding: List[float],
+        group_id: str,
+        top_k: int
+    ) -> List[Dict]:
+        """
+        按文档级向量检索最相关的文献
+        
+        Args:
+            query_embedding: 查询向量
+            group_id: 研究组ID
+            top_k: 返回的文献数量
+            
+        Returns:
+            List[Dict]: [{"literature_id", "literature_title", "similarity"}]
+        """
+        collection = self._get_or_create_summary_collection(group_id)
+        if not collection:
+            return []
+        
+        try:
+            total = collection.count()
+            if total == 0:
+                return []
+            
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=min(top_k, total),
+                include=["metadatas", "distances"]
+            )
+            
+            documents = []
+            for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+                documents.append({
+                    "literature_id": metadata["literature_id"],
+                    "literature_title": metadata.get("literature_title", ""),
+                    # 余弦距离转换为相似度
+                    "similarity": max(0.0, 1.0 - distance)
+                })
+            return documents
+        except Exception as e:
+            logger.error(f"文档级检索失败: {e}")
+            return []
+    
+    # ====== 分层向量（文档、标题/摘要、章节级，独立集合和索引） ======
+    
+    def get_hierarchical_collection_name(self, group_id: str) -> str:
+        """获取研究组分层向量集合名称"""
+        return f"{self.get_collection_name(group_id)}_sections"
+    
+    def _get_or_create_hierarchical_collection(self, group_id: str):
+        """获取或创建分层向量集合（使用余弦距离）"""
+        if not self.is_available():
+            return None
+        try:
+            return self.client.get_or_create_collection(
+                name=self.get_hierarchical_collection_name(group_id),
+                metadata={
+                    "group_id": group_id if group_id is not None else "private",
+                    "hnsw:space": "cosine"
+                }
+            )
+        except Exception as e:
+            logger.error(f"获取分层向量集合失败: {e}")
+            return None
+    
+    def store_hierarchical_vectors(
+        self,
+        literature_id: str,
+        group_id: str,
+        entries: List[Dict],
+        literature_title: str = ""
+    ) -> bool:
+        """
+        存储文献的分层向量（先删除该文献的旧向量）
+        
+        Args:
+            literature_id: 文献ID
+            group_id: 研究组ID
+            entries: build_hierarchical_vectors 生成的向量条目
+            literature_title: 文献标题
+            
+        Returns:
+            bool: 是否存储成功
+        """
+        collection = self._get_or_create_hierarchical_collection(group_id)
+        if not collection or not entries:
+            return False
+        
+        try:
+            collection.delete(where={"literature_id": literature_id})
+            collection.add(
+                ids=[entry["vector_id"] for entry in entries],
+                embeddings=[entry["embedding"] for entry in entries],
+                documents=[literature_title or "" for _ in entries],
+                metadatas=[{
+                    "literature_id": literature_id,
+                    "group_id": group_id if group_id is not None else "private",
+                    "literature_title": literature_title or "",
+                    "level": entry["level"],
+                    "section_type": entry["section_type"],
+                    "chunk_count": str(entry["chunk_count"])
+                } for entry in entries]
+            )
+            return True
+        except Exception as e:
+            logger.error(f"存储分层向量失败: {e}")
+            return False
+    
+    def delete_hierarchical_vectors(self, literature_id: str, group_id: str) -> bool:
+        """删除文献的分层向量"""
+        collection = self._get_or_create_hierarchical_collection(group_id)
+        if not collection:
+            return False
+        try:
+            collection.delete(where={"literature_id": literature_id})
+            return True
+        except Exception as e:
+            logger.error(f"删除分层向量失败: {e}")
+            return False
+    
+    def search_hierarchical_vectors(
+        self,
+        query_embedding: List[float],
+        group_id: str,
+        top_k: int,
+        levels: Optional[List[str]] = None,
+        literature_id: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        检索分层向量
+        
+        Args:
+            query_embedding: 查询向量
+            group_id: 研究组ID
+            top_k: 返回数量
+            levels: 限定的层级（document/title/section），为空时不限
+            literature_id: 限定的文献ID（可选）
+            
+        Returns:
+            List[Dict]: [{"literature_id", "literature_title", "level", "section_type", "similarity"}]
+        """
+        collection = self._get_or_create_hierarchical_collection(group_id)
+        if not collection:
+            return []
+        
+        conditions = []
+        if levels:
+            conditions.append({"level": {"$in": list(levels)}})
+        if literature_id:
+            conditions.append({"literature_id": literature_id})
+        where = None
+        if len(conditions) == 1:
+            where = conditions[0]
+        elif conditions:
+            where = {"$and": conditions}
+        
+        try:
+            total = collection.count()
+            if total == 0:
+                return []
+            
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=min(top_k, total),
+                where=where,
+                include=["metadatas", "distances"]
+            )
+            
+            return [
+                {
+                    "literature_id": metadata["literature_id"],
+                    "literature_title": metadata.get("literature_title", ""),
+                    "level": metadata.get("level", ""),
+                    "section_type": metadata.get("section_type", ""),
+                    "similarity": max(0.0, 1.0 - distance)
+                }
+                for metadata, distance in zip(results["metadatas"][0], results["distances"][0])
+            ]
+        except Exception as e:
+            logger.error(f"分层向量检索失败: {e}")
             return []
     
     def get_collection_stats(self, group_id: str) -> Dict:
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+批量问答流式接口测试
+
+使用替身服务验证客户端中途断开时已推送的答案仍会保存，无需数据库和API密钥
+"""
+import sys
+import os
+import json
+import asyncio
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routers import ai_chat
+
+class FakeLiterature:
+    id = "lit-1"
+    research_group_id = "group-1"
+
+class FakeQuery:
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return FakeLiterature()
+
+class FakeDB:
+    def query(self, *args):
+        return FakeQuery()
+
+    def close(self):
+        pass
+
+class FakeUser:
+    id = 1
+
+class FakeRagService:
+    """按顺序返回答案的RAG服务替身"""
+
+    async def process_question_batch(self, questions, literature_id, group_id, session_id=None, top_k=None):
+        for index, question in enumerate(questions):
+            await asyncio.sleep(0)
+            yield index, {
+                "answer": f"答案{index}",
+                "key_findings": [],
+                "limitations": "",
+                "sources": [],
+                "confidence": 0.8,
+                "quality_score": {},
+                "metadata": {"processing_time": 0.01, "chunks_retrieved": 1}
+            }
+
+class FakeWriter:
+    """记录登记内容的对话写入器替身"""
+
+    def __init__(self):
+        self.saved = []
+
+    def get_or_create_session(self, user_id, group_id, literature_id, session_id=None, db=None):
+        return "session-1"
+
+    def add_qa_turns(self, session_id, turns, db=None):
+        self.saved.append((session_id, list(turns)))
+        return [turn["turn_id"] for turn in turns]
+
+def parse_event(chunk: str):
+    """解析单个SSE事件"""
+    lines = chunk.strip().split("\n")
+    return lines[0][len("event: "):], json.loads(lines[1][len("data: "):])
+
+def run_batch(questions, consume):
+    """替换依赖后调用批量问答接口，consume 负责读取事件流"""
+    writer = FakeWriter()
+    originals = (ai_chat.rag_service, ai_chat.conversation_writer, ai_chat._check_literature_access, ai_chat.SessionLocal)
+    ai_chat.rag_service = FakeRagService()
+    ai_chat.conversation_writer = writer
+    ai_chat._check_literature_access = lambda user_id, literature, db: True
+    ai_chat.SessionLocal = FakeDB
+    try:
+        request = ai_chat.BatchQARequest(questions=questions, literature_id="lit-1")
+
+        async def run():
+            response = await ai_chat.ask_question_batch(request, current_user=FakeUser(), db=FakeDB())
+            return await consume(response.body_iterator)
+
+        return writer, asyncio.run(run())
+    finally:
+        ai_chat.rag_service, ai_chat.conversation_writer, ai_chat._check_literature_access, ai_chat.SessionLocal = originals
+
+def test_batch_saves_all_turns():
+    """测试正常结束时全部轮次一次性登记"""
+    print("📦 测试批量问答完整保存...")
+
+    async def consume(stream):
+        return [parse_event(chunk) async for chunk in stream]
+
+    writer, events = run_batch(["问题一", "问题二", "问题三"], consume)
+    done = [data for event, data in events if event == "done"]
+    answered = [data["turn_id"] for event, data in events if event == "answer"]
+    print(f"登记次数: {len(writer.saved)}，done事件: {len(done)}")
+
+    if len(writer.saved) == 1 and done and done[0]["turn_ids"] == [turn["turn_id"] for turn in writer.saved[0][1]] \
+            and sorted(answered) == sorted(done[0]["turn_ids"]):
+        print("✅ 全部轮次在一次登记中保存")
+        return True
+    print("❌ 轮次保存不完整")
+    return False
+
+def test_batch_saves_answered_turns_on_disconnect():
+    """测试客户端中途断开时已推送的轮次仍会保存"""
+    print("\n🔌 测试批量问答中途断开...")
+
+    async def consume(stream):
+        events = []
+        async for chunk in stream:
+            events.append(parse_event(chunk))
+            if sum(1 for event, _ in events if event == "answer") == 2:
+                break
+        # 模拟客户端断开：关闭事件流
+        await stream.aclose()
+        return events
+
+    writer, events = run_batch(["问题一", "问题二", "问题三"], consume)
+    answered = [data["turn_id"] for event, data in events if event == "answer"]
+    saved = [turn["turn_id"] for _, turns in writer.saved for turn in turns]
+    print(f"已推送轮次: {len(answered)}，已保存轮次: {len(saved)}")
+
+    if len(writer.saved) == 1 and sorted(saved) == sorted(answered) and len(saved) == 2:
+        print("✅ 已推送的答案在断开后保存")
+        return True
+    print("❌ 断开后已推送的答案丢失")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始批量问答流式接口测试...")
+    print("=" * 50)
+
+    tests = [
+        ("完整保存测试", test_batch_saves_all_turns),
+        ("中途断开测试", test_batch_saves_answered_turns_on_disconnect)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
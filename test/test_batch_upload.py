@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+批量上传存储测试
+
+验证单批次总大小限制在写入磁盘前（按上传文件的已知大小）和写入过程中（按剩余额度截止）都生效
+"""
+import sys
+import os
+import io
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import main as main_module
+from app.config import settings
+
+class FakeUpload:
+    """直接上传文件的替身"""
+
+    def __init__(self, filename: str, content: bytes, size=None):
+        self.filename = filename
+        self.file = io.BytesIO(content)
+        self.size = size
+
+def store_files(files, total_limit: int):
+    """在临时目录中执行批量存储"""
+    storage_root = tempfile.mkdtemp()
+    original_limit = settings.MAX_BATCH_TOTAL_SIZE
+    original_path = main_module.generate_file_path
+    settings.MAX_BATCH_TOTAL_SIZE = total_limit
+    main_module.generate_file_path = lambda storage_dir, filename: (
+        os.path.join(storage_root, storage_dir, filename), os.path.join(storage_dir, filename)
+    )
+    try:
+        stored, rejected = main_module._store_batch_files(files, None, "group-1")
+    finally:
+        settings.MAX_BATCH_TOTAL_SIZE = original_limit
+        main_module.generate_file_path = original_path
+    on_disk = []
+    for root, _, names in os.walk(storage_root):
+        on_disk.extend(names)
+    return stored, rejected, sorted(on_disk)
+
+def test_known_size_rejected_before_write():
+    """测试已知大小超出剩余额度的文件不写入磁盘"""
+    print("📏 测试按已知大小拒绝...")
+
+    files = [
+        FakeUpload("a.pdf", b"a" * 600, size=600),
+        FakeUpload("b.pdf", b"b" * 600, size=600)
+    ]
+    stored, rejected, on_disk = store_files(files, total_limit=1000)
+    print(f"已保存: {[item['filename'] for item in stored]}，拒绝: {[item.filename for item in rejected]}，磁盘文件: {on_disk}")
+
+    if [item["filename"] for item in stored] == ["a.pdf"] and [item.filename for item in rejected] == ["b.pdf"] \
+            and on_disk == ["a.pdf"] and "总大小" in rejected[0].message:
+        print("✅ 超出总大小的文件在写入前被拒绝")
+        return True
+    print("❌ 超出总大小的文件被写入磁盘")
+    return False
+
+def test_unknown_size_stopped_while_writing():
+    """测试大小未知的文件写入超过剩余额度时中止并删除"""
+    print("\n✂️ 测试写入过程中截止...")
+
+    files = [
+        FakeUpload("a.pdf", b"a" * 600),
+        FakeUpload("b.pdf", b"b" * 600)
+    ]
+    stored, rejected, on_disk = store_files(files, total_limit=1000)
+    print(f"已保存: {[item['filename'] for item in stored]}，拒绝: {[item.filename for item in rejected]}，磁盘文件: {on_disk}")
+
+    if [item["filename"] for item in stored] == ["a.pdf"] and [item.filename for item in rejected] == ["b.pdf"] \
+            and on_disk == ["a.pdf"]:
+        print("✅ 超出剩余额度的部分文件已删除")
+        return True
+    print("❌ 超出总大小的文件留在磁盘上")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始批量上传存储测试...")
+    print("=" * 50)
+
+    tests = [
+        ("已知大小拒绝测试", test_known_size_rejected_before_write),
+        ("写入截止测试", test_unknown_size_stopped_while_writing)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
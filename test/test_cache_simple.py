@@ -206,6 +206,106 @@ def test_cache_performance():
         print(f"❌ 缓存性能测试失败: {e}")
         return False
 
+def test_semantic_answer_cache():
+    """测试语义答案缓存"""
+    print("\n🧠 测试语义答案缓存...")
+    
+    try:
+        from app.utils.cache_manager import SemanticAnswerCache
+        
+        cache = SemanticAnswerCache(threshold=0.9, max_per_literature=2, max_literatures=10, ttl=3600)
+        answer = {"answer": "主要结论是……", "metadata": {}}
+        cache.add("lit1", "这篇文章的主要结论是什么", [1.0, 0.0, 0.1], 1, answer)
+        
+        # 相近问题命中
+        hit = cache.lookup("lit1", [0.98, 0.02, 0.1], 1)
+        print(f"相近问题: {hit[1] if hit else None}")
+        if hit is None:
+            print("❌ 相近问题未命中")
+            return False
+        
+        # 不相关问题不命中
+        if cache.lookup("lit1", [0.0, 1.0, 0.0], 1) is not None:
+            print("❌ 不相关问题被误命中")
+            return False
+        
+        # 文献向量版本变化后失效
+        if cache.lookup("lit1", [1.0, 0.0, 0.1], 2) is not None:
+            print("❌ 向量版本变化后缓存未失效")
+            return False
+        
+        # 误命中会移除条目
+        cache.add("lit1", "文章主要结论？", [1.0, 0.0, 0.1], 2, answer)
+        entry_id = cache.lookup("lit1", [1.0, 0.0, 0.1], 2)[1]["entry_id"]
+        cache.record_false_hit("lit1", entry_id)
+        
+        info = cache.info()
+        print(f"缓存指标: {info}")
+        if cache.size() != 0 or info["false_hits"] != 1 or info["invalidations"] != 1:
+            print("❌ 误命中或失效指标错误")
+            return False
+        
+        print("✅ 语义答案缓存工作正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 语义答案缓存测试失败: {e}")
+        return False
+
+def test_retrieval_cache():
+    """测试检索结果缓存"""
+    print("\n🔍 测试检索结果缓存...")
+    
+    try:
+        from app.utils.cache_manager import CacheManager, CacheKeyGenerator
+        
+        manager = CacheManager()
+        chunks = [
+            {"text": "结论一", "chunk_index": "3", "similarity": 0.8, "final_score": 0.7, "text_quality": 0.6},
+            {"text": "结论二", "chunk_index": "7", "similarity": 0.6, "final_score": 0.5, "text_quality": 0.4}
+        ]
+        manager.set_retrieval("lit1", "这篇文章的主要结论是什么？", 5, 1, chunks, [0.1, 0.2])
+        
+        # 标点和空白不同的同一问题命中
+        key_a = CacheKeyGenerator.retrieval_key("lit1", "这篇文章的主要结论是什么？", 5, 1)
+        key_b = CacheKeyGenerator.retrieval_key("lit1", "这篇文章的 主要结论是什么?", 5, 1)
+        print(f"标准化后键一致: {key_a == key_b}")
+        
+        hits_before = manager.stats.hits
+        hit = manager.get_retrieval("lit1", "这篇文章的 主要结论是什么?", 5, 1)
+        if hit is None or [c["chunk_index"] for c in hit[0]] != ["3", "7"] or hit[0][0]["similarity"] != 0.8:
+            print("❌ 检索缓存未正确命中")
+            return False
+        # 文档块缓存和检索缓存各记一次命中
+        if manager.stats.hits - hits_before != 2:
+            print("❌ 检索缓存命中未计入统计")
+            return False
+        
+        # 向量版本或 top_k 不同则不命中
+        if manager.get_retrieval("lit1", "这篇文章的主要结论是什么？", 5, 2) is not None:
+            print("❌ 向量版本变化后检索缓存未失效")
+            return False
+        if manager.get_retrieval("lit1", "这篇文章的主要结论是什么？", 3, 1) is not None:
+            print("❌ top_k 不同时错误命中")
+            return False
+        
+        # 文档块已被淘汰时视为未命中，并计入统计
+        manager.chunk_cache.delete(CacheKeyGenerator.chunk_key("lit1", "7"))
+        misses_before = manager.stats.misses
+        if manager.get_retrieval("lit1", "这篇文章的主要结论是什么？", 5, 1) is not None:
+            print("❌ 文档块淘汰后检索缓存错误命中")
+            return False
+        if manager.stats.misses - misses_before != 2:
+            print("❌ 文档块淘汰后的未命中未计入统计")
+            return False
+        
+        print("✅ 检索结果缓存工作正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 检索结果缓存测试失败: {e}")
+        return False
+
 def main():
     """主测试函数"""
     print("🚀 开始简化缓存系统测试...")
@@ -216,7 +316,9 @@ def main():
         ("键生成器测试", test_cache_key_generator),
         ("内存缓存后端测试", test_memory_cache_backend),
         ("缓存统计测试", test_cache_stats),
-        ("缓存性能测试", test_cache_performance)
+        ("缓存性能测试", test_cache_performance),
+        ("语义答案缓存测试", test_semantic_answer_cache),
+        ("检索结果缓存测试", test_retrieval_cache)
     ]
     
     passed = 0
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+对话异步写入测试
+
+使用临时SQLite数据库验证批量写入、失败重试、写入单元的原子性、
+待写状态等待、关闭时写完以及写入器未运行时的同步回退
+"""
+import sys
+import os
+import time
+import tempfile
+import threading
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.conversation import QASession, ConversationTurn
+from app.utils import conversation_writer as writer_module
+from app.utils.conversation_writer import ConversationWriter
+
+# 临时数据库，避免写入 literature_system.db
+_db_dir = tempfile.mkdtemp()
+engine = create_engine(f"sqlite:///{os.path.join(_db_dir, 'writer_test.db')}", connect_args={"check_same_thread": False})
+TestSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+QASession.metadata.create_all(engine)
+writer_module.SessionLocal = TestSession
+
+def make_writer(batch_size: int = 50, flush_interval: float = 0.2) -> ConversationWriter:
+    """创建并启动一个写入器"""
+    writer = ConversationWriter()
+    writer.batch_size = batch_size
+    writer.flush_interval = flush_interval
+    writer.start()
+    return writer
+
+def saved_turns(session_id: str):
+    """查询会话已写入的轮次序号"""
+    db = TestSession()
+    try:
+        return [
+            turn.turn_index for turn in db.query(ConversationTurn).filter(
+                ConversationTurn.session_id == session_id
+            ).order_by(ConversationTurn.turn_index).all()
+        ]
+    finally:
+        db.close()
+
+def questions(count: int, prefix: str = "问题"):
+    return [{"question": f"{prefix}{i}", "answer": f"答案{i}", "confidence": 0.8} for i in range(count)]
+
+def test_batch_failure_retried_per_unit():
+    """测试整批失败后逐个单元重试，只丢弃无法写入的单元"""
+    print("🔁 测试整批失败后逐个单元重试...")
+
+    writer = make_writer(flush_interval=0.5)
+    db = TestSession()
+    try:
+        session_id = writer.get_or_create_session(1, "group-1", "lit-1", db=db)
+        writer.add_qa_turns(session_id, questions(3), db=db)
+        # 会话不存在的单元会让整批事务失败
+        writer.add_qa_turns("missing-session", questions(2), db=db)
+    finally:
+        db.close()
+    writer.stop()
+    stats = writer.get_stats()
+    print(f"写入统计: {stats}")
+
+    if saved_turns(session_id) == [1, 2, 3] and saved_turns("missing-session") == [] \
+            and stats["batches"] == 0 and stats["failed"] == 2 and stats["turns"] == 3 and stats["sessions"] == 1:
+        print("✅ 失败单元被丢弃，其他单元重试后写入")
+        return True
+    print("❌ 整批失败后的重试结果不正确")
+    return False
+
+def test_turns_written_as_one_unit():
+    """测试同一次登记的轮次不被拆分，写入失败时全部不保存"""
+    print("\n🧱 测试写入单元的原子性...")
+
+    writer = make_writer(batch_size=2)
+    db = TestSession()
+    try:
+        session_id = writer.get_or_create_session(1, "group-1", "lit-1", db=db)
+        writer.add_qa_turns(session_id, questions(5), db=db)
+        # 第二个轮次缺少问题，违反非空约束，整个单元都不应写入
+        broken = questions(3, "坏问题")
+        broken[1]["question"] = None
+        writer.add_qa_turns(session_id, broken, db=db)
+    finally:
+        db.close()
+    writer.stop()
+    stats = writer.get_stats()
+    turns = saved_turns(session_id)
+    print(f"已写入轮次: {turns}，写入统计: {stats}")
+
+    # 批次上限为2，但5个轮次仍在同一个单元中写入
+    if turns == [1, 2, 3, 4, 5] and stats["failed"] == 3:
+        print("✅ 同一次登记的轮次整体写入或整体丢弃")
+        return True
+    print("❌ 写入单元被拆分")
+    return False
+
+def test_wait_for_pending_writes():
+    """测试等待待写的轮次和会话会在写入后被唤醒"""
+    print("\n⏳ 测试等待待写记录...")
+
+    writer = make_writer(flush_interval=0.3)
+    db = TestSession()
+    try:
+        session_id = writer.get_or_create_session(1, "group-1", "lit-1", db=db)
+        turn_id = writer.add_qa_turn(session_id, "问题", answer="答案", db=db)
+        pending = writer.is_pending_turn(turn_id) and writer.is_pending_session(session_id)
+
+        session_result = {}
+
+        def wait_session():
+            session_result["ok"] = writer.wait_for_session(session_id, timeout=5)
+
+        waiter = threading.Thread(target=wait_session)
+        waiter.start()
+        start = time.perf_counter()
+        turn_ok = writer.wait_for_turn(turn_id, timeout=5)
+        elapsed = time.perf_counter() - start
+        waiter.join(5)
+    finally:
+        db.close()
+    writer.stop()
+    print(f"登记后待写: {pending}，等待耗时: {elapsed:.2f}秒")
+
+    if pending and turn_ok and session_result.get("ok") and elapsed < 2 and saved_turns(session_id) == [1] \
+            and not writer.is_pending_turn(turn_id) and not writer.is_pending_session(session_id):
+        print("✅ 写入后等待方被唤醒")
+        return True
+    print("❌ 等待待写记录失败")
+    return False
+
+def test_stop_flushes_queue():
+    """测试停止时写完队列中的全部记录"""
+    print("\n🛑 测试停止时写完队列...")
+
+    # 攒批等待时间远大于测试时长，只有停止信号会触发写入
+    writer = make_writer(flush_interval=30)
+    db = TestSession()
+    try:
+        session_ids = []
+        for i in range(5):
+            session_id = writer.get_or_create_session(1, "group-1", f"lit-{i}", db=db)
+            writer.add_qa_turns(session_id, questions(2), db=db)
+            session_ids.append(session_id)
+    finally:
+        db.close()
+    start = time.perf_counter()
+    finished = writer.stop(timeout=5)
+    elapsed = time.perf_counter() - start
+    print(f"停止耗时: {elapsed:.2f}秒，统计: {writer.get_stats()}")
+
+    if finished and elapsed < 5 and all(saved_turns(session_id) == [1, 2] for session_id in session_ids) \
+            and writer.get_stats()["queued"] == 0:
+        print("✅ 停止前写完全部记录")
+        return True
+    print("❌ 停止时有记录未写入")
+    return False
+
+def test_sync_fallback_when_not_running():
+    """测试写入器未运行时回退为同步写入"""
+    print("\n↩️ 测试同步回退...")
+
+    writer = ConversationWriter()
+    db = TestSession()
+    try:
+        session_id = writer.get_or_create_session(1, "group-1", "lit-1", db=db)
+        turn_ids = writer.add_qa_turns(session_id, questions(2), db=db)
+    finally:
+        db.close()
+    turns = saved_turns(session_id)
+    print(f"返回轮次: {len(turn_ids)}，已写入轮次: {turns}")
+
+    if turns == [1, 2] and len(turn_ids) == 2 and not writer.is_pending_session(session_id) \
+            and writer.get_stats()["queued"] == 0:
+        print("✅ 未运行时直接写入数据库")
+        return True
+    print("❌ 同步回退失败")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始对话异步写入测试...")
+    print("=" * 50)
+
+    tests = [
+        ("失败重试测试", test_batch_failure_retried_per_unit),
+        ("写入单元原子性测试", test_turns_written_as_one_unit),
+        ("待写等待测试", test_wait_for_pending_writes),
+        ("停止写完测试", test_stop_flushes_queue),
+        ("同步回退测试", test_sync_fallback_when_not_running)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
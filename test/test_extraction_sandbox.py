@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+文本提取沙箱测试
+
+验证正常提取、超时终止子进程、超出内存限制时返回 extraction_memory，
+以及PDF提取不会把内存不足吞掉变成空文本
+"""
+import sys
+import os
+import time
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.utils import text_extractor
+from app.utils.extraction_sandbox import ExtractionSandbox, ExtractionError
+
+def test_sandbox_extracts_text():
+    """测试子进程正常提取文本"""
+    print("📄 测试沙箱提取...")
+
+    sandbox = ExtractionSandbox()
+    try:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+            f.write("沙箱中的文献内容")
+        text = sandbox.extract_text(f.name, timeout=30)
+        stats = sandbox.get_stats()
+    finally:
+        sandbox.shutdown()
+        os.unlink(f.name)
+    print(f"提取结果: {text}，统计: {stats}")
+
+    if "沙箱中的文献内容" in text and stats["extracted"] == 1 and stats["idle_workers"] == 1:
+        print("✅ 子进程提取成功并回到空闲池")
+        return True
+    print("❌ 沙箱提取失败")
+    return False
+
+def test_sandbox_timeout():
+    """测试提取超时时终止子进程"""
+    print("\n⏱️ 测试提取超时...")
+
+    if not hasattr(os, "mkfifo"):
+        print("⚠️ 当前平台不支持命名管道，跳过")
+        return True
+
+    sandbox = ExtractionSandbox()
+    fifo_dir = tempfile.mkdtemp()
+    # 没有写入方的命名管道会让子进程在打开文件时一直阻塞
+    fifo_path = os.path.join(fifo_dir, "blocked.txt")
+    os.mkfifo(fifo_path)
+    error_type = None
+    try:
+        start = time.perf_counter()
+        try:
+            sandbox.extract_text(fifo_path, timeout=3)
+        except ExtractionError as e:
+            error_type = e.error_code
+        elapsed = time.perf_counter() - start
+        stats = sandbox.get_stats()
+    finally:
+        sandbox.shutdown()
+        os.unlink(fifo_path)
+        os.rmdir(fifo_dir)
+    print(f"错误类型: {error_type}，耗时: {elapsed:.2f}秒，统计: {stats}")
+
+    if error_type == "extraction_timeout" and elapsed < 10 and stats["timeouts"] == 1 and stats["idle_workers"] == 0:
+        print("✅ 超时后子进程被终止")
+        return True
+    print("❌ 超时处理错误")
+    return False
+
+def test_sandbox_memory_limit():
+    """测试超出内存限制时返回 extraction_memory"""
+    print("\n🧠 测试内存限制...")
+
+    original_limit = settings.EXTRACTION_MEMORY_LIMIT_MB
+    settings.EXTRACTION_MEMORY_LIMIT_MB = 512
+    sandbox = ExtractionSandbox()
+    # 稀疏文件不占用磁盘，但读取时需要分配超过上限的内存
+    with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as f:
+        f.truncate(1024 * 1024 * 1024)
+    error_type = None
+    try:
+        try:
+            sandbox.extract_text(f.name, timeout=60)
+        except ExtractionError as e:
+            error_type = e.error_code
+        stats = sandbox.get_stats()
+    finally:
+        settings.EXTRACTION_MEMORY_LIMIT_MB = original_limit
+        sandbox.shutdown()
+        os.unlink(f.name)
+    print(f"错误类型: {error_type}，统计: {stats}")
+
+    if error_type == "extraction_memory" and stats["memory_errors"] == 1 and stats["idle_workers"] == 0:
+        print("✅ 超出内存限制被识别并丢弃子进程")
+        return True
+    print("❌ 内存超限未被识别")
+    return False
+
+def test_pdf_memory_error_propagates():
+    """测试PDF提取时内存不足向上抛出，而不是返回空文本"""
+    print("\n📕 测试PDF提取的内存不足...")
+
+    try:
+        import fitz
+    except ImportError:
+        print("⚠️ PyMuPDF未安装，跳过")
+        return True
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        pdf_path = f.name
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "memory test")
+    doc.save(pdf_path)
+    doc.close()
+
+    def exhausted(text):
+        raise MemoryError()
+
+    original_clean = text_extractor.clean_extracted_text
+    text_extractor.clean_extracted_text = exhausted
+    raised = False
+    try:
+        text_extractor.extract_text_from_file(pdf_path)
+    except MemoryError:
+        raised = True
+    finally:
+        text_extractor.clean_extracted_text = original_clean
+        os.unlink(pdf_path)
+    print(f"抛出MemoryError: {raised}")
+
+    if raised:
+        print("✅ PDF提取的内存不足交给沙箱处理")
+        return True
+    print("❌ 内存不足被当作空文本")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始文本提取沙箱测试...")
+    print("=" * 50)
+
+    tests = [
+        ("沙箱提取测试", test_sandbox_extracts_text),
+        ("提取超时测试", test_sandbox_timeout),
+        ("内存限制测试", test_sandbox_memory_limit),
+        ("PDF内存不足测试", test_pdf_memory_error_propagates)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
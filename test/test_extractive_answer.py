@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+抽取式答案测试
+
+验证句子选取、来源引用和答案结构，以及在本地完成的耗时
+"""
+import sys
+import os
+import time
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.extractive_answer import build_extractive_answer, select_sentences, split_sentences
+from app.utils.answer_processor import AnswerProcessor
+
+CONTEXT_CHUNKS = [
+    {
+        "text": "本研究采用随机对照试验方法，共招募了240名受试者。受试者被随机分为实验组和对照组。",
+        "similarity": 0.82
+    },
+    {
+        "text": "实验结果表明，干预组的焦虑评分显著降低。该效果在三个月随访中仍然保持。",
+        "similarity": 0.75
+    },
+    {
+        "text": "研究的局限在于样本来自单一城市。未来研究应扩大样本范围。",
+        "similarity": 0.51
+    }
+]
+
+def test_sentence_selection():
+    """测试按问题选取最相关的句子"""
+    print("🔍 测试句子选取...")
+
+    sentences = split_sentences(CONTEXT_CHUNKS[0]["text"])
+    selected = select_sentences("采用了什么试验方法？", CONTEXT_CHUNKS, 3)
+    print(f"切分句子数: {len(sentences)}，选取: {selected}")
+
+    if len(sentences) == 2 and selected and selected[0][0] == 0 and "随机对照试验" in selected[0][1]:
+        print("✅ 最相关的句子排在首位")
+        return True
+    print("❌ 句子选取不符合预期")
+    return False
+
+def test_extractive_answer_structure():
+    """测试抽取式答案能被答案处理器解析并带有来源"""
+    print("\n📝 测试答案结构...")
+
+    start = time.perf_counter()
+    raw_answer = build_extractive_answer("干预的效果如何？", CONTEXT_CHUNKS, 4)
+    processed = AnswerProcessor().process_answer(raw_answer, CONTEXT_CHUNKS, "干预的效果如何？", "lit-1")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"耗时: {elapsed_ms:.1f}ms，来源: {[source['source_id'] for source in processed['sources']]}")
+
+    source_ids = {source["source_id"] for source in processed["sources"]}
+    if "2" in source_ids and processed["key_findings"] and processed["limitations"] \
+            and "焦虑评分显著降低" in processed["answer"] and elapsed_ms < 200:
+        print("✅ 抽取式答案结构完整且在200ms内完成")
+        return True
+    print("❌ 抽取式答案结构不完整")
+    return False
+
+def test_empty_context():
+    """测试没有可摘录句子时返回空答案"""
+    print("\n🈳 测试空上下文...")
+
+    answer = build_extractive_answer("研究方法是什么？", [{"text": "短句。", "similarity": 0.9}])
+    if answer == "":
+        print("✅ 没有可用句子时返回空字符串")
+        return True
+    print("❌ 应返回空字符串")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始抽取式答案测试...")
+    print("=" * 50)
+
+    tests = [
+        ("句子选取测试", test_sentence_selection),
+        ("答案结构测试", test_extractive_answer_structure),
+        ("空上下文测试", test_empty_context)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
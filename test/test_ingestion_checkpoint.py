@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+文献处理断点续传测试
+
+使用替身向量服务验证：批次之间取消后重试只生成剩余文本块的向量、
+文本或模型变化时旧断点失效、处理成功后删除断点，无需API密钥和向量数据库
+"""
+import sys
+import os
+import tempfile
+from contextlib import contextmanager
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.utils import async_processor as processor_module
+from app.utils.async_processor import AsyncProcessor, CancellationToken
+from app.utils.error_handler import TaskCancelledError
+from app.utils.ingestion_checkpoint import embedding_checkpoint
+
+LITERATURE_ID = "checkpoint-lit"
+
+class FakeEmbeddingService:
+    """记录调用的向量服务替身，可在生成指定数量后请求取消"""
+
+    def __init__(self, model_name: str = "test-model", cancel_after: int = None, token: CancellationToken = None):
+        self.model_name = model_name
+        self.cancel_after = cancel_after
+        self.token = token
+        self.calls = []
+
+    def _get_model_name(self) -> str:
+        return self.model_name
+
+    def generate_embedding(self, text: str):
+        self.calls.append(text)
+        if self.cancel_after is not None and len(self.calls) >= self.cancel_after:
+            self.token.cancel()
+        return [float(len(text)), float(len(self.calls))]
+
+@contextmanager
+def patched(target, **attrs):
+    """临时替换对象属性"""
+    originals = {name: getattr(target, name) for name in attrs}
+    for name, value in attrs.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(target, name, value)
+
+@contextmanager
+def checkpoint_env():
+    """断点目录指向临时目录，每批2个文本块且批次间不等待"""
+    with patched(embedding_checkpoint, checkpoint_dir=tempfile.mkdtemp()), \
+            patched(settings, INGEST_EMBEDDING_BATCH_SIZE=2, INGEST_EMBEDDING_BATCH_DELAY=0):
+        yield
+
+def make_chunks(count: int):
+    return [{"chunk_id": f"{LITERATURE_ID}_{i}", "text": f"文本块内容{i}"} for i in range(count)]
+
+def embed(chunks, service: FakeEmbeddingService, token: CancellationToken = None):
+    """使用替身向量服务执行一次分批向量生成"""
+    with patched(processor_module, embedding_service=service):
+        return AsyncProcessor()._embed_chunks_with_checkpoint(
+            "task-1", LITERATURE_ID, chunks, token or CancellationToken()
+        )
+
+def test_resume_after_cancel():
+    """测试批次之间取消后重试只生成剩余文本块的向量"""
+    print("⏯️ 测试取消后断点续传...")
+
+    with checkpoint_env():
+        chunks = make_chunks(6)
+        token = CancellationToken()
+        first = FakeEmbeddingService(cancel_after=2, token=token)
+        cancelled = False
+        try:
+            embed(chunks, first, token)
+        except TaskCancelledError:
+            cancelled = True
+
+        second = FakeEmbeddingService()
+        kept_chunks, embeddings, failed = embed(chunks, second)
+
+    print(f"首次生成: {len(first.calls)}，取消: {cancelled}，重试生成: {len(second.calls)}")
+
+    resumed = [chunk["text"] for chunk in chunks[2:]]
+    if cancelled and len(first.calls) == 2 and second.calls == resumed \
+            and [chunk["chunk_id"] for chunk in kept_chunks] == [chunk["chunk_id"] for chunk in chunks] \
+            and embeddings[:2] == [[float(len(chunks[0]["text"])), 1.0], [float(len(chunks[1]["text"])), 2.0]] \
+            and not failed:
+        print("✅ 重试复用了取消前的向量，只生成剩余部分")
+        return True
+    print("❌ 断点续传结果不正确")
+    return False
+
+def test_checkpoint_rejected_on_mismatch():
+    """测试文本或模型变化时不复用旧断点"""
+    print("\n🚫 测试断点失效...")
+
+    with checkpoint_env():
+        chunks = make_chunks(4)
+        embed(chunks, FakeEmbeddingService())
+
+        # 分块结果变化：只有内容变化的文本块重新生成
+        changed = [dict(chunk) for chunk in chunks]
+        changed[1]["text"] = "修改后的文本块"
+        text_service = FakeEmbeddingService()
+        embed(changed, text_service)
+
+        # 更换embedding模型：全部重新生成
+        model_service = FakeEmbeddingService(model_name="other-model")
+        embed(chunks, model_service)
+
+    print(f"文本变化后重新生成: {text_service.calls}，更换模型后重新生成: {len(model_service.calls)}")
+
+    if text_service.calls == ["修改后的文本块"] and len(model_service.calls) == len(chunks):
+        print("✅ 哈希或模型不一致的断点被忽略")
+        return True
+    print("❌ 不一致的断点被错误复用")
+    return False
+
+class FakeLiterature:
+    id = LITERATURE_ID
+    status = "active"
+    file_path = "checkpoint.txt"
+    research_group_id = "group-1"
+    title = "断点测试文献"
+
+class FakeDB:
+    def query(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return FakeLiterature()
+
+    def close(self):
+        pass
+
+class FakeVectorStore:
+    def __init__(self):
+        self.stored = 0
+
+    def delete_document_chunks(self, literature_id, group_id):
+        return True
+
+    def store_document_chunks(self, chunks, embeddings, literature_id, group_id):
+        self.stored = len(chunks)
+        return True
+
+    def store_document_summary(self, *args):
+        return True
+
+class FakeSideEffects:
+    """缓存、预设答案和预生成的替身"""
+
+    def bump_literature_version(self, literature_id):
+        pass
+
+    def delete_literature(self, literature_id):
+        pass
+
+    def submit(self, *args):
+        pass
+
+def test_checkpoint_cleared_after_success():
+    """测试处理成功、向量入库后删除断点"""
+    print("\n🧹 测试成功后删除断点...")
+
+    side_effects = FakeSideEffects()
+    vector_store = FakeVectorStore()
+    texts = ["第一段", "第二段", "第三段"]
+    with checkpoint_env(), patched(settings, HIERARCHICAL_EMBEDDINGS_ENABLED=False), patched(
+        processor_module,
+        get_db=lambda: iter([FakeDB()]),
+        extract_text_sandboxed=lambda path: "全文内容",
+        split_text_into_chunks=lambda text: texts,
+        prepare_chunks_for_embedding=lambda chunks, literature_id, group_id, title: [
+            {"chunk_id": f"{literature_id}_{i}", "text": text} for i, text in enumerate(chunks)
+        ],
+        embedding_service=FakeEmbeddingService(),
+        vector_store=vector_store,
+        cache_manager=side_effects,
+        preset_answer_store=side_effects,
+        preset_precomputer=side_effects,
+        log_success=lambda *args, **kwargs: None
+    ):
+        # 上次中断留下的断点
+        embedding_checkpoint.append(LITERATURE_ID, "test-model", [{"chunk_id": f"{LITERATURE_ID}_0", "text": "第一段"}], [[1.0, 1.0]])
+        checkpoint_path = embedding_checkpoint._checkpoint_path(LITERATURE_ID)
+        existed = os.path.exists(checkpoint_path)
+
+        processor = AsyncProcessor()
+        processor.task_results["task-1"] = {"status": "processing", "literature_id": LITERATURE_ID}
+        processor._process_literature_worker("task-1", LITERATURE_ID, None)
+        status = processor.task_results["task-1"]["status"]
+        remaining = os.path.exists(checkpoint_path)
+
+    print(f"处理前断点存在: {existed}，任务状态: {status}，入库文本块: {vector_store.stored}，处理后断点存在: {remaining}")
+
+    if existed and status == "completed" and vector_store.stored == len(texts) and not remaining:
+        print("✅ 向量入库后断点已删除")
+        return True
+    print("❌ 处理成功后断点未删除")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始文献处理断点续传测试...")
+    print("=" * 50)
+
+    tests = [
+        ("取消后续传测试", test_resume_after_cancel),
+        ("断点失效测试", test_checkpoint_rejected_on_mismatch),
+        ("成功后删除断点测试", test_checkpoint_cleared_after_success)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
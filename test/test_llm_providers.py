@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+生成服务提供商测试
+
+使用本地模拟模型验证确定性输出、流式生成和提供商回退，无需API密钥
+"""
+import sys
+import os
+import time
+import asyncio
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.llm_providers import LLMProvider, MockLLMProvider, LLMRouter
+from app.utils.resilience import CircuitBreaker, DeadlineExceededError, CIRCUIT_OPEN, CIRCUIT_CLOSED
+
+PROMPT = "### 【来源1】\n文献片段\n### 【来源2】\n文献片段\n## 🤔 用户问题\n这篇文献的方法是什么？"
+
+class FailingProvider(LLMProvider):
+    """总是失败的提供商"""
+
+    name = "failing"
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str):
+        raise RuntimeError("quota exceeded")
+
+    async def agenerate(self, prompt: str):
+        raise RuntimeError("quota exceeded")
+
+class IncompleteProvider(LLMProvider):
+    """只实现了异步生成的提供商"""
+
+    name = "incomplete"
+
+    async def agenerate(self, prompt: str):
+        return "answer"
+
+def test_provider_interface():
+    """测试未实现全部生成接口的提供商无法实例化"""
+    print("🧩 测试提供商接口...")
+
+    try:
+        IncompleteProvider()
+    except TypeError as e:
+        print(f"实例化失败: {e}")
+        print("✅ 缺少 generate 的提供商在构造时报错")
+        return True
+    print("❌ 不完整的提供商被成功构造")
+    return False
+
+def test_mock_provider_profile():
+    """测试模拟模型的确定性输出和耗时配置"""
+    print("\n🤖 测试模拟模型...")
+
+    provider = MockLLMProvider(first_token_latency=0.05, tokens_per_second=2000, answer_tokens=100)
+
+    start = time.perf_counter()
+    first = asyncio.run(provider.agenerate(PROMPT))
+    elapsed = time.perf_counter() - start
+    second = provider.generate(PROMPT)
+
+    print(f"答案长度: {len(first)}，耗时: {elapsed:.3f}秒")
+
+    if first == second and "【来源1】" in first and "关键发现：" in first and "局限性说明：" in first \
+            and elapsed >= 0.05:
+        print("✅ 模拟答案确定且结构完整")
+        return True
+    print("❌ 模拟答案不符合预期")
+    return False
+
+def test_mock_streaming():
+    """测试模拟模型的流式输出"""
+    print("\n🌊 测试流式生成...")
+
+    provider = MockLLMProvider(first_token_latency=0.01, tokens_per_second=500, answer_tokens=100)
+
+    async def collect():
+        return [piece async for piece in provider.astream(PROMPT)]
+
+    pieces = asyncio.run(collect())
+    print(f"流式片段数: {len(pieces)}")
+
+    if len(pieces) > 1 and "".join(pieces) == provider.generate(PROMPT):
+        print("✅ 流式输出与完整输出一致")
+        return True
+    print("❌ 流式输出不一致")
+    return False
+
+def test_router_fallback():
+    """测试首选提供商失败时回退"""
+    print("\n🔀 测试提供商回退...")
+
+    mock = MockLLMProvider(first_token_latency=0, tokens_per_second=100000, answer_tokens=50)
+    router = LLMRouter([FailingProvider(), mock])
+
+    answer = asyncio.run(router.agenerate(PROMPT))
+
+    async def collect():
+        return "".join([piece async for piece in router.astream(PROMPT)])
+
+    streamed = asyncio.run(collect())
+    stats = router.get_stats()["calls"]
+    print(f"调用统计: {stats}")
+
+    if answer and streamed == answer and stats["failing"]["failures"] == 2 and stats["mock"]["calls"] == 2:
+        print("✅ 失败后回退到模拟模型")
+        return True
+    print("❌ 回退逻辑错误")
+    return False
+
+class HangingProvider(LLMProvider):
+    """长时间不返回的提供商"""
+
+    name = "hanging"
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str):
+        time.sleep(60)
+        return "too late"
+
+    async def agenerate(self, prompt: str):
+        await asyncio.sleep(60)
+        return "too late"
+
+def test_router_hedging():
+    """测试首选提供商挂起时对冲到备用提供商"""
+    print("\n⏱️ 测试对冲请求...")
+
+    mock = MockLLMProvider(first_token_latency=0, tokens_per_second=100000, answer_tokens=50)
+    router = LLMRouter([HangingProvider(), mock])
+
+    start = time.perf_counter()
+    answer = asyncio.run(router.agenerate(PROMPT, timeout=5))
+    elapsed = time.perf_counter() - start
+    stats = router.get_stats()
+    print(f"耗时: {elapsed:.2f}秒，对冲次数: {stats['hedged_requests']}")
+
+    # 对冲等待时间不低于 LLM_HEDGE_MIN_DELAY，且远小于挂起时长
+    if answer and stats["hedged_requests"] == 1 and elapsed < 5:
+        print("✅ 对冲请求在截止时间内返回")
+        return True
+    print("❌ 对冲逻辑错误")
+    return False
+
+def test_router_deadline_and_breaker():
+    """测试生成超时和熔断"""
+    print("\n🔌 测试超时与熔断...")
+
+    router = LLMRouter([HangingProvider()])
+    router._breakers["hanging"] = CircuitBreaker("hanging", failure_threshold=2, reset_timeout=60)
+
+    timeouts = 0
+    for _ in range(2):
+        try:
+            asyncio.run(router.agenerate(PROMPT, timeout=0.1))
+        except DeadlineExceededError:
+            timeouts += 1
+
+    # 熔断后直接跳过，立即返回
+    start = time.perf_counter()
+    answer = asyncio.run(router.agenerate(PROMPT, timeout=0.1))
+    elapsed = time.perf_counter() - start
+    state = router.get_stats()["circuit_breakers"]["hanging"]
+    print(f"超时次数: {timeouts}，熔断状态: {state}")
+
+    breaker = CircuitBreaker("probe", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    half_open_allowed = breaker.allow_request() and not breaker.allow_request()
+    breaker.record_success()
+
+    if timeouts == 2 and answer is None and elapsed < 0.05 and state["state"] == CIRCUIT_OPEN \
+            and half_open_allowed and breaker.get_state()["state"] == CIRCUIT_CLOSED:
+        print("✅ 超时计入失败并在达到阈值后熔断")
+        return True
+    print("❌ 超时或熔断逻辑错误")
+    return False
+
+def test_breaker_trial_released_on_cancel():
+    """测试流被提前关闭或任务在开始前被取消时释放半开状态的试探机会"""
+    print("\n🧯 测试半开试探释放...")
+
+    def half_open_breaker(name):
+        breaker = CircuitBreaker(name, failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        return breaker
+
+    mock = MockLLMProvider(first_token_latency=0, tokens_per_second=100000, answer_tokens=50)
+    stream_router = LLMRouter([mock])
+    stream_router._breakers[mock.name] = half_open_breaker(mock.name)
+
+    async def close_early():
+        stream = stream_router.astream(PROMPT)
+        await stream.__anext__()
+        # 模拟SSE客户端断开：消费方提前关闭流
+        await stream.aclose()
+
+    asyncio.run(close_early())
+    stream_released = stream_router._breakers[mock.name].allow_request()
+
+    hanging = HangingProvider()
+    task_router = LLMRouter([hanging])
+    task_router._breakers[hanging.name] = half_open_breaker(hanging.name)
+
+    async def cancel_before_start():
+        assert task_router._allow(hanging)
+        pending = {asyncio.ensure_future(task_router._timed_generate(hanging, PROMPT)): hanging}
+        await task_router._cancel(pending)
+
+    asyncio.run(cancel_before_start())
+    task_released = task_router._breakers[hanging.name].allow_request()
+    print(f"提前关闭流后可试探: {stream_released}，任务开始前取消后可试探: {task_released}")
+
+    if stream_released and task_released:
+        print("✅ 取消不会让熔断器卡在半开状态")
+        return True
+    print("❌ 半开试探未释放")
+    return False
+
+class TruncatingProvider(LLMProvider):
+    """输出部分内容后失败的提供商"""
+
+    name = "truncating"
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str):
+        raise RuntimeError("connection reset")
+
+    async def agenerate(self, prompt: str):
+        raise RuntimeError("connection reset")
+
+    async def astream(self, prompt: str):
+        yield "部分答案"
+        raise RuntimeError("connection reset")
+
+def test_stream_error_after_partial_output():
+    """测试已输出部分内容后出错时抛出异常，而不是静默结束"""
+    print("\n✂️ 测试流式中断...")
+
+    mock = MockLLMProvider(first_token_latency=0, tokens_per_second=100000, answer_tokens=50)
+    router = LLMRouter([TruncatingProvider(), mock])
+
+    async def collect():
+        pieces = []
+        try:
+            async for text in router.astream(PROMPT):
+                pieces.append(text)
+        except RuntimeError:
+            return pieces, True
+        return pieces, False
+
+    pieces, raised = asyncio.run(collect())
+    print(f"已输出片段: {pieces}，抛出异常: {raised}")
+
+    # 不能回退拼接另一个模型的答案，也不能当作完整答案结束
+    if raised and pieces == ["部分答案"]:
+        print("✅ 截断的流式答案以异常结束")
+        return True
+    print("❌ 截断的流式答案被当作完整答案")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始生成服务提供商测试...")
+    print("=" * 50)
+
+    tests = [
+        ("提供商接口测试", test_provider_interface),
+        ("模拟模型测试", test_mock_provider_profile),
+        ("流式生成测试", test_mock_streaming),
+        ("提供商回退测试", test_router_fallback),
+        ("对冲请求测试", test_router_hedging),
+        ("超时与熔断测试", test_router_deadline_and_breaker),
+        ("半开试探释放测试", test_breaker_trial_released_on_cancel),
+        ("流式中断测试", test_stream_error_after_partial_output)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+问答流水线分阶段线程池测试
+
+验证阶段隔离、排队上限和等待时间指标
+"""
+import sys
+import os
+import time
+import asyncio
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.stage_executors import StageExecutor, StageOverloadedError
+
+def test_stage_isolation():
+    """测试慢速阶段不会阻塞其他阶段"""
+    print("🧵 测试阶段隔离...")
+
+    llm = StageExecutor("llm_test", max_workers=1, max_queue=0)
+    vector = StageExecutor("vector_test", max_workers=1, max_queue=0)
+
+    async def run():
+        slow = asyncio.create_task(llm.run(time.sleep, 0.5))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await vector.run(lambda: None)
+        elapsed = time.perf_counter() - start
+        await slow
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    print(f"大模型调用进行中时向量检索耗时: {elapsed:.3f}秒")
+
+    if elapsed < 0.2:
+        print("✅ 向量检索未被大模型调用阻塞")
+        return True
+    print("❌ 向量检索被阻塞")
+    return False
+
+def test_queue_limit_and_metrics():
+    """测试排队上限和等待时间指标"""
+    print("\n📊 测试排队上限和指标...")
+
+    executor = StageExecutor("limit_test", max_workers=1, max_queue=2)
+
+    async def run():
+        tasks = [asyncio.create_task(executor.run(time.sleep, 0.1)) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        rejected = False
+        try:
+            await executor.run(time.sleep, 0.1)
+        except StageOverloadedError:
+            rejected = True
+        await asyncio.gather(*tasks)
+        return rejected
+
+    rejected = asyncio.run(run())
+    stats = executor.get_stats()
+    print(f"指标: {stats}")
+
+    if rejected and stats["rejected"] == 1 and stats["completed"] == 3 and stats["queue_length"] == 0 \
+            and stats["max_wait_time"] > 0.05:
+        print("✅ 排队上限和等待时间统计正确")
+        return True
+    print("❌ 排队上限或指标错误")
+    return False
+
+def main():
+    """主测试函数"""
+    print("🚀 开始分阶段线程池测试...")
+    print("=" * 50)
+
+    tests = [
+        ("阶段隔离测试", test_stage_isolation),
+        ("排队上限和指标测试", test_queue_limit_and_metrics)
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+                print(f"✅ {test_name} 通过")
+            else:
+                print(f"❌ {test_name} 失败")
+        except Exception as e:
+            print(f"❌ {test_name} 异常: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📈 测试结果: {passed}/{total} 通过 ({passed/total*100:.1f}%)")
+
+if __name__ == "__main__":
+    main()